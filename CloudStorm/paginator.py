@@ -1,4 +1,11 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+import uuid
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
 from rest_framework.response import Response
 
 
@@ -19,3 +26,105 @@ class StandardResultsSetPagination(PageNumberPagination):
                 "results": data,
             }
         )
+
+
+class KeysetPagination(BasePagination):
+    """
+    Newest first pagination on (ordering_field, id). A page is read from the
+    position encoded in the cursor, so it costs the same however deep it is
+    and no COUNT(*) runs unless the client asks for one with ?count=exact or,
+    from the planner's row estimate, ?count=estimate.
+    """
+
+    ordering_field = "uploaded_at"
+    cursor_query_param = "cursor"
+    count_query_param = "count"
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        self.count = self.get_count(queryset, request)
+        position, reverse = self.decode_cursor(request)
+
+        field = self.ordering_field
+        if position is None:
+            queryset = queryset.order_by(f"-{field}", "-id")
+        elif reverse:
+            value, pk = position
+            queryset = queryset.filter(
+                Q(**{f"{field}__gt": value}) | Q(**{field: value, "id__gt": pk}),
+                **{f"{field}__gte": value},
+            ).order_by(field, "id")
+        else:
+            value, pk = position
+            # The redundant bound lets the index scan start at the cursor
+            # rather than filter every newer row.
+            queryset = queryset.filter(
+                Q(**{f"{field}__lt": value}) | Q(**{field: value, "id__lt": pk}),
+                **{f"{field}__lte": value},
+            ).order_by(f"-{field}", "-id")
+
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_previous, self.has_next = has_more, True
+        else:
+            self.has_previous, self.has_next = position is not None, has_more
+
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(page_size, self.max_page_size) if page_size > 0 else self.page_size
+
+    def get_count(self, queryset, request):
+        mode = request.query_params.get(self.count_query_param)
+        if mode == "exact":
+            return queryset.count()
+        if mode == "estimate":
+            plan = json.loads(queryset.order_by().explain(format="json"))
+            return plan[0]["Plan"]["Plan Rows"]
+        return None
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            position = (datetime.fromisoformat(cursor["v"]), uuid.UUID(cursor["id"]))
+            return position, bool(cursor.get("r"))
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, instance, reverse):
+        cursor = {
+            "v": getattr(instance, self.ordering_field).isoformat(),
+            "id": str(instance.id),
+        }
+        if reverse:
+            cursor["r"] = 1
+        return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.encode_cursor(self.page[-1], False)
+                if self.has_next and self.page
+                else None,
+                "previous": self.encode_cursor(self.page[0], True)
+                if self.has_previous and self.page
+                else None,
+                "count": self.count,
+                "results": data,
+            }
+        )
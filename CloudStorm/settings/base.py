@@ -147,10 +147,84 @@ AZURE_CONTAINER = os.getenv("AZURE_CONTAINER")
 AZURE_ACCOUNT_NAME = os.getenv("AZURE_ACCOUNT_NAME")
 AZURE_ACCOUNT_KEY = os.getenv("AZURE_ACCOUNT_KEY")
 AZURE_CONNECTION_STRING = os.getenv("AZURE_CONNECTION_STRING")
+# Keep-alive connections kept per storage host by the shared blob client.
+AZURE_BLOB_POOL_SIZE = int(os.getenv("AZURE_BLOB_POOL_SIZE", 32))
+# Bytes the blob client fetches when a download starts and then per chunk, what
+# a download holds in memory before it is read. Keep them within
+# GROUP_ZIP_PREFETCH_MAX_BYTES.
+AZURE_BLOB_MAX_SINGLE_GET_SIZE = int(
+    os.getenv("AZURE_BLOB_MAX_SINGLE_GET_SIZE", 4 * 1024 * 1024)
+)
+AZURE_BLOB_MAX_CHUNK_GET_SIZE = int(
+    os.getenv("AZURE_BLOB_MAX_CHUNK_GET_SIZE", 4 * 1024 * 1024)
+)
+
+# Blob properties used to answer conditional media requests are cached this long.
+MEDIA_METADATA_CACHE_TIMEOUT = int(os.getenv("MEDIA_METADATA_CACHE_TIMEOUT", 300))
+# The file and group behind a media URL are cached this long, so a group made
+# private can stay readable to non members for up to this many seconds.
+MEDIA_ACCESS_CACHE_TIMEOUT = int(os.getenv("MEDIA_ACCESS_CACHE_TIMEOUT", 30))
+# Browsers may reuse private media for this long before revalidating with a 304.
+MEDIA_CACHE_MAX_AGE = int(os.getenv("MEDIA_CACHE_MAX_AGE", 0))
+# Group memberships used by permission checks are cached this long per user,
+# membership changes take effect immediately.
+MEMBERSHIP_CACHE_TIMEOUT = int(os.getenv("MEMBERSHIP_CACHE_TIMEOUT", 600))
+
+# "proxy" streams media through the API, "redirect" sends clients to a short
+# lived signed storage URL instead. Requests can pick either with ?mode=.
+MEDIA_DOWNLOAD_MODE = os.getenv("MEDIA_DOWNLOAD_MODE", "proxy")
+MEDIA_SAS_EXPIRY_SECONDS = int(os.getenv("MEDIA_SAS_EXPIRY_SECONDS", 300))
+
+# Direct uploads: how long clients have to upload and commit a session, and the
+# size of the blocks they upload straight to storage.
+UPLOAD_SESSION_EXPIRY_SECONDS = int(
+    os.getenv("UPLOAD_SESSION_EXPIRY_SECONDS", 6 * 3600)
+)
+UPLOAD_BLOCK_SIZE = int(os.getenv("UPLOAD_BLOCK_SIZE", 8 * 1024 * 1024))
+# Block URLs are re-issued by retrieving the session, so a leaked or left over
+# URL can only write to storage for this long.
+UPLOAD_BLOCK_URL_EXPIRY_SECONDS = int(os.getenv("UPLOAD_BLOCK_URL_EXPIRY_SECONDS", 300))
+
+# Multipart uploads are hashed as the request body is read.
+FILE_UPLOAD_HANDLERS = [
+    "apps.files.utils.upload_handlers.HashingMemoryFileUploadHandler",
+    "apps.files.utils.upload_handlers.HashingTemporaryFileUploadHandler",
+]
+
+# Group ZIP downloads fetch the next blobs in the background while the current
+# one is written into the archive, within this many threads and bytes in flight.
+GROUP_ZIP_PREFETCH_WORKERS = int(os.getenv("GROUP_ZIP_PREFETCH_WORKERS", 8))
+GROUP_ZIP_PREFETCH_MAX_BYTES = int(
+    os.getenv("GROUP_ZIP_PREFETCH_MAX_BYTES", 64 * 1024 * 1024)
+)
+# Archives built in the background are uploaded to storage in blocks of this size.
+GROUP_ZIP_ARCHIVE_BLOCK_SIZE = int(
+    os.getenv("GROUP_ZIP_ARCHIVE_BLOCK_SIZE", 8 * 1024 * 1024)
+)
+# An archive pending or building for longer than this is taken for a lost task
+# and enqueued again by the next download request. Keep it above the longest
+# build.
+GROUP_ZIP_ARCHIVE_BUILD_TIMEOUT = int(
+    os.getenv("GROUP_ZIP_ARCHIVE_BUILD_TIMEOUT", 3600)
+)
+
+# Uploaded ZIP archives are refused up front when their central directory
+# declares more members, more bytes or a higher compression ratio than this.
+ZIP_MAX_MEMBERS = int(os.getenv("ZIP_MAX_MEMBERS", 10_000))
+ZIP_MAX_UNCOMPRESSED_SIZE = int(
+    os.getenv("ZIP_MAX_UNCOMPRESSED_SIZE", 5 * 1024 * 1024 * 1024)
+)
+ZIP_MAX_COMPRESSION_RATIO = int(os.getenv("ZIP_MAX_COMPRESSION_RATIO", 100))
+# File rows for ZIP members are created this many at a time.
+ZIP_INGEST_BATCH_SIZE = int(os.getenv("ZIP_INGEST_BATCH_SIZE", 100))
+# ZIP members are uploaded to storage this many at a time, with at most this
+# many uncompressed bytes in flight.
+ZIP_INGEST_WORKERS = int(os.getenv("ZIP_INGEST_WORKERS", 8))
+ZIP_INGEST_MAX_BYTES = int(os.getenv("ZIP_INGEST_MAX_BYTES", 256 * 1024 * 1024))
 
 STORAGES = {
     "default": {
-        "BACKEND": "storages.backends.azure_storage.AzureStorage",
+        "BACKEND": "apps.files.storage.PooledAzureStorage",
         "OPTIONS": {
             "timeout": 20,
         },
@@ -170,6 +244,27 @@ SWAGGER_SETTINGS = {
 
 
 OPEN_API_KEY = os.getenv("OPEN_API_KEY")
+# "combined" asks the model for the filename, description and tags of an
+# uploaded file in one structured response, "separate" makes one call each.
+AI_ENRICHMENT_MODE = os.getenv("AI_ENRICHMENT_MODE", "combined")
+# Model answers are cached per content hash, prompt, model and extractor
+# version this long; answers longer than AI_RESULT_CACHE_MAX_CHARS are not cached.
+AI_RESULT_CACHE_TIMEOUT = int(os.getenv("AI_RESULT_CACHE_TIMEOUT", 7 * 24 * 3600))
+AI_RESULT_CACHE_MAX_CHARS = int(os.getenv("AI_RESULT_CACHE_MAX_CHARS", 100_000))
+# AI calls from every worker share these per minute quotas, kept in Redis. A
+# call waits up to AI_RATE_LIMIT_MAX_WAIT seconds for room, otherwise the
+# upload task is retried with backoff up to AI_MAX_RETRIES times. Set the
+# requests quota to 0 to disable the limiter.
+AI_RATE_LIMIT_REDIS_URL = os.getenv("AI_RATE_LIMIT_REDIS_URL", "redis://redis:6379/2")
+AI_RATE_LIMIT_REQUESTS_PER_MINUTE = int(
+    os.getenv("AI_RATE_LIMIT_REQUESTS_PER_MINUTE", 500)
+)
+AI_RATE_LIMIT_TOKENS_PER_MINUTE = int(
+    os.getenv("AI_RATE_LIMIT_TOKENS_PER_MINUTE", 30_000)
+)
+AI_RATE_LIMIT_MAX_WAIT = int(os.getenv("AI_RATE_LIMIT_MAX_WAIT", 30))
+AI_RATE_LIMIT_BACKOFF_BASE = int(os.getenv("AI_RATE_LIMIT_BACKOFF_BASE", 10))
+AI_MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", 5))
 BASE_URL = "http://127.0.0.1:8000"
 
 FIELD_ENCRYPTION_KEY = os.environ.get("FIELD_ENCRYPTION_KEY", "").encode()
@@ -178,6 +273,44 @@ FIELD_ENCRYPTION_KEY = os.environ.get("FIELD_ENCRYPTION_KEY", "").encode()
 CELERY_BROKER_URL = "redis://redis:6379/0"
 CELERY_BROKER_URL = "redis://redis:6379/0"
 
+# Each workload has its own queue, consumed by workers sized for it, so a long
+# transcription never holds up emails or API bound AI calls. process_file runs
+# on "media" instead of "ai" for audio and video, see process_file_queue.
+# Worker topology is described in the README.
+CELERY_TASK_DEFAULT_QUEUE = "default"
+CELERY_TASK_ROUTES = {
+    "apps.users.tasks.send_email": {"queue": "email"},
+    "apps.files.tasks.process_file": {"queue": "ai"},
+    "apps.groups.tasks.build_group_archive": {"queue": "archives"},
+}
+# Tasks are acknowledged once they finish, so those of a worker that dies are
+# delivered again, and a worker reserves one task at a time per process.
+CELERY_TASK_ACKS_LATE = True
+CELERY_TASK_REJECT_ON_WORKER_LOST = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# Unacknowledged tasks are redelivered after this long, it must outlast the
+# longest transcription or archive build.
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    "visibility_timeout": int(os.getenv("CELERY_VISIBILITY_TIMEOUT", 6 * 3600))
+}
+# Prefork children are replaced after this much resident memory (KiB) or this
+# many tasks, returning what video and audio processing leave behind.
+CELERY_WORKER_MAX_MEMORY_PER_CHILD = int(
+    os.getenv("CELERY_WORKER_MAX_MEMORY_PER_CHILD", 512 * 1024)
+)
+CELERY_WORKER_MAX_TASKS_PER_CHILD = int(
+    os.getenv("CELERY_WORKER_MAX_TASKS_PER_CHILD", 100)
+)
+
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get(
+            "CACHE_BACKEND", "django.core.cache.backends.redis.RedisCache"
+        ),
+        "LOCATION": os.environ.get("CACHE_LOCATION", "redis://redis:6379/1"),
+    }
+}
+
 
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Cloudstorm API Documentation',
@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import File, ExtractedData
+from .models import Blob, File, ExtractedData, UploadSession, UploadSlot
 
+admin.site.register(Blob)
 admin.site.register(File)
 admin.site.register(ExtractedData)
+admin.site.register(UploadSession)
+admin.site.register(UploadSlot)
@@ -1,6 +1,7 @@
 from django_filters import rest_framework as filters
 from .models import File
-from django.contrib.postgres.search import SearchVector
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F
 
 
 class FileFilter(filters.FilterSet):
@@ -28,14 +29,11 @@ class FileFilter(filters.FilterSet):
         ]
 
     def full_text_search(self, queryset, name, value):
+        # Matches the stored search document through its GIN index, best
+        # ranked files first.
+        query = SearchQuery(value, config="english")
         return (
-            queryset.annotate(
-                search_vector=(
-                    SearchVector("name", weight="A", config="english")
-                    + SearchVector("short_description", weight="B", config="english")
-                    + SearchVector("extracted_data__data", weight="C", config="english")
-                )
-            )
-            .filter(search_vector=value)
-            .distinct()
+            queryset.filter(search_document=query)
+            .annotate(rank=SearchRank(F("search_document"), query))
+            .order_by("-rank", "-uploaded_at")
         )
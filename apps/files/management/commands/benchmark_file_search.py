@@ -0,0 +1,113 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from apps.files.models import File
+from apps.groups.models import DEFAULT_MAX_SIZE, Group
+from apps.users.models import User
+
+TRIGRAM_INDEXES = ["file_name_trgm", "file_description_trgm", "group_name_trgm"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Loads a synthetic file set and times the name, short description and "
+        "group name substring filters with and without their trigram indexes. "
+        "Everything runs in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--files", type=int, default=1_000_000)
+        parser.add_argument("--groups", type=int, default=100_000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self._load(options["files"], options["groups"])
+            queries = {
+                "file name": File.objects.filter(name__icontains="a1b2c"),
+                "file description": File.objects.filter(
+                    short_description__icontains="quarterly a1b2c"
+                ),
+                "group name": Group.objects.filter(name__icontains="a1b2c"),
+            }
+
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT count(*) FROM pg_indexes WHERE indexname = ANY(%s)",
+                    [TRIGRAM_INDEXES],
+                )
+                indexed = cursor.fetchone()[0] == len(TRIGRAM_INDEXES)
+            if not indexed:
+                self.stdout.write(
+                    "Trigram indexes missing, run create_trigram_indexes once "
+                    "pg_trgm is available."
+                )
+
+            self.stdout.write(f"{'filter':>18} {'ms':>10} {'plan':>30}")
+            if indexed:
+                self._run("trigram", queries, options["repeat"])
+                with connection.cursor() as cursor:
+                    for name in TRIGRAM_INDEXES:
+                        cursor.execute(f"DROP INDEX {connection.ops.quote_name(name)}")
+            self._run("no index", queries, options["repeat"])
+
+            transaction.set_rollback(True)
+
+    def _load(self, total_files, total_groups):
+        user = User.objects.create(email="benchmark@example.com", username="bench")
+        started = time.perf_counter()
+        # Only model table names are interpolated, the values are parameters.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {Group._meta.db_table}
+                    (id, name, is_private, created_at, updated_at, max_size)
+                SELECT md5('group' || g)::uuid, 'team ' || left(md5(g::text), 12),
+                    false, now(), now(), %s
+                FROM generate_series(1, %s) g
+                """,  # nosec B608
+                [DEFAULT_MAX_SIZE, total_groups],
+            )
+            cursor.execute(
+                f"""
+                INSERT INTO {File._meta.db_table}
+                    (id, name, short_description, group_id, uploaded_by_id,
+                     uploaded_at, file, file_size, file_type, file_extension,
+                     status)
+                SELECT md5('file' || g)::uuid,
+                    'report ' || md5(g::text) || '.pdf',
+                    'quarterly ' || md5((g * 7)::text) || ' summary',
+                    md5('group' || (g %% %s + 1))::uuid, %s,
+                    now() - g * interval '1 second',
+                    'uploads/benchmark/' || g || '.pdf', 1, 'document', 'pdf',
+                    'ready'
+                FROM generate_series(1, %s) g
+                """,  # nosec B608
+                [total_groups, user.pk, total_files],
+            )
+            cursor.execute(f"ANALYZE {Group._meta.db_table}")
+            cursor.execute(f"ANALYZE {File._meta.db_table}")
+        self.stdout.write(
+            f"Loaded {total_files} files in {total_groups} groups in "
+            f"{time.perf_counter() - started:.1f}s"
+        )
+
+    def _run(self, label, queries, repeat):
+        self.stdout.write(label)
+        for name, queryset in queries.items():
+            ids = queryset.values_list("id", flat=True)[:50]
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                list(ids.all())
+                timings.append((time.perf_counter() - started) * 1000)
+            plan = ids.explain().splitlines()
+            # The node below the LIMIT shows whether the index is used.
+            node = plan[1] if len(plan) > 1 else plan[0]
+            node = node.strip(" ->").split("  (")[0]
+            self.stdout.write(
+                f"{name:>18} {statistics.median(timings):>10.1f} {node:>30}"
+            )
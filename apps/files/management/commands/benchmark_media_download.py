@@ -0,0 +1,86 @@
+import os
+import time
+
+import requests
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory
+
+from apps.files.utils.azurite import BlobStandIn
+from apps.files.views import SecureAzureBlobView
+
+GROUP_NAME = "benchmark"
+FILENAME = "payload.bin"
+# Seconds to wait on the blob stand-in before giving up on a download.
+DOWNLOAD_TIMEOUT = 60
+
+
+class Command(BaseCommand):
+    help = (
+        "Serves a synthetic file through SecureAzureBlobView in proxy and redirect "
+        "mode against a local blob stand-in and reports the CPU time the API "
+        "worker spends per GB delivered to the client."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--file-size", type=int, default=64 * 1024 * 1024)
+        parser.add_argument("--requests", type=int, default=8)
+
+    def handle(self, *args, **options):
+        file_size = options["file_size"]
+        total_requests = options["requests"]
+
+        storage = BlobStandIn().start()
+        storage.put(
+            "benchmark", f"uploads/{GROUP_NAME}/{FILENAME}", os.urandom(file_size)
+        )
+        try:
+            with override_settings(
+                AZURE_CONNECTION_STRING=storage.connection_string,
+                AZURE_CONTAINER="benchmark",
+                CACHES={
+                    "default": {
+                        "BACKEND": "django.core.cache.backends.locmem.LocMemCache"
+                    }
+                },
+            ):
+                self.stdout.write(
+                    f"{'mode':>10} {'GB served':>10} {'worker CPU s':>13} "
+                    f"{'CPU s / GB':>11} {'wall s':>8}"
+                )
+                for mode in ("proxy", "redirect"):
+                    self._run(mode, total_requests)
+        finally:
+            storage.stop()
+
+    def _run(self, mode, total_requests):
+        # Access checks are not what is measured here.
+        view = SecureAzureBlobView.as_view(permission_classes=[])
+        factory = APIRequestFactory()
+
+        worker_cpu = 0.0
+        served_bytes = 0
+        started = time.perf_counter()
+        for _ in range(total_requests):
+            request = factory.get(f"/files/media/{GROUP_NAME}/{FILENAME}/?mode={mode}")
+
+            # Only time spent on this thread counts, the stand-in runs on others.
+            cpu_started = time.thread_time()
+            response = view(request, group_name=GROUP_NAME, filename=FILENAME)
+            if mode == "proxy":
+                for chunk in response.streaming_content:
+                    served_bytes += len(chunk)
+            worker_cpu += time.thread_time() - cpu_started
+
+            if mode == "redirect":
+                # The client now downloads straight from storage.
+                served_bytes += len(
+                    requests.get(response["Location"], timeout=DOWNLOAD_TIMEOUT).content
+                )
+
+        elapsed = time.perf_counter() - started
+        served_gb = served_bytes / (1024**3)
+        self.stdout.write(
+            f"{mode:>10} {served_gb:>10.2f} {worker_cpu:>13.3f} "
+            f"{worker_cpu / served_gb:>11.4f} {elapsed:>8.1f}"
+        )
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from apps.files.utils.trigram import create_missing_trigram_indexes, trigram_available
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates the pg_trgm trigram indexes that migrations skipped because the "
+        "extension was not available on the server, once it is installed."
+    )
+
+    def handle(self, *args, **options):
+        if not trigram_available(connection):
+            raise CommandError("pg_trgm is not available on this server.")
+
+        created = create_missing_trigram_indexes(connection)
+        for model, index in created:
+            self.stdout.write(f"Created {index.name} on {model._meta.db_table}")
+        if not created:
+            self.stdout.write("All trigram indexes exist.")
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from apps.files.services import dedup_report
+
+
+class Command(BaseCommand):
+    help = (
+        "Reports how many bytes deduplicated files take up against the bytes "
+        "actually stored for them."
+    )
+
+    def handle(self, *args, **options):
+        report = dedup_report()
+        mb = 1024 * 1024
+
+        self.stdout.write(f"files          {report['files']:>12}")
+        self.stdout.write(f"blobs          {report['blobs']:>12}")
+        self.stdout.write(f"logical MB     {report['logical_bytes'] / mb:>12.2f}")
+        self.stdout.write(f"stored MB      {report['stored_bytes'] / mb:>12.2f}")
+        self.stdout.write(f"saved MB       {report['saved_bytes'] / mb:>12.2f}")
+        self.stdout.write(f"dedup ratio    {report['dedup_ratio']:>12.2f}")
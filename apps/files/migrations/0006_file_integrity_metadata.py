@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:42
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_blob_hashes(apps, schema_editor):
+    File = apps.get_model("files", "File")
+    Blob = apps.get_model("files", "Blob")
+    File.objects.filter(blob__isnull=False).update(
+        sha256=Subquery(Blob.objects.filter(id=OuterRef("blob_id")).values("sha256"))
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("files", "0005_content_blobs"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="file",
+            name="mime_type",
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name="file",
+            name="sha256",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.RunPython(copy_blob_hashes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:50
+
+import apps.files.utils.file_utils
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("files", "0007_file_dimensions"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="file",
+            name="file",
+            field=models.FileField(
+                db_index=True, upload_to=apps.files.utils.file_utils.content_file_name
+            ),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:55
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def build_search_documents(apps, schema_editor):
+    File = apps.get_model("files", "File")
+    ExtractedData = apps.get_model("files", "ExtractedData")
+    extracted_text = (
+        ExtractedData.objects.filter(file=OuterRef("pk"))
+        .values("file")
+        .annotate(text=StringAgg("data", " "))
+        .values("text")
+    )
+    File.objects.update(
+        search_document=SearchVector("name", weight="A", config="english")
+        + SearchVector("short_description", weight="B", config="english")
+        + SearchVector(Subquery(extracted_text), weight="C", config="english")
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("files", "0008_index_file_path"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="file",
+            name="search_document",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="file",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_document"], name="files_file_search__247619_gin"
+            ),
+        ),
+        migrations.RunPython(build_search_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations
+
+from apps.files.utils.trigram import add_trigram_indexes, trigram_index
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("files", "0009_search_document"),
+    ]
+
+    operations = [
+        add_trigram_indexes(
+            "files",
+            "file",
+            [
+                trigram_index("name", "file_name_trgm"),
+                trigram_index("short_description", "file_description_trgm"),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("files", "0010_trigram_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="file",
+            index=models.Index(
+                fields=["-uploaded_at", "-id"], name="file_uploaded_at_id"
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("files", "0011_file_keyset_index"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="file",
+            name="file_size",
+            field=models.PositiveBigIntegerField(default=1),
+        ),
+    ]
@@ -1,5 +1,10 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.core.files.storage import default_storage
+from django.db import models, transaction
+from django.db.models import F, OuterRef, Subquery
 from taggit.managers import TaggableManager
 import os
 
@@ -9,7 +14,11 @@ from .utils.data_extraction import (
     image_data_extraction,
     document_data_extraction,
 )
-from .utils.file_utils import content_file_name, get_file_type
+from .utils.blob_metadata import invalidate_blob_metadata
+from .utils.extraction_cache import cached_extraction
+from .utils.media_access import invalidate_media_file
+from .utils.file_utils import content_file_name, get_file_type, read_file_metadata
+from .utils.trigram import trigram_index
 import uuid
 from apps.groups.models import UUIDTaggedItem
 import logging
@@ -17,6 +26,73 @@ import logging
 logger = logging.Logger("CloudStorm logger")
 
 
+class Blob(models.Model):
+    """
+    Stored content shared by every File with the same SHA-256. It is removed
+    from storage when the last File referencing it goes.
+    """
+
+    sha256 = models.CharField(max_length=64, unique=True)
+    path = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.path
+
+    @classmethod
+    def acquire(cls, sha256):
+        """
+        Takes a reference on the blob holding `sha256`, or returns None when
+        that content is not stored yet.
+        """
+        # The update waits for a concurrent release holding the row, so a blob
+        # is never handed out after its last reference dropped.
+        if cls.objects.filter(sha256=sha256).update(ref_count=F("ref_count") + 1):
+            return cls.objects.get(sha256=sha256)
+        return None
+
+    @classmethod
+    def register(cls, sha256, path, size):
+        """
+        Records freshly uploaded content at `path` with one reference. When the
+        same content was registered meanwhile, that blob is used instead and
+        the upload at `path` is deleted once the transaction commits.
+        """
+        while True:
+            blob, created = cls.objects.get_or_create(
+                sha256=sha256, defaults={"path": path, "size": size, "ref_count": 1}
+            )
+            if created:
+                return blob
+            if cls.objects.filter(id=blob.id).update(ref_count=F("ref_count") + 1):
+                transaction.on_commit(lambda: default_storage.delete(path))
+                return blob
+
+    @classmethod
+    def release(cls, counts):
+        """
+        Drops `counts[blob_id]` references from each blob and deletes the ones
+        left without any. Their content is deleted from storage once the
+        transaction commits, so a rollback restores the rows with it.
+        """
+        with transaction.atomic():
+            blobs = cls.objects.select_for_update().filter(id__in=counts).order_by("id")
+            for blob in blobs:
+                blob.ref_count = max(blob.ref_count - counts[blob.id], 0)
+                if blob.ref_count:
+                    blob.save(update_fields=["ref_count"])
+                    continue
+                blob.delete()
+                transaction.on_commit(lambda path=blob.path: cls._delete_content(path))
+
+    @staticmethod
+    def _delete_content(path):
+        invalidate_blob_metadata(path)
+        default_storage.delete(path)
+
+
 class File(models.Model):
     FILE_TYPES = [
         ("image", "Image"),
@@ -38,29 +114,90 @@ class File(models.Model):
     )
     uploaded_at = models.DateTimeField(auto_now_add=True)
     tags = TaggableManager(through=UUIDTaggedItem)
-    file = models.FileField(upload_to=content_file_name)
+    # Indexed, media URLs are resolved by this path.
+    file = models.FileField(upload_to=content_file_name, db_index=True)
+    # Content stored once for every File with the same SHA-256. Files without a
+    # blob keep their own content at `file`.
+    blob = models.ForeignKey(
+        Blob, on_delete=models.PROTECT, null=True, blank=True, related_name="files"
+    )
     file_type = models.CharField(
         max_length=10, choices=FILE_TYPES, blank=True, null=True
     )
-    file_size = models.PositiveIntegerField(default=1)
+    file_size = models.PositiveBigIntegerField(default=1)
+    # Recorded while the upload is consumed, so reading them never needs storage.
+    sha256 = models.CharField(max_length=64, blank=True, null=True)
+    mime_type = models.CharField(max_length=255, blank=True, null=True)
+    width = models.PositiveIntegerField(blank=True, null=True)
+    height = models.PositiveIntegerField(blank=True, null=True)
     file_extension = models.CharField(max_length=10, blank=True, null=True)
     short_description = models.CharField(max_length=2000, blank=True, null=True)
     status = models.CharField(max_length=20, default="ready", choices=FILE_STATUS)
+    # Name (A), short description (B) and extracted data (C), kept up to date
+    # by update_search_documents.
+    search_document = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_document"]),
+            # Substring filters on name and short description.
+            trigram_index("name", "file_name_trgm"),
+            trigram_index("short_description", "file_description_trgm"),
+            # Keyset pagination of the file listing.
+            models.Index(fields=["-uploaded_at", "-id"], name="file_uploaded_at_id"),
+        ]
 
     def __str__(self):
         return self.name if self.name else f"File {self.id}"
 
+    @classmethod
+    def update_search_documents(cls, file_ids):
+        """Recomputes the stored full text search document of the files."""
+        extracted_text = (
+            ExtractedData.objects.filter(file=OuterRef("pk"))
+            .values("file")
+            .annotate(text=StringAgg("data", " "))
+            .values("text")
+        )
+        cls.objects.filter(id__in=file_ids).update(
+            search_document=SearchVector("name", weight="A", config="english")
+            + SearchVector("short_description", weight="B", config="english")
+            + SearchVector(Subquery(extracted_text), weight="C", config="english")
+        )
+
+    @property
+    def storage_name(self):
+        return self.blob.path if self.blob_id else self.file.name
+
+    def open_content(self, mode="rb"):
+        if not self.blob_id:
+            return self.file.open(mode)
+        return default_storage.open(self.blob.path, mode)
+
     def save(self, *args, **kwargs):
         if not self.name and self.file:
             self.name = self.file.name
         if self.file:
-            self.file_size = self.file.size
+            # Only fresh uploads are measured, the size of a stored file would
+            # be a request to storage.
+            if not self.file._committed:
+                self.file_size = self.file.size
+                self.sha256 = getattr(self.file.file, "sha256", self.sha256)
+                if not self.mime_type:
+                    for field, value in read_file_metadata(
+                        self.file.name, self.file.file
+                    ).items():
+                        setattr(self, field, value)
             self.file_extension = os.path.splitext(self.file.name)[1][1:].lower()
             self.file_type = get_file_type(self.file_extension)
         super().save(*args, **kwargs)
 
     def delete(self, *args, **kwargs):
         if self.file:
+            invalidate_media_file(self.file.name)
+        # Shared content is released by the post_delete receiver instead.
+        if self.file and not self.blob_id:
+            invalidate_blob_metadata(self.file.name)
             self.file.delete(save=False)
         super().delete(*args, **kwargs)
 
@@ -68,28 +205,21 @@ class File(models.Model):
         if not self.file:
             return {}
 
-        try:
-            with self.file.open("rb") as f:
-                f.seek(0, os.SEEK_END)
-                size_bytes = f.tell()
-
-            attrs = {
-                "File Name": self.file.name,
-                "Size (KB)": round(size_bytes / 1024, 2),
-                "Uploaded At": self.uploaded_at.strftime("%Y-%m-%d %H:%M:%S"),
-                "Extension": self.file_extension,
-                "MIME Type": self.file.file.content_type
-                if hasattr(self.file.file, "content_type")
-                else "unknown",
-            }
-
-            return attrs
-
-        except Exception as e:
-            logger.error(f"Error getting metadata for file {self.file.name}: {e}")
-            return {"error": str(e)}
+        # Only columns recorded at ingest are used, storage is never read.
+        attrs = {
+            "File Name": self.file.name,
+            "Size (KB)": round(self.file_size / 1024, 2),
+            "Uploaded At": self.uploaded_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "Extension": self.file_extension,
+            "MIME Type": self.mime_type or "unknown",
+        }
+        if self.sha256:
+            attrs["SHA-256"] = self.sha256
+        if self.width and self.height:
+            attrs["Dimensions"] = f"{self.width}x{self.height}"
+        return attrs
 
-    def data_extraction(self, prompt):
+    def data_extraction(self, prompt, response_format=None, with_metadata=False):
         extraction_function_mapper = {
             "image": image_data_extraction,
             "document": document_data_extraction,
@@ -99,7 +229,17 @@ class File(models.Model):
 
         extraction_function = extraction_function_mapper.get(self.file_type, None)
         if extraction_function:
-            return extraction_function(self, prompt)
+            # The metadata names this upload, so answers to prompts sent with it
+            # are only shared by uploads with the same metadata.
+            metadata = self.get_meta_data() if with_metadata else None
+            request = f"{prompt}\n{metadata}" if with_metadata else prompt
+            return cached_extraction(
+                self,
+                prompt,
+                response_format,
+                lambda: extraction_function(self, request, response_format),
+                metadata=metadata,
+            )
 
         return None
 
@@ -108,6 +248,15 @@ class File(models.Model):
             file=self, name=name, data=data, hidden_from_user=hidden_from_user
         )
 
+    def replace_extracted_data(self, name, data, hidden_from_user=False):
+        """
+        Records `data` as the only ExtractedData named `name` of the file, so
+        a generation repeated by a retried task does not leave duplicates.
+        """
+        with transaction.atomic():
+            self.extracted_data.filter(name=name).delete()
+            return self.create_extracted_data(name, data, hidden_from_user)
+
     def check_user_access(self, user):
         if not self.group.is_private:
             return True
@@ -127,3 +276,46 @@ class ExtractedData(models.Model):
 
     def __str__(self):
         return f"{self.file.name}:{self.name}"
+
+
+class UploadSession(models.Model):
+    SESSION_STATUS = [
+        ("open", "Open"),
+        ("committed", "Committed"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    group = models.ForeignKey(
+        "groups.Group", on_delete=models.CASCADE, related_name="upload_sessions"
+    )
+    created_by = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
+    tags = models.CharField(max_length=2000, blank=True, default="")
+    ai_enabled = models.BooleanField(default=False)
+    status = models.CharField(max_length=20, default="open", choices=SESSION_STATUS)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Upload session {self.id}"
+
+
+class UploadSlot(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    session = models.ForeignKey(
+        UploadSession, on_delete=models.CASCADE, related_name="slots"
+    )
+    name = models.CharField(max_length=500)
+    blob_name = models.CharField(max_length=255, unique=True)
+    content_type = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    block_size = models.PositiveIntegerField()
+    file = models.OneToOneField(
+        File, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def block_count(self):
+        return -(-self.size // self.block_size)
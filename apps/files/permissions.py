@@ -1,6 +1,6 @@
 from rest_framework.permissions import BasePermission
-from apps.groups.models import GroupUser
-from apps.files.models import File
+from apps.groups.membership import get_membership
+from apps.files.services import get_media_file
 
 
 class CanDelete(BasePermission):
@@ -10,22 +10,16 @@ class CanDelete(BasePermission):
         if obj.status == "generate":
             self.message = "You can not Delete when status is generate"
             return False
-        gu = GroupUser.objects.filter(
-            user=request.user, group=obj.group, can_delete=True
-        )
-        return gu.exists()
+        return get_membership(request).has_flag(obj.group_id, "can_delete")
 
 
 class CanAdd(BasePermission):
     message = "You do not have permission to add items to this group."
 
     def has_permission(self, request, view):
-        gu = GroupUser.objects.filter(
-            user=request.user, group=request.query_params.get("group")
-        ).first()
-        if not gu:
-            return False
-        return gu.can_add or gu.role == "admin"
+        group = request.query_params.get("group")
+        membership = get_membership(request)
+        return membership.has_flag(group, "can_add") or membership.is_admin(group)
 
 
 class CanEdit(BasePermission):
@@ -36,15 +30,14 @@ class CanEdit(BasePermission):
             self.message = "You can not Delete when status is generate"
             return False
 
-        gu = GroupUser.objects.filter(user=request.user, group=obj.group, can_edit=True)
-        return gu.exists()
+        return get_membership(request).has_flag(obj.group_id, "can_edit")
 
 
 class CanRetrieve(BasePermission):
     message = "You must be a group member to retrieve this file."
 
     def has_object_permission(self, request, view, obj):
-        return obj.group.is_user_member(request.user) or not obj.group.is_private
+        return get_membership(request).can_access(obj.group)
 
 
 class CanMassDelete(BasePermission):
@@ -56,11 +49,7 @@ class CanMassDelete(BasePermission):
         if not group:
             return False
 
-        gu = GroupUser.objects.filter(user=request.user, group__id=group).first()
-        if not gu or not gu.can_delete:
-            return False
-
-        return True
+        return get_membership(request).has_flag(group, "can_delete")
 
 
 class FileAccessPermission(BasePermission):
@@ -68,5 +57,9 @@ class FileAccessPermission(BasePermission):
         group_name = request.resolver_match.kwargs.get("group_name")
         filename = request.resolver_match.kwargs.get("filename")
         file_path = f"uploads/{group_name}/{filename}"
-        file = File.objects.get(file=file_path)
-        return file.check_user_access(request.user)
+        media_file = get_media_file(file_path)
+        if media_file is None:
+            return False
+        return not media_file["group__is_private"] or get_membership(request).is_member(
+            media_file["group_id"]
+        )
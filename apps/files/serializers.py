@@ -1,9 +1,14 @@
 from rest_framework import serializers
 from taggit.serializers import TagListSerializerField, TaggitSerializer
 from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
 from celery import group
-from .tasks import process_file
-from .models import File, ExtractedData
+from .tasks import process_file, process_file_queue
+from .models import File, ExtractedData, UploadSession, UploadSlot
+from apps.groups.models import Group
+
+from .services import create_uploaded_files, upload_slot_block_urls
+from .utils.file_utils import validate_upload_filename
 
 
 class AzureBlobFileField(serializers.FileField):
@@ -53,13 +58,14 @@ class MultiFileUploadSerializer(serializers.Serializer):
                 "You need to add a group in query params !"
             )
 
-        file_instances = [
-            File(file=file, group_id=user_group, uploaded_by=uploaded_by)
-            for file in files
-        ]
-        File.objects.bulk_create(file_instances)
+        file_instances = create_uploaded_files(
+            files, Group.objects.get(id=user_group), uploaded_by
+        )
         task_group = group(
-            process_file.s(file.id, tags, ai_enabled) for file in file_instances
+            process_file.s(file.id, tags, ai_enabled).set(
+                queue=process_file_queue(file, ai_enabled)
+            )
+            for file in file_instances
         )
         task_group.apply_async()
         return file_instances
@@ -117,3 +123,52 @@ class AIGenerateSerializer(serializers.Serializer):
                 "The file is on generate status. Wait until its done!"
             )
         return attrs
+
+
+class UploadSlotRequestSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=255)
+    size = serializers.IntegerField(min_value=1)
+    content_type = serializers.CharField(max_length=255, required=False)
+
+    def validate_name(self, value):
+        try:
+            validate_upload_filename(value)
+        except SuspiciousFileOperation as exc:
+            raise serializers.ValidationError(str(exc))
+        return value
+
+
+class UploadSessionCreateSerializer(serializers.Serializer):
+    files = serializers.ListField(
+        child=UploadSlotRequestSerializer(), min_length=1, max_length=100
+    )
+    tags = serializers.CharField(max_length=2000, required=False, default="")
+    ai_enabled = serializers.BooleanField(default=False)
+
+
+class UploadSlotSerializer(serializers.ModelSerializer):
+    block_count = serializers.IntegerField(read_only=True)
+    block_urls = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadSlot
+        fields = [
+            "id",
+            "name",
+            "size",
+            "content_type",
+            "block_size",
+            "block_count",
+            "block_urls",
+        ]
+
+    def get_block_urls(self, obj):
+        return upload_slot_block_urls(obj)
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    slots = UploadSlotSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = UploadSession
+        fields = ["id", "group", "status", "expires_at", "slots"]
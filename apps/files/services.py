@@ -1,16 +1,51 @@
+import base64
+import hashlib
 import logging
 import os
-import tempfile
 import zipfile
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from datetime import timedelta
+from urllib.parse import quote
 
-from django.core.files.base import ContentFile
+from azure.core.exceptions import ResourceNotFoundError
+from azure.storage.blob import BlobBlock, ContentSettings
+from celery import group
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import File as DjangoFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+from django.utils.crypto import get_random_string
 
+from apps.groups.models import Group
+
+from .models import Blob, File, UploadSession, UploadSlot
+from .tasks import process_file, process_file_queue
+from .utils.blob_client import (
+    encode_block_id,
+    generate_blob_upload_url,
+    get_blob_client,
+    make_block_id,
+)
+from .utils.concurrency import bounded_map
 from .utils.file_utils import (
+    content_file_name,
     generate_filename,
     generate_short_description,
     generate_tags,
     extract_data,
+    get_file_type,
+    get_mime_type,
+    hash_content,
+    read_file_metadata,
+    validate_upload_filename,
 )
+from .utils.media_access import media_file_cache_key
+from .utils.zip_utils import ZipMemberStream, check_zip_limits
 
 _FIELD_GENERATORS = {
     "name": lambda obj, data: generate_filename(obj, data.get("target_format")),
@@ -20,30 +55,254 @@ _FIELD_GENERATORS = {
 logger = logging.Logger("CloudStorm Logger")
 
 
+@dataclass
+class ZipIngestResult:
+    files: list = field(default_factory=list)
+    skipped: list = field(default_factory=list)
+    failed: list = field(default_factory=list)
+
+
+def _create_file_batch(files, tags, ai_enabled):
+    File.objects.bulk_create(files)
+    File.update_search_documents([file.id for file in files])
+    task_group = group(
+        process_file.s(file.id, tags, ai_enabled).set(
+            queue=process_file_queue(file, ai_enabled)
+        )
+        for file in files
+    )
+    task_group.apply_async()
+
+
+def _new_file(name, filename, blob, user_group, uploaded_by, metadata):
+    extension = os.path.splitext(filename)[1][1:].lower()
+    return File(
+        file=name,
+        blob=blob,
+        name=filename,
+        group=user_group,
+        uploaded_by=uploaded_by,
+        file_size=blob.size,
+        sha256=blob.sha256,
+        file_extension=extension,
+        file_type=get_file_type(extension),
+        **metadata,
+    )
+
+
+def store_blob(open_content, blob_name, sha256=None, size=None):
+    """
+    Stores the content read from `open_content()` once per distinct SHA-256.
+    Returns the Blob, with a reference taken for the caller, and the name to
+    give the File. Content already stored is not uploaded. The content is
+    hashed locally unless `sha256` and `size` are given.
+    """
+    if sha256 is None:
+        with open_content() as content:
+            sha256, size = hash_content(content)
+
+    blob = Blob.acquire(sha256)
+    if blob is None:
+        with open_content() as content:
+            blob_name = default_storage.save(blob_name, content)
+        blob = Blob.register(sha256, blob_name, size)
+    return blob, blob_name
+
+
+def store_uploaded_files(files, user_group, uploaded_by):
+    """Yields unsaved, deduplicated File instances for uploaded files."""
+    for file in files:
+        file.seek(0)
+        # The upload handlers hash files while the request body is read.
+        blob, name = store_blob(
+            lambda file=file: nullcontext(file),
+            unique_blob_name(user_group, file.name),
+            sha256=getattr(file, "sha256", None),
+            size=file.size,
+        )
+        yield _new_file(
+            name,
+            file.name,
+            blob,
+            user_group,
+            uploaded_by,
+            read_file_metadata(file.name, file),
+        )
+
+
+def create_uploaded_files(files, user_group, uploaded_by):
+    """
+    Stores uploaded files and creates their File rows. The blob references are
+    taken in the same transaction as the rows, and when it fails the content
+    uploaded for it is deleted from storage again.
+    """
+    instances = []
+    try:
+        with transaction.atomic():
+            for instance in store_uploaded_files(files, user_group, uploaded_by):
+                instances.append(instance)
+            File.objects.bulk_create(instances)
+            File.update_search_documents([file.id for file in instances])
+    except Exception:
+        # The Blob rows registered for fresh content are rolled back, and the
+        # deletion of uploads that turned out to be duplicates with them, so
+        # nothing references what was uploaded under the File's own name.
+        names = [instance.file.name for instance in instances]
+        kept = set(Blob.objects.filter(path__in=names).values_list("path", flat=True))
+        for name in names:
+            if name not in kept:
+                default_storage.delete(name)
+        raise
+    return instances
+
+
+def _store_zip_member(archive, info, filename, blob_name):
+    """
+    Uploads the member and returns the name it was stored under, with the
+    SHA-256 and size of its content, hashed while it was uploaded.
+    """
+    # ZipFile serialises reads of the shared archive handle, members are
+    # decompressed, hashed and uploaded in parallel.
+    with ZipMemberStream(archive.open(info)) as member:
+        stored_name = default_storage.save(blob_name, DjangoFile(member, name=filename))
+        return stored_name, member.sha256, member.size
+
+
+def _upload_zip_members(archive, members):
+    """
+    Uploads (info, filename, blob_name, ...) members concurrently and yields
+    each with its finished future, in completion order. At most
+    ZIP_INGEST_WORKERS uploads run at once and their sizes stay within
+    ZIP_INGEST_MAX_BYTES.
+    """
+    return bounded_map(
+        lambda member: _store_zip_member(archive, *member[:3]),
+        members,
+        size=lambda member: member[0].file_size,
+        max_workers=settings.ZIP_INGEST_WORKERS,
+        max_bytes=settings.ZIP_INGEST_MAX_BYTES,
+    )
+
+
 def zip_upload_service(validated_data, request):
-    zip_file = validated_data["file"]
-    tags = validated_data.get("tags", "")
+    """
+    Streams the members of the uploaded archive into storage, several at a
+    time, and creates the File rows in batches as members complete. Members
+    are hashed while they are uploaded and content that turns out to be
+    stored already, in this archive or before, is deleted again in favour of
+    the existing blob. A member that cannot be stored is reported in the
+    result without failing the others.
+    """
+    tags = validated_data.get("tags", "").split(",")
     ai_enabled = validated_data.get("ai_enabled", False)
+    user_group = Group.objects.get(id=request.query_params.get("group"))
 
-    from .serializers import MultiFileUploadSerializer
+    result, batch = ZipIngestResult(), []
 
-    with tempfile.TemporaryDirectory() as temp_dir:
-        with zipfile.ZipFile(zip_file, "r") as zip_ref:
-            zip_ref.extractall(temp_dir)
+    def add_file(name, filename, blob, metadata):
+        nonlocal batch
+        batch.append(
+            _new_file(name, filename, blob, user_group, request.user, metadata)
+        )
+        if len(batch) >= settings.ZIP_INGEST_BATCH_SIZE:
+            _create_file_batch(batch, tags, ai_enabled)
+            result.files += batch
+            batch = []
 
-        files = []
-        for root, _, file_names in os.walk(temp_dir):
-            for filename in file_names:
-                file_path = os.path.join(root, filename)
-                with open(file_path, "rb") as f:
-                    files.append(ContentFile(f.read(), name=filename))
-
-        serializer = MultiFileUploadSerializer(
-            data={"files": files, "tags": tags, "ai_enabled": ai_enabled},
-            context={"request": request, "group": request.query_params.get("group")},
+    def members_to_upload(archive):
+        for info in check_zip_limits(
+            archive.infolist(),
+            max_members=settings.ZIP_MAX_MEMBERS,
+            max_total_size=settings.ZIP_MAX_UNCOMPRESSED_SIZE,
+            max_ratio=settings.ZIP_MAX_COMPRESSION_RATIO,
+        ):
+            filename = os.path.basename(info.filename)
+            extension = os.path.splitext(filename)[1][1:].lower()
+            try:
+                validate_upload_filename(filename)
+                if get_file_type(extension) == "image":
+                    # Only the header is decompressed, for the dimensions.
+                    with archive.open(info) as content:
+                        metadata = read_file_metadata(filename, content)
+                else:
+                    metadata = read_file_metadata(filename)
+            except SuspiciousFileOperation as exc:
+                result.skipped.append({"name": info.filename, "reason": str(exc)})
+                continue
+            except Exception as exc:
+                logger.error(f"Error reading ZIP member {info.filename}: {exc}")
+                result.failed.append({"name": info.filename, "reason": str(exc)})
+                continue
+
+            # Unique up front, so concurrent uploads can't race for a name.
+            yield info, filename, unique_blob_name(user_group, filename), metadata
+
+    with zipfile.ZipFile(validated_data["file"]) as archive:
+        for member, future in _upload_zip_members(archive, members_to_upload(archive)):
+            info, filename, _, metadata = member
+            try:
+                stored_name, sha256, size = future.result()
+            except Exception as exc:
+                logger.error(f"Error storing ZIP member {info.filename}: {exc}")
+                result.failed.append({"name": info.filename, "reason": str(exc)})
+                continue
+
+            # Content stored meanwhile is kept once, the upload is deleted.
+            blob = Blob.register(sha256, stored_name, size)
+            add_file(stored_name, filename, blob, metadata)
+
+    if batch:
+        _create_file_batch(batch, tags, ai_enabled)
+        result.files += batch
+    return result
+
+
+def dedup_report():
+    """
+    Compares the bytes files take up with the bytes actually stored for them,
+    for the files whose content is deduplicated.
+    """
+    files = File.objects.filter(blob__isnull=False).aggregate(
+        count=Count("id"), size=Sum("blob__size")
+    )
+    blobs = Blob.objects.aggregate(count=Count("id"), size=Sum("size"))
+    logical_bytes = files["size"] or 0
+    stored_bytes = blobs["size"] or 0
+    return {
+        "files": files["count"],
+        "blobs": blobs["count"],
+        "logical_bytes": logical_bytes,
+        "stored_bytes": stored_bytes,
+        "saved_bytes": logical_bytes - stored_bytes,
+        "dedup_ratio": round(logical_bytes / stored_bytes, 2) if stored_bytes else 1.0,
+    }
+
+
+def get_media_file(file_path):
+    """
+    Returns what serving the media at `file_path` needs, its group, the
+    group's privacy and the content columns, with one indexed, joined query
+    cached for MEDIA_ACCESS_CACHE_TIMEOUT. None when no file has that path.
+    """
+    key = media_file_cache_key(file_path)
+    media_file = cache.get(key)
+    if media_file is None:
+        media_file = (
+            File.objects.filter(file=file_path)
+            .values(
+                "group_id",
+                "group__is_private",
+                "blob__path",
+                "sha256",
+                "file_size",
+                "mime_type",
+                "uploaded_at",
+            )
+            .first()
         )
-        serializer.is_valid(raise_exception=True)
-        return serializer.save()
+        if media_file is not None:
+            cache.set(key, media_file, settings.MEDIA_ACCESS_CACHE_TIMEOUT)
+    return media_file
 
 
 def ai_generate_service(obj, validated_data):
@@ -77,3 +336,209 @@ def ai_generate_service(obj, validated_data):
     obj.save(update_fields=["status", "name", "short_description"])
 
     return extracted_data
+
+
+class UploadSessionError(Exception):
+    def __init__(self, message, missing_blocks=None):
+        super().__init__(message)
+        self.missing_blocks = missing_blocks or {}
+
+
+def unique_blob_name(group, filename):
+    # Names are handed out before anything exists in storage, so they get a
+    # random suffix instead of relying on storage.get_available_name. They end
+    # up in File.file, which is shorter than UploadSlot.blob_name.
+    max_length = File._meta.get_field("file").max_length
+    root, ext = os.path.splitext(filename)
+    suffix = f"_{get_random_string(7)}{ext}"
+    blob_name = content_file_name(File(group=group), f"{root}{suffix}")
+    overflow = len(blob_name) - max_length
+    if overflow > 0:
+        blob_name = content_file_name(File(group=group), f"{root[:-overflow]}{suffix}")
+    return blob_name
+
+
+def group_reserved_bytes(group):
+    stored = group.files.aggregate(total=Sum("file_size"))["total"] or 0
+    pending = (
+        UploadSlot.objects.filter(
+            session__group=group,
+            session__status="open",
+            session__expires_at__gt=timezone.now(),
+        ).aggregate(total=Sum("size"))["total"]
+        or 0
+    )
+    return stored + pending
+
+
+def create_upload_session(group, user, files, tags="", ai_enabled=False):
+    with transaction.atomic():
+        # Serialises quota checks of concurrent sessions for the same group.
+        group = Group.objects.select_for_update().get(id=group.id)
+        requested = sum(file["size"] for file in files)
+        if group_reserved_bytes(group) + requested > group.max_size:
+            raise UploadSessionError("Group storage quota exceeded !")
+
+        session = UploadSession.objects.create(
+            group=group,
+            created_by=user,
+            tags=tags,
+            ai_enabled=ai_enabled,
+            expires_at=timezone.now()
+            + timedelta(seconds=settings.UPLOAD_SESSION_EXPIRY_SECONDS),
+        )
+        UploadSlot.objects.bulk_create(
+            UploadSlot(
+                session=session,
+                name=file["name"],
+                blob_name=unique_blob_name(group, file["name"]),
+                content_type=file.get("content_type") or get_mime_type(file["name"]),
+                size=file["size"],
+                # Azure allows at most 50,000 blocks per blob.
+                block_size=max(settings.UPLOAD_BLOCK_SIZE, -(-file["size"] // 50_000)),
+            )
+            for file in files
+        )
+    return session
+
+
+def upload_slot_block_urls(slot):
+    """
+    Returns pre-signed URLs to upload the blocks of `slot` straight to storage.
+    They expire after UPLOAD_BLOCK_URL_EXPIRY_SECONDS and none are issued once
+    the session is committed or expired, so the blob of a committed File
+    can't be overwritten through them.
+    """
+    session = slot.session
+    now = timezone.now()
+    if session.status != "open" or session.expires_at <= now:
+        return []
+    expires_at = min(
+        session.expires_at,
+        now + timedelta(seconds=settings.UPLOAD_BLOCK_URL_EXPIRY_SECONDS),
+    )
+    upload_url = generate_blob_upload_url(slot.blob_name, expires_at)
+    return [
+        f"{upload_url}&comp=block&blockid={quote(encode_block_id(make_block_id(i)))}"
+        for i in range(slot.block_count)
+    ]
+
+
+def _expected_blocks(slot):
+    for index in range(slot.block_count):
+        yield (
+            make_block_id(index),
+            min(slot.block_size, slot.size - index * slot.block_size),
+        )
+
+
+def _staged_blocks(blob_client):
+    try:
+        committed, uncommitted = blob_client.get_block_list("all")
+    except ResourceNotFoundError:
+        return {}
+    # Uncommitted blocks win, the same way BlobBlock's "latest" state does.
+    return {block.id: block.size for block in [*committed, *uncommitted]}
+
+
+def uploaded_chunks(slot):
+    """
+    Returns the indexes of the chunks of `slot` already staged in storage with
+    their full size. Clients resume an interrupted upload by sending the rest.
+    """
+    staged = _staged_blocks(get_blob_client(slot.blob_name))
+    return [
+        index
+        for index, (block_id, size) in enumerate(_expected_blocks(slot))
+        if staged.get(block_id) == size
+    ]
+
+
+def stage_upload_chunk(slot, index, data, content_md5=None):
+    """
+    Stages chunk `index` of `slot` as a block of its blob. Chunks are
+    independent, so they can be sent in any order and in parallel, and sending
+    one again replaces it.
+    """
+    session = slot.session
+    if session.status != "open" or session.expires_at <= timezone.now():
+        raise UploadSessionError("Upload session is closed !")
+    if not 0 <= index < slot.block_count:
+        raise UploadSessionError("Chunk index out of range !")
+
+    expected_size = min(slot.block_size, slot.size - index * slot.block_size)
+    if len(data) != expected_size:
+        raise UploadSessionError(f"Chunk {index} must be {expected_size} bytes !")
+    if content_md5:
+        # An integrity check against transport errors, not a security one.
+        digest = hashlib.md5(data, usedforsecurity=False).digest()
+        if content_md5 != base64.b64encode(digest).decode():
+            raise UploadSessionError("Chunk checksum mismatch !")
+
+    # validate_content has storage check the MD5 of the block we send on.
+    get_blob_client(slot.blob_name).stage_block(
+        make_block_id(index), data, length=len(data), validate_content=True
+    )
+
+
+def commit_upload_session(session_id):
+    """
+    Commits the staged blocks of every slot and creates their File rows. The
+    session row is locked, so a commit retried concurrently waits and then
+    returns the files of the first one.
+    """
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(id=session_id)
+        slots = list(session.slots.all())
+        if session.status == "committed":
+            return [slot.file for slot in slots if slot.file_id]
+        if session.expires_at <= timezone.now():
+            raise UploadSessionError("Upload session expired !")
+
+        missing_blocks = {}
+        for slot in slots:
+            missing = sorted(set(range(slot.block_count)) - set(uploaded_chunks(slot)))
+            if missing:
+                missing_blocks[str(slot.id)] = missing
+        if missing_blocks:
+            raise UploadSessionError("Upload is incomplete !", missing_blocks)
+
+        for slot in slots:
+            get_blob_client(slot.blob_name).commit_block_list(
+                [
+                    BlobBlock(block_id=block_id)
+                    for block_id, _ in _expected_blocks(slot)
+                ],
+                content_settings=ContentSettings(content_type=slot.content_type),
+            )
+
+        files = []
+        for slot in slots:
+            extension = os.path.splitext(slot.name)[1][1:].lower()
+            slot.file = File(
+                file=slot.blob_name,
+                name=slot.name,
+                group=session.group,
+                uploaded_by=session.created_by,
+                file_size=slot.size,
+                mime_type=slot.content_type,
+                file_extension=extension,
+                file_type=get_file_type(extension),
+            )
+            files.append(slot.file)
+        File.objects.bulk_create(files)
+        File.update_search_documents([file.id for file in files])
+        UploadSlot.objects.bulk_update(slots, ["file"])
+        session.status = "committed"
+        session.save(update_fields=["status"])
+
+        tags = session.tags.split(",")
+        task_group = group(
+            process_file.s(file.id, tags, session.ai_enabled).set(
+                queue=process_file_queue(file, session.ai_enabled)
+            )
+            for file in files
+        )
+        transaction.on_commit(task_group.apply_async)
+
+    return files
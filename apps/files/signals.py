@@ -0,0 +1,32 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import Blob, ExtractedData, File
+from .utils.media_access import invalidate_media_file
+
+
+@receiver(pre_delete, sender=File)
+def invalidate_cached_media_file(sender, instance, **kwargs):
+    # Covers bulk and cascading deletes, which skip File.delete.
+    if instance.file:
+        invalidate_media_file(instance.file.name)
+
+
+@receiver(post_delete, sender=File)
+def release_file_blob(sender, instance, **kwargs):
+    # Runs for bulk deletes and for the files of a deleted group as well, in
+    # the transaction deleting the row.
+    if instance.blob_id:
+        Blob.release({instance.blob_id: 1})
+
+
+@receiver(post_save, sender=File)
+def update_file_search_document(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or {"name", "short_description"} & set(update_fields):
+        File.update_search_documents([instance.pk])
+
+
+@receiver(post_save, sender=ExtractedData)
+@receiver(post_delete, sender=ExtractedData)
+def update_extracted_data_search_document(sender, instance, **kwargs):
+    File.update_search_documents([instance.file_id])
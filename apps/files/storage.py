@@ -0,0 +1,15 @@
+from storages.backends.azure_storage import AzureStorage
+
+from .utils.blob_client import get_blob_service_client
+
+
+class PooledAzureStorage(AzureStorage):
+    """AzureStorage that shares the process wide pooled blob client."""
+
+    @property
+    def service_client(self):
+        return get_blob_service_client()
+
+    @property
+    def client(self):
+        return self.service_client.get_container_client(self.azure_container)
@@ -6,6 +6,17 @@ class FileUploadResponseSerializer(serializers.Serializer):
     files = serializers.ListField(child=serializers.UUIDField())
 
 
+class ZipMemberErrorSerializer(serializers.Serializer):
+    name = serializers.CharField()
+    reason = serializers.CharField()
+
+
+class ZipUploadResponseSerializer(FileUploadResponseSerializer):
+    uploaded = serializers.IntegerField()
+    skipped = ZipMemberErrorSerializer(many=True)
+    failed = ZipMemberErrorSerializer(many=True)
+
+
 class MassFileDeleteRequestSerializer(serializers.Serializer):
     to_delete = serializers.ListField(
         child=serializers.IntegerField(), help_text="List of file IDs to delete"
@@ -37,3 +48,18 @@ class AIGenerateRequestSerializer(serializers.Serializer):
 
 class AIGenerateResponseSerializer(serializers.Serializer):
     extracted_data = serializers.JSONField()
+
+
+class SignedDownloadUrlResponseSerializer(serializers.Serializer):
+    url = serializers.URLField()
+    expires_at = serializers.DateTimeField()
+
+
+class UploadSlotChunksSerializer(serializers.Serializer):
+    id = serializers.UUIDField()
+    uploaded_chunks = serializers.ListField(child=serializers.IntegerField())
+    missing_chunks = serializers.ListField(child=serializers.IntegerField())
+
+
+class UploadSessionChunksResponseSerializer(serializers.Serializer):
+    slots = UploadSlotChunksSerializer(many=True)
@@ -1,10 +1,8 @@
 from .models import File
-from .utils.file_utils import (
-    generate_filename,
-    generate_short_description,
-    generate_tags,
-)
+from .utils.file_utils import generate_enrichment
+from .utils.rate_limit import AI_RATE_LIMIT_ERRORS, rate_limit_backoff
 from celery import shared_task
+from django.conf import settings
 from channels.layers import get_channel_layer
 import logging
 
@@ -12,20 +10,39 @@ channel_layer = get_channel_layer()
 
 logger = logging.Logger("CloudStorm logger")
 
+# Transcribing these is CPU bound, other AI work mostly waits on the API.
+MEDIA_FILE_TYPES = ("audio", "video")
 
-@shared_task
-def process_file(file_id, tags, ai_enabled):
+
+def process_file_queue(file, ai_enabled):
+    """Returns the queue process_file should run on for `file`."""
+    if ai_enabled and file.file_type in MEDIA_FILE_TYPES:
+        return "media"
+    return "ai"
+
+
+@shared_task(bind=True, max_retries=settings.AI_MAX_RETRIES)
+def process_file(self, file_id, tags, ai_enabled):
     file_instance = File.objects.get(id=file_id)
     file_instance.status = "generate"
     file_instance.save()
     if ai_enabled:
         try:
-            file_instance.name = generate_filename(file_instance)
-            file_instance.short_description = generate_short_description(file_instance)
-            generated_tags = generate_tags(file_instance)
+            (
+                file_instance.name,
+                file_instance.short_description,
+                generated_tags,
+            ) = generate_enrichment(file_instance)
             for generated_tag in generated_tags:
                 file_instance.tags.add(generated_tag)
             file_instance.save()
+        except AI_RATE_LIMIT_ERRORS as exc:
+            # Retried later rather than left without AI metadata.
+            if self.request.retries < self.max_retries:
+                raise self.retry(
+                    exc=exc, countdown=rate_limit_backoff(exc, self.request.retries)
+                )
+            logger.error(exc)
         except Exception as exc:
             logger.error(exc)
 
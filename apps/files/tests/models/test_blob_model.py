@@ -0,0 +1,107 @@
+from collections import Counter
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import DatabaseError, transaction
+from django.test import TestCase, override_settings
+
+from apps.files.models import Blob, File
+from apps.files.tests.conftest import IN_MEMORY_STORAGES
+from apps.groups.tests.baker_recipes import group_recipe
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class BlobModelTests(TestCase):
+    def _stored_blob(self, sha256="a" * 64, ref_count=1, data=b"data"):
+        path = default_storage.save(f"uploads/g/{sha256[:8]}.txt", ContentFile(data))
+        return Blob.objects.create(
+            sha256=sha256, path=path, size=len(data), ref_count=ref_count
+        )
+
+    def test_acquire_takes_a_reference_on_stored_content(self):
+        blob = self._stored_blob()
+
+        self.assertEqual(Blob.acquire(blob.sha256), blob)
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 2)
+
+    def test_acquire_returns_none_for_unknown_content(self):
+        self.assertIsNone(Blob.acquire("b" * 64))
+
+    def test_register_reuses_content_registered_meanwhile(self):
+        blob = self._stored_blob()
+        duplicate = default_storage.save("uploads/g/copy.txt", ContentFile(b"data"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            registered = Blob.register(blob.sha256, duplicate, 4)
+
+        self.assertEqual(registered, blob)
+        self.assertEqual(Blob.objects.get().ref_count, 2)
+        self.assertFalse(default_storage.exists(duplicate))
+
+    def test_release_deletes_content_only_with_the_last_reference(self):
+        blob = self._stored_blob(ref_count=2)
+
+        Blob.release(Counter({blob.id: 1}))
+        self.assertTrue(default_storage.exists(blob.path))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Blob.release(Counter({blob.id: 1}))
+        self.assertFalse(Blob.objects.exists())
+        self.assertFalse(default_storage.exists(blob.path))
+
+    def test_file_delete_releases_its_blob(self):
+        blob = self._stored_blob(ref_count=2)
+        group = group_recipe.make()
+        first, second = (
+            File.objects.create(file=name, blob=blob, group=group, file_size=4)
+            for name in ("uploads/g/one.txt", "uploads/g/two.txt")
+        )
+
+        first.delete()
+        self.assertEqual(Blob.objects.get().ref_count, 1)
+        self.assertEqual(second.open_content().read(), b"data")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(Blob.objects.exists())
+        self.assertFalse(default_storage.exists(blob.path))
+
+    def test_deleting_a_group_releases_the_blobs_of_its_files(self):
+        blob = self._stored_blob(ref_count=2)
+        kept_group, deleted_group = group_recipe.make(_quantity=2)
+        File.objects.create(
+            file="uploads/g/kept.txt", blob=blob, group=kept_group, file_size=4
+        )
+        File.objects.create(
+            file="uploads/g/gone.txt", blob=blob, group=deleted_group, file_size=4
+        )
+
+        deleted_group.delete()
+        self.assertEqual(Blob.objects.get().ref_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            kept_group.delete()
+        self.assertFalse(Blob.objects.exists())
+        self.assertFalse(default_storage.exists(blob.path))
+
+    def test_rolled_back_delete_keeps_the_content(self):
+        blob = self._stored_blob()
+        file = File.objects.create(
+            file=blob.path, blob=blob, group=group_recipe.make(), file_size=4
+        )
+
+        file_id = file.id
+
+        with (
+            self.captureOnCommitCallbacks(execute=True) as callbacks,
+            self.assertRaises(DatabaseError),
+            transaction.atomic(),
+        ):
+            file.delete()
+            raise DatabaseError("request failed")
+
+        self.assertEqual(callbacks, [])
+        self.assertEqual(Blob.objects.get().ref_count, 1)
+        self.assertTrue(File.objects.filter(id=file_id).exists())
+        self.assertTrue(default_storage.exists(blob.path))
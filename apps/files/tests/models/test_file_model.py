@@ -1,9 +1,17 @@
-from django.test import TestCase
+import io
+
+from django.core.files.storage import InMemoryStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
 from unittest.mock import MagicMock, patch
 
+from PIL import Image
+
 from apps.files.models import File, ExtractedData
 from apps.groups.tests.baker_recipes import group_recipe, group_user_member_recipe
 from apps.users.tests.baker_recipes import user_recipe
+from apps.files.tests.baker_recipes import file_recipe
+from apps.files.tests.conftest import IN_MEMORY_STORAGES
 
 
 class FileModelStrTests(TestCase):
@@ -27,9 +35,20 @@ class FileDataExtractionTests(TestCase):
 
         result = file_obj.data_extraction(prompt="describe")
 
-        mock_image_extract.assert_called_once_with(file_obj, "describe")
+        mock_image_extract.assert_called_once_with(file_obj, "describe", None)
         self.assertEqual(result, {"result": "ok"})
 
+    @patch("apps.files.models.document_data_extraction")
+    def test_data_extraction_passes_response_format(self, mock_document_extract):
+        file_obj = File(file_type="document")
+        response_format = {"type": "json_object"}
+
+        file_obj.data_extraction(prompt="describe", response_format=response_format)
+
+        mock_document_extract.assert_called_once_with(
+            file_obj, "describe", response_format
+        )
+
     def test_data_extraction_returns_none_for_unknown_type(self):
         file_obj = File(file_type="other")
 
@@ -89,37 +108,12 @@ class FileGetMetaDataTests(TestCase):
 
         self.assertEqual(data, {})
 
-    def test_get_meta_data_success(self):
-        file_obj = File()
+    def test_get_meta_data_reads_columns_recorded_at_ingest(self):
+        file_obj = File(file_size=2048, file_extension="txt", mime_type="text/plain")
         file_obj.uploaded_at = MagicMock()
         file_obj.uploaded_at.strftime.return_value = "2025-11-18 12:00:00"
-        file_obj.file_extension = "txt"
-
-        # Fake file wrapper
         fake_file = MagicMock()
         fake_file.name = "uploads/test.txt"
-
-        # .file.file.content_type
-        fake_file.file = MagicMock()
-        fake_file.file.content_type = "text/plain"
-
-        # context manager for .open("rb")
-        fake_fh = MagicMock()
-        fake_fh.__enter__.return_value = fake_fh
-        fake_fh.__exit__.return_value = None
-
-        # seek/tell for size
-        def fake_seek(offset, whence):
-            return None
-
-        def fake_tell():
-            return 2048  # bytes
-
-        fake_fh.seek.side_effect = fake_seek
-        fake_fh.tell.side_effect = fake_tell
-
-        fake_file.open.return_value = fake_fh
-
         file_obj.file = fake_file
 
         data = file_obj.get_meta_data()
@@ -129,18 +123,90 @@ class FileGetMetaDataTests(TestCase):
         self.assertEqual(data["Uploaded At"], "2025-11-18 12:00:00")
         self.assertEqual(data["Extension"], "txt")
         self.assertEqual(data["MIME Type"], "text/plain")
+        self.assertNotIn("Dimensions", data)
+        fake_file.open.assert_not_called()
 
-    @patch("apps.files.models.logger")
-    def test_get_meta_data_handles_exception_and_logs(self, mock_logger):
-        file_obj = File()
-        fake_file = MagicMock()
-        fake_file.name = "badfile.txt"
-
-        fake_file.open.side_effect = Exception("boom")
-        file_obj.file = fake_file
+    def test_get_meta_data_includes_hash_and_image_dimensions(self):
+        file_obj = File(
+            file="uploads/g/photo.png", sha256="ab" * 32, width=640, height=480
+        )
+        file_obj.uploaded_at = MagicMock()
 
         data = file_obj.get_meta_data()
 
-        mock_logger.error.assert_called_once()
-        self.assertIn("error", data)
-        self.assertEqual(data["error"], "boom")
+        self.assertEqual(data["SHA-256"], "ab" * 32)
+        self.assertEqual(data["Dimensions"], "640x480")
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class FileSaveTests(TestCase):
+    def test_save_records_size_hash_and_mime_of_a_fresh_upload(self):
+        upload = SimpleUploadedFile("a.txt", b"hello", content_type="text/csv")
+        upload.sha256 = "f" * 64
+
+        file_obj = file_recipe.make(file=upload, file_size=1)
+
+        self.assertEqual(file_obj.file_size, 5)
+        self.assertEqual(file_obj.sha256, "f" * 64)
+        self.assertEqual(file_obj.mime_type, "text/csv")
+
+    def test_save_records_dimensions_of_an_uploaded_image(self):
+        image = io.BytesIO()
+        Image.new("RGB", (32, 16)).save(image, "PNG")
+        upload = SimpleUploadedFile("photo.png", image.getvalue(), "image/png")
+
+        file_obj = file_recipe.make(file=upload)
+
+        self.assertEqual((file_obj.width, file_obj.height), (32, 16))
+        self.assertEqual(file_obj.mime_type, "image/png")
+
+    def test_save_does_not_measure_stored_files(self):
+        file_obj = file_recipe.make()
+        File.objects.filter(id=file_obj.id).update(file_size=99)
+        file_obj = File.objects.get(id=file_obj.id)
+
+        with patch.object(InMemoryStorage, "size", side_effect=AssertionError):
+            file_obj.status = "generate"
+            file_obj.save()
+
+        self.assertEqual(file_obj.file_size, 99)
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class FileSearchDocumentTests(TestCase):
+    def _matches(self, file_obj, keywords):
+        return File.objects.filter(id=file_obj.id, search_document=keywords).exists()
+
+    def test_search_document_follows_name_and_description(self):
+        file_obj = file_recipe.make(name="Budget review")
+        self.assertTrue(self._matches(file_obj, "budget"))
+
+        file_obj.short_description = "Forecast for the new office"
+        file_obj.save(update_fields=["short_description"])
+
+        self.assertTrue(self._matches(file_obj, "forecast"))
+
+    def test_search_document_follows_extracted_data(self):
+        file_obj = file_recipe.make(name="scan.png")
+        extracted = file_obj.create_extracted_data("text", "Signed lease agreement")
+        self.assertTrue(self._matches(file_obj, "lease"))
+
+        extracted.delete()
+
+        self.assertFalse(self._matches(file_obj, "lease"))
+
+    def test_update_search_documents_covers_bulk_created_files(self):
+        group = group_recipe.make()
+        user = user_recipe.make()
+        files = File.objects.bulk_create(
+            [
+                File(file=f"{name}.txt", name=name, group=group, uploaded_by=user)
+                for name in ("apples", "pears")
+            ]
+        )
+        self.assertFalse(self._matches(files[0], "apples"))
+
+        File.update_search_documents([file.id for file in files])
+
+        self.assertTrue(self._matches(files[0], "apples"))
+        self.assertTrue(self._matches(files[1], "pears"))
@@ -1,12 +1,15 @@
 from unittest.mock import patch, MagicMock
 
+from django.core.files.storage import default_storage
+from django.db import DatabaseError
 from django.test import TestCase, override_settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 
 from rest_framework.test import APIRequestFactory
 
 from apps.files.serializers import MultiFileUploadSerializer
-from apps.files.models import File
+from apps.files.models import Blob, File
+from apps.files.services import dedup_report
 from apps.users.tests.baker_recipes import user_recipe
 from apps.groups.tests.baker_recipes import group_recipe, group_user_member_recipe
 from apps.files.tests.conftest import IN_MEMORY_STORAGES
@@ -132,3 +135,74 @@ class MultiFileUploadSerializerCreateTests(TestCase):
 
         created = File.objects.get(id=result[0].id)
         self.assertEqual(created.uploaded_by, self.user)
+
+    @patch("apps.files.serializers.group")
+    @patch("apps.files.serializers.process_file")
+    def test_create_stores_identical_content_once(self, mock_process_file, mock_group):
+        files = [
+            SimpleUploadedFile("a.txt", b"same", content_type="text/plain"),
+            SimpleUploadedFile("b.txt", b"same", content_type="text/plain"),
+        ]
+        serializer = MultiFileUploadSerializer(
+            data={"files": files, "ai_enabled": False}, context=self._make_context()
+        )
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+
+        a, b = serializer.save()
+
+        self.assertEqual(Blob.objects.get().ref_count, 2)
+        self.assertEqual(a.blob_id, b.blob_id)
+        self.assertEqual(a.storage_name, b.storage_name)
+        self.assertEqual(b.file_size, 4)
+        self.assertEqual(b.mime_type, "text/plain")
+        self.assertEqual(
+            b.sha256,
+            "0967115f2813a3541eaef77de9d9d5773f1c0c04314b0bbfe4ff3b3b1c55b5d5",
+        )
+        self.assertEqual(
+            dedup_report(),
+            {
+                "files": 2,
+                "blobs": 1,
+                "logical_bytes": 8,
+                "stored_bytes": 4,
+                "saved_bytes": 4,
+                "dedup_ratio": 2.0,
+            },
+        )
+
+    @patch("apps.files.serializers.group")
+    @patch("apps.files.serializers.process_file")
+    def test_create_failure_leaves_no_references_or_content(
+        self, mock_process_file, mock_group
+    ):
+        existing = SimpleUploadedFile("a.txt", b"stored", content_type="text/plain")
+        serializer = MultiFileUploadSerializer(
+            data={"files": [existing]}, context=self._make_context()
+        )
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        stored_names = default_storage.listdir(f"uploads/{self.group.name}")[1]
+
+        files = [
+            SimpleUploadedFile("b.txt", b"stored", content_type="text/plain"),
+            SimpleUploadedFile("c.txt", b"fresh", content_type="text/plain"),
+        ]
+        serializer = MultiFileUploadSerializer(
+            data={"files": files}, context=self._make_context()
+        )
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        with (
+            patch(
+                "apps.files.services.File.objects.bulk_create",
+                side_effect=DatabaseError("insert failed"),
+            ),
+            self.assertRaises(DatabaseError),
+        ):
+            serializer.save()
+
+        self.assertEqual(File.objects.count(), 1)
+        self.assertEqual(Blob.objects.get().ref_count, 1)
+        self.assertEqual(
+            default_storage.listdir(f"uploads/{self.group.name}")[1], stored_names
+        )
@@ -0,0 +1,111 @@
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from apps.files.models import ExtractedData, File
+from apps.files.tasks import process_file, process_file_queue
+from apps.files.tests.baker_recipes import file_recipe
+from apps.files.tests.conftest import IN_MEMORY_STORAGES
+from apps.files.utils.rate_limit import RateLimitExceeded
+from CloudStorm.celery import app as celery_app
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class ProcessFileTaskTests(TestCase):
+    @patch("apps.files.tasks.generate_enrichment")
+    def test_ai_enrichment_sets_name_description_and_tags(self, generate_enrichment):
+        file_obj = file_recipe.make()
+        generate_enrichment.return_value = ("42_invoice", "An invoice.", ["finance"])
+
+        process_file(file_obj.id, ["manual"], True)
+
+        file_obj = File.objects.get(id=file_obj.id)
+        generate_enrichment.assert_called_once()
+        self.assertEqual(file_obj.name, "42_invoice")
+        self.assertEqual(file_obj.short_description, "An invoice.")
+        self.assertEqual(set(file_obj.tags.names()), {"finance", "manual"})
+        self.assertEqual(file_obj.status, "ready")
+
+    @patch("apps.files.tasks.generate_enrichment")
+    def test_ai_disabled_only_adds_tags(self, generate_enrichment):
+        file_obj = file_recipe.make()
+
+        process_file(file_obj.id, ["manual"], False)
+
+        generate_enrichment.assert_not_called()
+        self.assertEqual(list(file_obj.tags.names()), ["manual"])
+
+    @patch("apps.files.tasks.generate_enrichment")
+    def test_rate_limited_enrichment_is_retried(self, generate_enrichment):
+        file_obj = file_recipe.make()
+        generate_enrichment.side_effect = [
+            RateLimitExceeded(1),
+            ("42_invoice", "An invoice.", ["finance"]),
+        ]
+
+        process_file.apply(args=[file_obj.id, [], True])
+
+        file_obj = File.objects.get(id=file_obj.id)
+        self.assertEqual(generate_enrichment.call_count, 2)
+        self.assertEqual(file_obj.name, "42_invoice")
+        self.assertEqual(file_obj.status, "ready")
+
+    @override_settings(AI_ENRICHMENT_MODE="separate")
+    @patch.object(File, "data_extraction")
+    def test_retried_enrichment_leaves_one_row_per_generation(self, data_extraction):
+        file_obj = file_recipe.make()
+        data_extraction.side_effect = [
+            "42_invoice",
+            RateLimitExceeded(1),
+            "42_invoice",
+            "An invoice.",
+            "finance",
+        ]
+
+        process_file.apply(args=[file_obj.id, [], True])
+
+        names = list(
+            ExtractedData.objects.filter(file=file_obj).values_list("name", flat=True)
+        )
+        self.assertCountEqual(
+            names,
+            [
+                "filename_generation",
+                "short_description_generation",
+                "tags_generation",
+            ],
+        )
+
+    @patch("apps.files.tasks.generate_enrichment")
+    def test_enrichment_gives_up_after_max_retries(self, generate_enrichment):
+        file_obj = file_recipe.make(name="original")
+        generate_enrichment.side_effect = RateLimitExceeded(1)
+
+        process_file.apply(args=[file_obj.id, ["manual"], True])
+
+        file_obj = File.objects.get(id=file_obj.id)
+        self.assertEqual(generate_enrichment.call_count, process_file.max_retries + 1)
+        self.assertEqual(file_obj.name, "original")
+        self.assertEqual(file_obj.status, "ready")
+        self.assertEqual(list(file_obj.tags.names()), ["manual"])
+
+
+class ProcessFileQueueTests(SimpleTestCase):
+    def test_audio_and_video_enrichment_runs_on_the_media_queue(self):
+        self.assertEqual(process_file_queue(File(file_type="video"), True), "media")
+        self.assertEqual(process_file_queue(File(file_type="audio"), True), "media")
+
+    def test_other_files_run_on_the_ai_queue(self):
+        self.assertEqual(process_file_queue(File(file_type="document"), True), "ai")
+        self.assertEqual(process_file_queue(File(file_type="video"), False), "ai")
+
+    def test_tasks_are_routed_to_their_workload_queue(self):
+        routes = {
+            "apps.users.tasks.send_email": "email",
+            "apps.files.tasks.process_file": "ai",
+            "apps.groups.tasks.build_group_archive": "archives",
+        }
+        for task_name, queue in routes.items():
+            with self.subTest(task_name):
+                route = celery_app.amqp.router.route({}, task_name)
+                self.assertEqual(route["queue"].name, queue)
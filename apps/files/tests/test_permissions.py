@@ -1,5 +1,6 @@
 from unittest.mock import MagicMock
 
+from django.core.cache import cache
 from django.test import TestCase, override_settings
 
 from rest_framework.test import APIRequestFactory
@@ -276,6 +277,7 @@ class FileAccessPermissionTests(TestCase):
     def setUp(self):
         self.factory = APIRequestFactory()
         self.permission = FileAccessPermission()
+        cache.clear()
 
     def _make_request(self, user, group_name, filename):
         request = self.factory.get(f"/files/media/{group_name}/{filename}/")
@@ -0,0 +1,93 @@
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, override_settings
+
+from apps.files.storage import PooledAzureStorage
+from apps.files.utils import blob_client
+
+CONNECTION_STRING = (
+    "DefaultEndpointsProtocol=http;AccountName=devstoreaccount1;"
+    "AccountKey=Zm9v;BlobEndpoint=http://127.0.0.1:10000/devstoreaccount1;"
+)
+
+
+@override_settings(
+    AZURE_CONNECTION_STRING=CONNECTION_STRING,
+    AZURE_CONTAINER="fake",
+    AZURE_BLOB_POOL_SIZE=4,
+    AZURE_BLOB_MAX_SINGLE_GET_SIZE=1024,
+    AZURE_BLOB_MAX_CHUNK_GET_SIZE=512,
+)
+class BlobClientTests(SimpleTestCase):
+    def setUp(self):
+        blob_client._reset_after_fork()
+        self.addCleanup(blob_client._reset_after_fork)
+
+    def test_get_blob_service_client_is_shared_across_calls(self):
+        first = blob_client.get_blob_service_client()
+        second = blob_client.get_blob_service_client()
+
+        self.assertIs(first, second)
+        metrics = blob_client.get_pool_metrics()
+        self.assertEqual(metrics["clients_created"], 1)
+        self.assertEqual(metrics["client_reuses"], 1)
+
+    def test_get_blob_client_targets_configured_container(self):
+        client = blob_client.get_blob_client("uploads/a.txt")
+
+        self.assertEqual(client.container_name, "fake")
+        self.assertEqual(client.blob_name, "uploads/a.txt")
+
+    def test_pool_size_comes_from_settings(self):
+        client = blob_client.get_blob_service_client()
+        session = client._pipeline._transport.session
+
+        adapter = session.get_adapter("https://example.blob.core.windows.net")
+        self.assertEqual(adapter._pool_maxsize, 4)
+
+    def test_download_sizes_come_from_settings(self):
+        client = blob_client.get_blob_client("uploads/a.txt")
+
+        self.assertEqual(client._config.max_single_get_size, 1024)
+        self.assertEqual(client._config.max_chunk_get_size, 512)
+
+    def test_clients_are_kept_per_connection_string(self):
+        first = blob_client.get_blob_service_client()
+        with override_settings(
+            AZURE_CONNECTION_STRING=CONNECTION_STRING.replace("10000", "10001")
+        ):
+            second = blob_client.get_blob_service_client()
+
+        self.assertIsNot(first, second)
+
+    def test_reset_after_fork_builds_a_new_client(self):
+        first = blob_client.get_blob_service_client()
+
+        blob_client._reset_after_fork()
+
+        self.assertIsNot(blob_client.get_blob_service_client(), first)
+        self.assertEqual(blob_client.get_pool_metrics()["clients_created"], 1)
+
+    def test_pool_metrics_count_connection_reuse(self):
+        session = blob_client._build_session()
+        pool = session.get_adapter("http://127.0.0.1").poolmanager.connection_from_url(
+            "http://127.0.0.1:10000"
+        )
+
+        with patch.object(pool, "_validate_conn"):
+            conn = pool._get_conn()
+            pool._put_conn(conn)
+            pool._get_conn()
+
+        metrics = blob_client.get_pool_metrics()
+        self.assertEqual(metrics["connection_checkouts"], 2)
+        self.assertEqual(metrics["new_connections"], 1)
+        self.assertEqual(metrics["pooled_connection_reuses"], 1)
+
+    def test_pooled_azure_storage_uses_shared_client(self):
+        storage = PooledAzureStorage(
+            connection_string=CONNECTION_STRING, azure_container="fake"
+        )
+
+        self.assertIs(storage.service_client, blob_client.get_blob_service_client())
+        self.assertEqual(storage.client.container_name, "fake")
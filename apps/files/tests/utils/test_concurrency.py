@@ -0,0 +1,66 @@
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+from apps.files.utils.concurrency import bounded_map
+
+
+class _Tracker:
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def run(self, item):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        # Earlier items finish last.
+        time.sleep(0.05 - item[0] * 0.008)
+        with self._lock:
+            self.active -= 1
+        return item[0]
+
+
+class BoundedMapTests(SimpleTestCase):
+    def test_ordered_yields_in_item_order(self):
+        items = [(i, 10) for i in range(6)]
+
+        results = [
+            future.result()
+            for _, future in bounded_map(
+                _Tracker().run, items, lambda item: item[1], 4, 1024, ordered=True
+            )
+        ]
+
+        self.assertEqual(results, list(range(6)))
+
+    def test_unordered_yields_in_completion_order(self):
+        items = [(i, 10) for i in range(4)]
+
+        results = [
+            future.result()
+            for _, future in bounded_map(
+                _Tracker().run, items, lambda item: item[1], 4, 1024
+            )
+        ]
+
+        self.assertEqual(results, [3, 2, 1, 0])
+
+    def test_byte_budget_limits_calls_in_flight(self):
+        tracker = _Tracker()
+        items = [(0, 300)] * 9
+
+        list(bounded_map(tracker.run, items, lambda item: item[1], 8, 1024))
+
+        # 1024 bytes leave room for three 300 byte items at a time.
+        self.assertEqual(tracker.max_active, 3)
+
+    def test_items_over_the_budget_run_alone(self):
+        tracker = _Tracker()
+        items = [(0, 5000)] * 3
+
+        list(bounded_map(tracker.run, items, lambda item: item[1], 8, 1024))
+
+        self.assertEqual(tracker.max_active, 1)
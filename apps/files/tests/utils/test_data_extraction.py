@@ -0,0 +1,53 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from apps.files.tests.baker_recipes import file_recipe
+from apps.files.tests.conftest import IN_MEMORY_STORAGES
+from apps.files.utils import openai_client
+from apps.files.utils.data_extraction import document_data_extraction
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class DocumentDataExtractionTests(TestCase):
+    def setUp(self):
+        openai_client._reset_after_fork()
+        self.addCleanup(openai_client._reset_after_fork)
+        cache.clear()
+
+        self.client = MagicMock()
+        self.client.beta.assistants.list.return_value = []
+        self.client.beta.assistants.create.return_value = SimpleNamespace(id="asst")
+        self.client.files.create.return_value = SimpleNamespace(id="file-1")
+        self.client.beta.threads.create_and_run_poll.return_value = SimpleNamespace(
+            status="completed", thread_id="thread"
+        )
+        answer = SimpleNamespace(text=SimpleNamespace(value="answer"))
+        self.client.beta.threads.messages.list.return_value = SimpleNamespace(
+            data=[SimpleNamespace(content=[answer])]
+        )
+        patcher = patch(
+            "apps.files.utils.data_extraction.get_openai_client",
+            return_value=self.client,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch("apps.files.utils.data_extraction.acquire_ai_capacity")
+        self.acquire_ai_capacity = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_document_prompts_reuse_the_assistant_and_uploaded_file(self):
+        file_obj = file_recipe.make()
+
+        first = document_data_extraction(file_obj, "summarize")
+        second = document_data_extraction(file_obj, "summarize again")
+
+        self.assertEqual((first, second), ("answer", "answer"))
+        self.client.beta.assistants.create.assert_called_once()
+        self.client.files.create.assert_called_once()
+        self.assertEqual(self.client.beta.threads.create_and_run_poll.call_count, 2)
+        run_kwargs = self.client.beta.threads.create_and_run_poll.call_args.kwargs
+        self.assertEqual(run_kwargs["assistant_id"], "asst")
+        self.assertEqual(self.acquire_ai_capacity.call_count, 2)
@@ -0,0 +1,99 @@
+from unittest.mock import MagicMock, call, patch
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from apps.files.models import File
+from apps.files.tests.baker_recipes import file_recipe
+from apps.files.tests.conftest import IN_MEMORY_STORAGES
+from apps.files.utils import extraction_cache
+from apps.files.utils.extraction_cache import (
+    cached_extraction,
+    get_extraction_cache_metrics,
+)
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class ExtractionCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        extraction_cache.reset_extraction_cache_metrics()
+        self.file_obj = File(sha256="a" * 64, file_type="document")
+
+    def test_same_content_and_prompt_is_answered_once(self):
+        extract = MagicMock(return_value="answer")
+
+        first = cached_extraction(self.file_obj, "Describe  it.", None, extract)
+        second = cached_extraction(self.file_obj, " Describe it.\n", None, extract)
+
+        self.assertEqual((first, second), ("answer", "answer"))
+        extract.assert_called_once()
+        metrics = get_extraction_cache_metrics()
+        self.assertEqual((metrics["hits"], metrics["misses"]), (1, 1))
+        self.assertEqual(metrics["hit_rate"], 0.5)
+
+    def test_other_prompt_format_or_extractor_version_is_not_reused(self):
+        extract = MagicMock(return_value="answer")
+
+        cached_extraction(self.file_obj, "Describe it.", None, extract)
+        cached_extraction(self.file_obj, "Tag it.", None, extract)
+        cached_extraction(
+            self.file_obj, "Describe it.", {"type": "json_object"}, extract
+        )
+        with patch.object(
+            extraction_cache,
+            "EXTRACTOR_VERSION",
+            extraction_cache.EXTRACTOR_VERSION + 1,
+        ):
+            cached_extraction(self.file_obj, "Describe it.", None, extract)
+
+        self.assertEqual(extract.call_count, 4)
+
+    def test_files_without_digest_are_not_cached(self):
+        extract = MagicMock(return_value="answer")
+        file_obj = File(file_type="document")
+
+        cached_extraction(file_obj, "Describe it.", None, extract)
+        cached_extraction(file_obj, "Describe it.", None, extract)
+
+        self.assertEqual(extract.call_count, 2)
+        self.assertEqual(get_extraction_cache_metrics()["uncacheable"], 2)
+
+    @override_settings(AI_RESULT_CACHE_MAX_CHARS=3)
+    def test_long_answers_are_not_cached(self):
+        extract = MagicMock(return_value="long answer")
+
+        cached_extraction(self.file_obj, "Describe it.", None, extract)
+        cached_extraction(self.file_obj, "Describe it.", None, extract)
+
+        self.assertEqual(extract.call_count, 2)
+
+    @patch("apps.files.models.document_data_extraction", return_value="answer")
+    def test_duplicate_uploads_share_answers(self, document_data_extraction):
+        first = file_recipe.make(sha256="b" * 64)
+        duplicate = file_recipe.make(sha256="b" * 64)
+
+        first.data_extraction("Summarize.")
+        result = duplicate.data_extraction("Summarize.")
+
+        self.assertEqual(result, "answer")
+        document_data_extraction.assert_called_once_with(first, "Summarize.", None)
+
+    @patch("apps.files.models.document_data_extraction", return_value="answer")
+    def test_prompts_with_metadata_are_answered_per_upload(
+        self, document_data_extraction
+    ):
+        first = file_recipe.make(sha256="c" * 64, name="first.pdf")
+        duplicate = file_recipe.make(sha256="c" * 64, name="copy.pdf")
+
+        first.data_extraction("Name it.", with_metadata=True)
+        first.data_extraction("Name it.", with_metadata=True)
+        duplicate.data_extraction("Name it.", with_metadata=True)
+
+        self.assertEqual(
+            document_data_extraction.call_args_list,
+            [
+                call(first, f"Name it.\n{first.get_meta_data()}", None),
+                call(duplicate, f"Name it.\n{duplicate.get_meta_data()}", None),
+            ],
+        )
@@ -0,0 +1,74 @@
+import json
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+
+from apps.files.models import File
+from apps.files.tests.baker_recipes import file_recipe
+from apps.files.tests.conftest import IN_MEMORY_STORAGES
+from apps.files.utils.file_utils import generate_enrichment
+
+ENRICHMENT = {
+    "filename": "42_invoice",
+    "short_description": "An invoice.",
+    "tags": ["finance", "invoice"],
+}
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class GenerateEnrichmentTests(TestCase):
+    def setUp(self):
+        self.file_obj = file_recipe.make()
+
+    def _extracted(self):
+        return dict(self.file_obj.extracted_data.values_list("name", "data"))
+
+    @override_settings(AI_ENRICHMENT_MODE="combined")
+    def test_combined_mode_makes_one_structured_call(self):
+        with patch.object(
+            File, "data_extraction", return_value=json.dumps(ENRICHMENT)
+        ) as data_extraction:
+            result = generate_enrichment(self.file_obj)
+
+        self.assertEqual(result, ("42_invoice", "An invoice.", ["finance", "invoice"]))
+        data_extraction.assert_called_once()
+        response_format = data_extraction.call_args.kwargs["response_format"]
+        self.assertEqual(response_format["type"], "json_schema")
+        self.assertEqual(
+            self._extracted(),
+            {
+                "filename_generation": "42_invoice",
+                "short_description_generation": "An invoice.",
+                "tags_generation": "finance,invoice",
+            },
+        )
+
+    @override_settings(AI_ENRICHMENT_MODE="combined")
+    def test_combined_mode_accepts_fenced_json(self):
+        response = f"```json\n{json.dumps(ENRICHMENT)}\n```"
+        with patch.object(File, "data_extraction", return_value=response):
+            result = generate_enrichment(self.file_obj)
+
+        self.assertEqual(result[0], "42_invoice")
+
+    @override_settings(AI_ENRICHMENT_MODE="combined")
+    def test_invalid_response_falls_back_to_separate_calls(self):
+        with patch.object(
+            File,
+            "data_extraction",
+            side_effect=["not json", "name", "description", "a,b"],
+        ) as data_extraction:
+            result = generate_enrichment(self.file_obj)
+
+        self.assertEqual(result, ("name", "description", ["a", "b"]))
+        self.assertEqual(data_extraction.call_count, 4)
+
+    @override_settings(AI_ENRICHMENT_MODE="separate")
+    def test_separate_mode_makes_one_call_per_field(self):
+        with patch.object(
+            File, "data_extraction", side_effect=["name", "description", "a,b"]
+        ) as data_extraction:
+            result = generate_enrichment(self.file_obj)
+
+        self.assertEqual(result, ("name", "description", ["a", "b"]))
+        self.assertEqual(data_extraction.call_count, 3)
@@ -0,0 +1,84 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from apps.files.utils import openai_client
+
+
+@override_settings(OPEN_API_KEY="sk-test")
+class OpenAIClientTests(SimpleTestCase):
+    def setUp(self):
+        openai_client._reset_after_fork()
+        self.addCleanup(openai_client._reset_after_fork)
+        cache.clear()
+
+    def test_client_is_shared_across_calls(self):
+        first = openai_client.get_openai_client()
+        second = openai_client.get_openai_client()
+
+        self.assertIs(first, second)
+        metrics = openai_client.get_openai_metrics()
+        self.assertEqual(metrics["clients_created"], 1)
+        self.assertEqual(metrics["client_reuses"], 1)
+
+    def test_reset_after_fork_builds_a_new_client(self):
+        first = openai_client.get_openai_client()
+
+        openai_client._reset_after_fork()
+
+        self.assertIsNot(openai_client.get_openai_client(), first)
+
+    def _client(self, existing=()):
+        client = MagicMock()
+        client.beta.assistants.list.return_value = list(existing)
+        client.beta.assistants.create.return_value = SimpleNamespace(id="asst_new")
+        return client
+
+    def test_assistant_is_created_once_per_version(self):
+        client = self._client()
+
+        first = openai_client.get_assistant_id(client)
+        openai_client._assistant_ids.clear()
+        second = openai_client.get_assistant_id(client)
+
+        self.assertEqual((first, second), ("asst_new", "asst_new"))
+        client.beta.assistants.create.assert_called_once()
+        metadata = client.beta.assistants.create.call_args.kwargs["metadata"]
+        self.assertEqual(
+            metadata["cloudstorm_version"], openai_client.assistant_version()
+        )
+
+    def test_assistant_is_found_by_version_after_a_cache_flush(self):
+        version = openai_client.assistant_version()
+        client = self._client(
+            [
+                SimpleNamespace(id="asst_old", metadata={"cloudstorm_version": "x"}),
+                SimpleNamespace(
+                    id="asst_current", metadata={"cloudstorm_version": version}
+                ),
+            ]
+        )
+
+        self.assertEqual(openai_client.get_assistant_id(client), "asst_current")
+        client.beta.assistants.create.assert_not_called()
+
+    def test_changed_definition_gets_a_new_version(self):
+        definition = dict(openai_client.ASSISTANT_DEFINITION, model="gpt-4.1")
+
+        self.assertNotEqual(
+            openai_client.assistant_version(definition),
+            openai_client.assistant_version(),
+        )
+
+    def test_timed_call_records_latency(self):
+        with (
+            patch.object(openai_client.time, "perf_counter", side_effect=[1.0, 1.5]),
+            openai_client.timed_call("image"),
+        ):
+            pass
+
+        metrics = openai_client.get_openai_metrics()
+        self.assertEqual(metrics["image_calls"], 1)
+        self.assertEqual(metrics["image_mean_seconds"], 0.5)
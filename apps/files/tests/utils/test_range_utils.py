@@ -0,0 +1,98 @@
+from datetime import UTC, datetime
+
+from django.test import SimpleTestCase
+from django.utils.http import http_date
+
+from apps.files.utils.range_utils import (
+    MAX_RANGES,
+    RangeNotSatisfiable,
+    if_range_matches,
+    parse_range_header,
+    stream_byteranges,
+)
+
+
+class ParseRangeHeaderTests(SimpleTestCase):
+    def test_parse_single_closed_range(self):
+        self.assertEqual(parse_range_header("bytes=0-99", 1000), [(0, 99)])
+
+    def test_parse_open_ended_range_runs_to_end_of_file(self):
+        self.assertEqual(parse_range_header("bytes=900-", 1000), [(900, 999)])
+
+    def test_parse_suffix_range(self):
+        self.assertEqual(parse_range_header("bytes=-100", 1000), [(900, 999)])
+        self.assertEqual(parse_range_header("bytes=-5000", 1000), [(0, 999)])
+
+    def test_parse_clamps_end_to_file_size(self):
+        self.assertEqual(parse_range_header("bytes=990-2000", 1000), [(990, 999)])
+
+    def test_parse_sorts_and_merges_overlapping_ranges(self):
+        self.assertEqual(
+            parse_range_header("bytes=500-600, 0-10, 5-20, 21-30", 1000),
+            [(0, 30), (500, 600)],
+        )
+
+    def test_parse_ignores_malformed_or_other_units(self):
+        for header in ("items=0-1", "bytes=", "bytes=abc", "bytes=5-1", "bytes=1"):
+            with self.subTest(header=header):
+                self.assertIsNone(parse_range_header(header, 1000))
+
+    def test_parse_raises_when_no_range_overlaps_the_file(self):
+        with self.assertRaises(RangeNotSatisfiable):
+            parse_range_header("bytes=1000-1100", 1000)
+        with self.assertRaises(RangeNotSatisfiable):
+            parse_range_header("bytes=-0", 1000)
+
+    def test_parse_ignores_header_with_too_many_ranges(self):
+        header = "bytes=" + ",".join(
+            f"{i * 10}-{i * 10}" for i in range(MAX_RANGES + 1)
+        )
+
+        self.assertIsNone(parse_range_header(header, 1000))
+
+
+class IfRangeMatchesTests(SimpleTestCase):
+    last_modified = datetime(2024, 1, 2, 3, 4, 5, tzinfo=UTC)
+
+    def test_matches_strong_etag(self):
+        self.assertTrue(if_range_matches('"0x1"', '"0x1"', self.last_modified))
+        self.assertFalse(if_range_matches('"0x2"', '"0x1"', self.last_modified))
+
+    def test_never_matches_weak_etag(self):
+        self.assertFalse(if_range_matches('W/"0x1"', '"0x1"', self.last_modified))
+
+    def test_matches_exact_last_modified_date(self):
+        date = http_date(self.last_modified.timestamp())
+
+        self.assertTrue(if_range_matches(date, '"0x1"', self.last_modified))
+        self.assertFalse(
+            if_range_matches(
+                http_date(self.last_modified.timestamp() - 1),
+                '"0x1"',
+                self.last_modified,
+            )
+        )
+
+
+class StreamByterangesTests(SimpleTestCase):
+    def test_stream_byteranges_builds_multipart_body(self):
+        data = b"0123456789"
+
+        body = b"".join(
+            stream_byteranges(
+                [(0, 1), (8, 9)],
+                len(data),
+                "text/plain",
+                "sep",
+                lambda offset, length: [data[offset : offset + length]],
+            )
+        )
+
+        self.assertEqual(
+            body,
+            b"--sep\r\nContent-Type: text/plain\r\nContent-Range: bytes 0-1/10\r\n\r\n"
+            b"01\r\n"
+            b"--sep\r\nContent-Type: text/plain\r\nContent-Range: bytes 8-9/10\r\n\r\n"
+            b"89\r\n"
+            b"--sep--\r\n",
+        )
@@ -0,0 +1,92 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import redis
+from django.test import SimpleTestCase, override_settings
+
+from apps.files.utils import rate_limit
+from apps.files.utils.rate_limit import (
+    RateLimitExceeded,
+    TokenBucketRateLimiter,
+    acquire_ai_capacity,
+    rate_limit_backoff,
+)
+
+
+class TokenBucketRateLimiterTests(SimpleTestCase):
+    def _limiter(self, waits_ms):
+        client = MagicMock()
+        client.register_script.return_value = MagicMock(side_effect=waits_ms)
+        limiter = TokenBucketRateLimiter(client, "test", 60, 1000)
+        return limiter, client.register_script.return_value
+
+    @patch.object(rate_limit.time, "sleep")
+    def test_acquire_waits_until_both_buckets_have_room(self, sleep):
+        limiter, take = self._limiter([1500, 0])
+
+        limiter.acquire(200, max_wait=10)
+
+        sleep.assert_called_once_with(1.5)
+        self.assertEqual(
+            take.call_args.kwargs,
+            {
+                "keys": ["rate-limit:test:requests", "rate-limit:test:tokens"],
+                "args": [60, 1, 1000, 200],
+            },
+        )
+
+    @patch.object(rate_limit.time, "sleep")
+    def test_acquire_raises_when_the_wait_is_too_long(self, sleep):
+        limiter, _ = self._limiter([20_000])
+
+        with self.assertRaises(RateLimitExceeded) as raised:
+            limiter.acquire(200, max_wait=10)
+
+        self.assertEqual(raised.exception.retry_after, 20)
+        sleep.assert_not_called()
+
+
+class AcquireAICapacityTests(SimpleTestCase):
+    def setUp(self):
+        rate_limit._reset_after_fork()
+        self.addCleanup(rate_limit._reset_after_fork)
+
+    @override_settings(AI_RATE_LIMIT_REQUESTS_PER_MINUTE=0)
+    @patch.object(rate_limit, "get_ai_rate_limiter")
+    def test_disabled_limiter_is_not_consulted(self, get_ai_rate_limiter):
+        acquire_ai_capacity("prompt")
+
+        get_ai_rate_limiter.assert_not_called()
+
+    @override_settings(AI_RATE_LIMIT_REQUESTS_PER_MINUTE=10, AI_RATE_LIMIT_MAX_WAIT=5)
+    @patch.object(rate_limit, "get_ai_rate_limiter")
+    def test_estimated_tokens_are_acquired(self, get_ai_rate_limiter):
+        acquire_ai_capacity("x" * 400, max_tokens=100)
+
+        get_ai_rate_limiter.return_value.acquire.assert_called_once_with(200, 5)
+
+    @override_settings(AI_RATE_LIMIT_REQUESTS_PER_MINUTE=10)
+    @patch.object(rate_limit, "get_ai_rate_limiter")
+    def test_unreachable_redis_lets_the_call_through(self, get_ai_rate_limiter):
+        get_ai_rate_limiter.return_value.acquire.side_effect = redis.ConnectionError
+
+        acquire_ai_capacity("prompt")
+
+
+@override_settings(AI_RATE_LIMIT_BACKOFF_BASE=10)
+@patch.object(rate_limit.random, "uniform", return_value=0)
+class RateLimitBackoffTests(SimpleTestCase):
+    def test_limiter_wait_is_used(self, uniform):
+        self.assertEqual(rate_limit_backoff(RateLimitExceeded(7), 3), 7)
+
+    def test_retry_after_header_is_used(self, uniform):
+        exc = SimpleNamespace(response=SimpleNamespace(headers={"retry-after": "4"}))
+
+        self.assertEqual(rate_limit_backoff(exc, 3), 4)
+
+    def test_backoff_doubles_with_each_retry(self, uniform):
+        exc = Exception("429")
+
+        self.assertEqual(
+            [rate_limit_backoff(exc, retries) for retries in range(3)], [10, 20, 40]
+        )
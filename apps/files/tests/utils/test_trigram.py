@@ -0,0 +1,85 @@
+from unittest.mock import MagicMock, patch
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase
+
+from apps.files.models import File
+from apps.files.utils.trigram import (
+    add_trigram_indexes,
+    create_missing_trigram_indexes,
+    missing_trigram_indexes,
+    trigram_available,
+    trigram_index,
+)
+
+
+class TrigramIndexTests(TestCase):
+    def test_index_covers_the_expression_icontains_filters_on(self):
+        index = trigram_index("name", "file_name_trgm")
+        with connection.schema_editor(collect_sql=True) as schema_editor:
+            index_sql = str(index.create_sql(File, schema_editor))
+        query_sql = str(File.objects.filter(name__icontains="x").query)
+
+        self.assertIn('UPPER("name") gin_trgm_ops', index_sql)
+        self.assertIn('UPPER("files_file"."name"::text) LIKE', query_sql)
+
+    def _create_indexes(self, available):
+        operation = add_trigram_indexes(
+            "files", "file", [trigram_index("name", "file_name_trgm")]
+        )
+        create_indexes = operation.database_operations[0].code
+        schema_editor = MagicMock()
+        with patch(
+            "apps.files.utils.trigram.trigram_available", return_value=available
+        ):
+            create_indexes(MagicMock(), schema_editor)
+        return schema_editor
+
+    def test_indexes_are_created_with_the_extension(self):
+        schema_editor = self._create_indexes(available=True)
+
+        schema_editor.execute.assert_called_once_with(
+            "CREATE EXTENSION IF NOT EXISTS pg_trgm"
+        )
+        schema_editor.add_index.assert_called_once()
+
+    def test_indexes_are_skipped_without_pg_trgm(self):
+        schema_editor = self._create_indexes(available=False)
+
+        schema_editor.execute.assert_not_called()
+        schema_editor.add_index.assert_not_called()
+
+    def test_missing_indexes_are_the_declared_ones_not_in_the_database(self):
+        missing = {index.name for _, index in missing_trigram_indexes(connection)}
+
+        if trigram_available(connection):
+            self.assertEqual(missing, set())
+        else:
+            self.assertEqual(
+                missing, {"file_name_trgm", "file_description_trgm", "group_name_trgm"}
+            )
+
+    def test_missing_indexes_are_created_with_the_extension(self):
+        index = trigram_index("name", "file_name_trgm")
+        mock_connection = MagicMock()
+        schema_editor = mock_connection.schema_editor.return_value.__enter__()
+        with patch(
+            "apps.files.utils.trigram.missing_trigram_indexes",
+            return_value=[(File, index)],
+        ):
+            created = create_missing_trigram_indexes(mock_connection)
+
+        self.assertEqual(created, [(File, index)])
+        schema_editor.execute.assert_called_once_with(
+            "CREATE EXTENSION IF NOT EXISTS pg_trgm"
+        )
+        schema_editor.add_index.assert_called_once_with(File, index)
+
+    @patch(
+        "apps.files.management.commands.create_trigram_indexes.trigram_available",
+        return_value=False,
+    )
+    def test_command_fails_without_pg_trgm(self, mock_trigram_available):
+        with self.assertRaises(CommandError):
+            call_command("create_trigram_indexes")
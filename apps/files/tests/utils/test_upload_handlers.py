@@ -0,0 +1,41 @@
+import hashlib
+import io
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http.multipartparser import MultiPartParser
+from django.test import SimpleTestCase, override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+
+from apps.files.utils.upload_handlers import (
+    HashingMemoryFileUploadHandler,
+    HashingTemporaryFileUploadHandler,
+)
+
+
+class HashingUploadHandlerTests(SimpleTestCase):
+    def _parse(self, data):
+        body = encode_multipart(
+            BOUNDARY, {"file": SimpleUploadedFile("a.txt", data, "text/plain")}
+        )
+        meta = {"CONTENT_TYPE": MULTIPART_CONTENT, "CONTENT_LENGTH": len(body)}
+        handlers = [
+            HashingMemoryFileUploadHandler(),
+            HashingTemporaryFileUploadHandler(),
+        ]
+        _, files = MultiPartParser(meta, io.BytesIO(body), handlers).parse()
+        return files["file"]
+
+    def test_small_upload_is_hashed_in_memory(self):
+        upload = self._parse(b"hello")
+
+        self.assertEqual(upload.sha256, hashlib.sha256(b"hello").hexdigest())
+        self.assertEqual(upload.read(), b"hello")
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=10)
+    def test_large_upload_is_hashed_while_written_to_disk(self):
+        data = bytes(range(256)) * 1000
+
+        upload = self._parse(data)
+
+        self.assertTrue(hasattr(upload, "temporary_file_path"))
+        self.assertEqual(upload.sha256, hashlib.sha256(data).hexdigest())
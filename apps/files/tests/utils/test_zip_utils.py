@@ -0,0 +1,141 @@
+import hashlib
+import io
+import zipfile
+
+from django.test import SimpleTestCase
+
+from apps.files.utils.zip_utils import (
+    ZipLimitError,
+    ZipMember,
+    ZipMemberStream,
+    check_zip_limits,
+    get_compress_type,
+    stream_zip,
+)
+
+
+class StreamZipTests(SimpleTestCase):
+    def _read_archive(self, chunks):
+        return zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+
+    def test_stream_zip_round_trips_members(self):
+        members = [
+            ZipMember(name="a.txt", chunks=[b"hello ", b"world"]),
+            ZipMember(name="b.bin", chunks=[b"\x00" * 10], size=10),
+        ]
+
+        archive = self._read_archive(stream_zip(members))
+
+        self.assertEqual(archive.namelist(), ["a.txt", "b.bin"])
+        self.assertEqual(archive.read("a.txt"), b"hello world")
+        self.assertEqual(archive.read("b.bin"), b"\x00" * 10)
+        self.assertIsNone(archive.testzip())
+
+    def test_stream_zip_yields_before_members_are_exhausted(self):
+        consumed = []
+
+        def chunks():
+            for index in range(3):
+                consumed.append(index)
+                yield bytes(64 * 1024)
+
+        stream = stream_zip([ZipMember(name="big.bin", chunks=chunks())])
+        first = next(stream)
+
+        self.assertTrue(first)
+        self.assertLess(len(consumed), 3)
+
+    def test_stream_zip_respects_compress_type(self):
+        members = [
+            ZipMember(
+                name="photo.jpg", chunks=[b"a" * 1000], compress_type=zipfile.ZIP_STORED
+            ),
+            ZipMember(name="notes.txt", chunks=[b"a" * 1000]),
+        ]
+
+        archive = self._read_archive(stream_zip(members))
+
+        self.assertEqual(archive.getinfo("photo.jpg").compress_type, zipfile.ZIP_STORED)
+        self.assertEqual(
+            archive.getinfo("notes.txt").compress_type, zipfile.ZIP_DEFLATED
+        )
+
+    def test_stream_zip_empty_members_produces_valid_archive(self):
+        archive = self._read_archive(stream_zip([]))
+
+        self.assertEqual(archive.namelist(), [])
+
+    def test_get_compress_type_stores_media_and_deflates_documents(self):
+        self.assertEqual(get_compress_type("video"), zipfile.ZIP_STORED)
+        self.assertEqual(get_compress_type("document"), zipfile.ZIP_DEFLATED)
+
+
+class CheckZipLimitsTests(SimpleTestCase):
+    limits = {"max_members": 3, "max_total_size": 10_000_000, "max_ratio": 100}
+
+    def _infos(self, members):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+            for name, data in members:
+                zf.writestr(name, data)
+        return zipfile.ZipFile(buffer).infolist()
+
+    def test_returns_file_members_without_directories(self):
+        infos = self._infos([("docs/", b""), ("docs/a.txt", b"a"), ("b.txt", b"b")])
+
+        members = check_zip_limits(infos, **self.limits)
+
+        self.assertEqual([info.filename for info in members], ["docs/a.txt", "b.txt"])
+
+    def test_refuses_too_many_members(self):
+        infos = self._infos([(f"{index}.txt", b"x") for index in range(4)])
+
+        with self.assertRaises(ZipLimitError):
+            check_zip_limits(infos, **self.limits)
+
+    def test_refuses_archives_expanding_past_the_total_size(self):
+        infos = self._infos([("a.bin", bytes(600)), ("b.bin", bytes(600))])
+
+        with self.assertRaises(ZipLimitError):
+            check_zip_limits(infos, **{**self.limits, "max_total_size": 1000})
+
+    def test_refuses_members_over_the_compression_ratio(self):
+        infos = self._infos([("bomb.txt", bytes(8 * 1024 * 1024))])
+
+        with self.assertRaises(ZipLimitError):
+            check_zip_limits(infos, **self.limits)
+
+    def test_small_members_are_not_held_to_the_ratio(self):
+        infos = self._infos([("notes.txt", bytes(64 * 1024))])
+
+        self.assertEqual(len(check_zip_limits(infos, **self.limits)), 1)
+
+    def test_refuses_encrypted_members(self):
+        [info] = self._infos([("secret.txt", b"x")])
+        info.flag_bits |= 0x1
+
+        with self.assertRaises(ZipLimitError):
+            check_zip_limits([info], **self.limits)
+
+
+class ZipMemberStreamTests(SimpleTestCase):
+    def test_reads_member_and_only_rewinds_at_the_start(self):
+        stream = ZipMemberStream(io.BytesIO(b"hello world"))
+
+        self.assertFalse(stream.seekable())
+        self.assertEqual(stream.seek(0), 0)
+        self.assertEqual(stream.read(5), b"hello")
+        self.assertEqual(stream.read(), b" world")
+        with self.assertRaises(io.UnsupportedOperation):
+            stream.seek(0)
+        with self.assertRaises(io.UnsupportedOperation):
+            stream.tell()
+
+    def test_hashes_what_is_read(self):
+        stream = ZipMemberStream(io.BytesIO(b"hello world"))
+
+        while stream.read(4):
+            pass
+
+        self.assertEqual(stream.sha256, hashlib.sha256(b"hello world").hexdigest())
+        self.assertEqual(stream.size, 11)
@@ -1,8 +1,14 @@
+import hashlib
 import io
+import os
+import threading
+import time
 import zipfile
 import uuid
 
 from django.test import TestCase, override_settings
+from PIL import Image
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
 
 from rest_framework.test import APIRequestFactory, force_authenticate
@@ -10,8 +16,10 @@ from rest_framework import status
 
 from unittest.mock import patch, MagicMock
 
+from apps.files.services import ZipIngestResult, _store_zip_member
 from apps.files.views import FilesViewSet
-from apps.files.models import File
+from apps.files.models import Blob, File
+from apps.files.utils.rate_limit import RateLimitExceeded
 
 from apps.users.tests.baker_recipes import user_recipe
 from apps.groups.tests.baker_recipes import (
@@ -127,6 +135,93 @@ class FilesViewSetListTests(TestCase):
         self.assertIn(str(doc_file.id), result_ids)
         self.assertNotIn(str(image_file.id), result_ids)
 
+    def test_list_keywords_ranks_name_matches_first(self):
+        group = group_recipe.make()
+        group_user_member_recipe.make(group=group, user=self.user)
+
+        extracted_match = file_recipe.make(
+            group=group, uploaded_by=self.user, name="Meeting notes"
+        )
+        extracted_match.create_extracted_data("summary", "Quarterly invoices")
+        name_match = file_recipe.make(
+            group=group, uploaded_by=self.user, name="Invoice March"
+        )
+        file_recipe.make(group=group, uploaded_by=self.user, name="Other")
+
+        view = FilesViewSet.as_view({"get": "list"})
+        request = self.factory.get("/files/", {"keywords": "invoice"})
+        force_authenticate(request, user=self.user)
+
+        response = view(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        result_ids = [str(f["id"]) for f in response.data["results"]]
+        self.assertEqual(result_ids, [str(name_match.id), str(extracted_match.id)])
+
+    def _list(self, params):
+        view = FilesViewSet.as_view({"get": "list"})
+        request = self.factory.get("/files/", params)
+        force_authenticate(request, user=self.user)
+        return view(request)
+
+    def _make_files(self, count):
+        group = group_recipe.make()
+        group_user_member_recipe.make(group=group, user=self.user)
+        files = file_recipe.make(group=group, uploaded_by=self.user, _quantity=count)
+        # Two files share a timestamp, the id breaks the tie.
+        File.objects.filter(id=files[2].id).update(
+            uploaded_at=File.objects.get(id=files[1].id).uploaded_at
+        )
+        return sorted(
+            File.objects.filter(group=group),
+            key=lambda file: (file.uploaded_at, file.id),
+            reverse=True,
+        )
+
+    def test_list_cursor_pagination_walks_every_file_once(self):
+        files = self._make_files(5)
+
+        seen = []
+        params = {"pagination": "cursor", "page_size": 2}
+        while True:
+            response = self._list(params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertIsNone(response.data["count"])
+            seen += [f["id"] for f in response.data["results"]]
+            if response.data["next"] is None:
+                break
+            params = {"cursor": response.data["next"], "page_size": 2}
+
+        self.assertEqual(seen, [str(file.id) for file in files])
+
+    def test_list_cursor_pagination_previous_returns_the_page_before(self):
+        files = self._make_files(5)
+        first = self._list({"pagination": "cursor", "page_size": 2})
+        second = self._list({"cursor": first.data["next"], "page_size": 2})
+
+        response = self._list({"cursor": second.data["previous"], "page_size": 2})
+
+        self.assertEqual(
+            [f["id"] for f in response.data["results"]],
+            [str(file.id) for file in files[:2]],
+        )
+        self.assertIsNone(response.data["previous"])
+        self.assertIsNotNone(response.data["next"])
+
+    def test_list_cursor_pagination_counts_on_request(self):
+        self._make_files(3)
+
+        exact = self._list({"pagination": "cursor", "count": "exact"})
+        estimate = self._list({"pagination": "cursor", "count": "estimate"})
+
+        self.assertEqual(exact.data["count"], 3)
+        self.assertIsInstance(estimate.data["count"], int)
+
+    def test_list_cursor_pagination_rejects_invalid_cursor(self):
+        response = self._list({"cursor": "not-a-cursor"})
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
 
 @override_settings(STORAGES=IN_MEMORY_STORAGES)
 class FilesViewSetRetrieveTests(TestCase):
@@ -387,6 +482,37 @@ class FilesViewSetMassFileDeleteTests(TestCase):
 
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
 
+    def test_mass_file_delete_releases_shared_content_with_the_last_file(self):
+        blob = Blob.objects.create(sha256="a" * 64, path="shared.txt", size=4)
+        files = [
+            file_recipe.make(
+                group=self.group, uploaded_by=self.user, file=name, blob=blob
+            )
+            for name in ("one.txt", "two.txt", "three.txt")
+        ]
+        Blob.objects.filter(id=blob.id).update(ref_count=3)
+
+        view = FilesViewSet.as_view({"delete": "mass_file_delete"})
+        request = self.factory.delete(
+            f"/files/mass_file_delete/?group={self.group.id}",
+            {"to_delete": [str(files[0].id), str(files[1].id)]},
+            format="json",
+        )
+        force_authenticate(request, user=self.user)
+
+        with patch("apps.files.models.default_storage.delete") as mock_delete:
+            response = view(request)
+            self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+            blob.refresh_from_db()
+            self.assertEqual(blob.ref_count, 1)
+            mock_delete.assert_not_called()
+
+            with self.captureOnCommitCallbacks(execute=True):
+                files[2].delete()
+
+        self.assertFalse(Blob.objects.filter(id=blob.id).exists())
+        mock_delete.assert_called_once_with("shared.txt")
+
     def test_mass_file_delete_returns_403_without_can_delete(self):
         member = user_recipe.make(is_verified=True)
         group_user_member_recipe.make(group=self.group, user=member, can_delete=False)
@@ -434,7 +560,7 @@ class FilesViewSetZipUploadTests(TestCase):
     def test_zip_upload_successfully_returns_200(self, mock_zip_service):
         mock_file = MagicMock()
         mock_file.id = uuid.uuid4()
-        mock_zip_service.return_value = [mock_file]
+        mock_zip_service.return_value = ZipIngestResult(files=[mock_file])
 
         zip_buffer = io.BytesIO()
         with zipfile.ZipFile(zip_buffer, "w") as zf:
@@ -521,6 +647,195 @@ class FilesViewSetZipUploadTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
 
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class FilesViewSetZipIngestTests(TestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.user = user_recipe.make(is_verified=True)
+        self.group = group_recipe.make()
+        group_user_admin_recipe.make(group=self.group, user=self.user)
+        # Members are stored from worker threads, which must not race to set
+        # up the in-memory storage each for itself.
+        default_storage.listdir("")
+
+    def _zip_upload(self, members):
+        zip_buffer = io.BytesIO()
+        with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+            for name, data in members:
+                zf.writestr(name, data)
+        zip_file = SimpleUploadedFile(
+            "archive.zip", zip_buffer.getvalue(), content_type="application/zip"
+        )
+
+        view = FilesViewSet.as_view({"post": "zip_upload"})
+        request = self.factory.post(
+            f"/files/zip_upload/?group={self.group.id}",
+            {"file": zip_file, "tags": "a,b"},
+            format="multipart",
+        )
+        force_authenticate(request, user=self.user)
+        return view(request)
+
+    @override_settings(ZIP_INGEST_BATCH_SIZE=2)
+    @patch("apps.files.services.process_file")
+    @patch("apps.files.services.group")
+    def test_zip_upload_streams_members_into_storage_in_batches(
+        self, mock_group, mock_process_file
+    ):
+        mock_group.side_effect = lambda tasks: list(tasks) and MagicMock()
+
+        response = self._zip_upload(
+            [
+                ("docs/", b""),
+                ("docs/notes.txt", b"hello world"),
+                ("photo.jpg", b"\xff\xd8" * 100),
+                ("report.pdf", b"%PDF"),
+            ]
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["files"]), 3)
+        notes = File.objects.get(name="notes.txt")
+        self.assertEqual(notes.file_size, 11)
+        self.assertEqual(notes.mime_type, "text/plain")
+        self.assertEqual(notes.file_type, "document")
+        self.assertEqual(notes.group, self.group)
+        self.assertEqual(notes.file.read(), b"hello world")
+        self.assertEqual(mock_group.call_count, 2)
+        mock_process_file.s.assert_any_call(notes.id, ["a", "b"], False)
+
+    @patch("apps.files.services.process_file")
+    @patch("apps.files.services.group")
+    def test_zip_upload_records_image_dimensions(self, mock_group, mock_process_file):
+        image = io.BytesIO()
+        Image.new("RGB", (20, 10)).save(image, "PNG")
+
+        self._zip_upload([("photo.png", image.getvalue())])
+
+        photo = File.objects.get(name="photo.png")
+        self.assertEqual((photo.width, photo.height), (20, 10))
+        self.assertEqual(photo.mime_type, "image/png")
+
+    @patch("apps.files.services.process_file")
+    @patch("apps.files.services.group")
+    def test_zip_upload_skips_members_with_disallowed_names(
+        self, mock_group, mock_process_file
+    ):
+        response = self._zip_upload([("run.exe", b"MZ"), ("ok.txt", b"ok")])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(File.objects.values_list("name", flat=True)), ["ok.txt"])
+        self.assertEqual(response.data["uploaded"], 1)
+        self.assertEqual(
+            [item["name"] for item in response.data["skipped"]], ["run.exe"]
+        )
+
+    @patch("apps.files.services.process_file")
+    @patch("apps.files.services.group")
+    @patch("apps.files.services._store_zip_member")
+    def test_zip_upload_isolates_members_that_fail_to_store(
+        self, mock_store, mock_group, mock_process_file
+    ):
+        def store(archive, info, filename, blob_name):
+            if filename == "bad.txt":
+                raise OSError("storage unavailable")
+            return _store_zip_member(archive, info, filename, blob_name)
+
+        mock_store.side_effect = store
+
+        response = self._zip_upload(
+            [("a.txt", b"a"), ("bad.txt", b"b"), ("c.txt", b"c")]
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["uploaded"], 2)
+        self.assertEqual(
+            response.data["failed"],
+            [{"name": "bad.txt", "reason": "storage unavailable"}],
+        )
+        self.assertEqual(
+            set(File.objects.values_list("name", flat=True)), {"a.txt", "c.txt"}
+        )
+
+    def _max_concurrent_uploads(self, members):
+        lock, running, peak = threading.Lock(), [0], [0]
+
+        def store(*args):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+            return _store_zip_member(*args)
+
+        with (
+            patch("apps.files.services._store_zip_member", side_effect=store),
+            patch("apps.files.services.group"),
+            patch("apps.files.services.process_file"),
+        ):
+            response = self._zip_upload(members)
+
+        self.assertEqual(response.data["uploaded"], len(members))
+        return peak[0]
+
+    @override_settings(ZIP_INGEST_WORKERS=3, ZIP_INGEST_MAX_BYTES=1000)
+    def test_zip_upload_stores_members_concurrently_up_to_the_worker_limit(self):
+        members = [(f"{index}.txt", bytes([index]) * 10) for index in range(8)]
+
+        self.assertEqual(self._max_concurrent_uploads(members), 3)
+
+    @override_settings(ZIP_INGEST_WORKERS=3, ZIP_INGEST_MAX_BYTES=150)
+    def test_zip_upload_keeps_in_flight_bytes_within_the_budget(self):
+        members = [(f"{index}.txt", bytes([index]) * 100) for index in range(4)]
+
+        self.assertEqual(self._max_concurrent_uploads(members), 1)
+
+    @patch("apps.files.services.process_file")
+    @patch("apps.files.services.group")
+    def test_zip_upload_stores_duplicate_content_once(
+        self, mock_group, mock_process_file
+    ):
+        members = [("a.txt", b"same"), ("b.txt", b"same"), ("c.txt", b"other")]
+        directory = f"uploads/{self.group.name}"
+        stored_before = set(default_storage.listdir(directory)[1])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self._zip_upload(members)
+
+        self.assertEqual(response.data["uploaded"], 3)
+        a, b, c = (File.objects.get(name=name) for name, _ in members)
+        self.assertEqual(a.blob, b.blob)
+        self.assertNotEqual(a.file.name, b.file.name)
+        self.assertEqual(a.blob.ref_count, 2)
+        self.assertEqual(a.sha256, hashlib.sha256(b"same").hexdigest())
+        with b.open_content() as content:
+            self.assertEqual(content.read(), b"same")
+        # The duplicate upload is deleted again, one copy of each content stays.
+        stored = {os.path.basename(a.blob.path), os.path.basename(c.blob.path)}
+        self.assertEqual(
+            set(default_storage.listdir(directory)[1]) - stored_before, stored
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self._zip_upload(members)
+
+        self.assertEqual(response.data["uploaded"], 3)
+        self.assertEqual(Blob.objects.count(), 2)
+        self.assertEqual(Blob.objects.get(id=a.blob_id).ref_count, 4)
+        self.assertEqual(
+            set(default_storage.listdir(directory)[1]) - stored_before, stored
+        )
+
+    @override_settings(ZIP_MAX_COMPRESSION_RATIO=10)
+    def test_zip_upload_refuses_zip_bombs_before_storing_anything(self):
+        response = self._zip_upload([("bomb.txt", bytes(4 * 1024 * 1024))])
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("compression ratio", response.data["message"])
+        self.assertFalse(File.objects.exists())
+
+
 @override_settings(STORAGES=IN_MEMORY_STORAGES)
 class FilesViewSetAIGenerateTests(TestCase):
     def setUp(self):
@@ -566,6 +881,22 @@ class FilesViewSetAIGenerateTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn("message", response.data)
 
+    @patch("apps.files.views.ai_generate_service")
+    def test_ai_generate_returns_429_when_ai_quota_is_reached(self, mock_service):
+        mock_service.side_effect = RateLimitExceeded(12)
+
+        view = FilesViewSet.as_view({"patch": "ai_generate"})
+        data = {"type": "short_description"}
+        request = self.factory.patch(
+            f"/files/{self.file.id}/ai_generate/", data, format="json"
+        )
+        force_authenticate(request, user=self.user)
+
+        response = view(request, pk=str(self.file.id))
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertGreaterEqual(int(response["Retry-After"]), 12)
+
     def test_ai_generate_returns_403_when_file_status_is_generate(self):
         # CanEdit.has_object_permission returns False when status=="generate",
         # so the permission layer raises 403 before the serializer validates.
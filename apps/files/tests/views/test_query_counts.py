@@ -0,0 +1,80 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework import status
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.files.views import FilesViewSet
+from apps.users.tests.baker_recipes import user_recipe
+from apps.groups.tests.baker_recipes import group_recipe, group_user_admin_recipe
+from apps.files.tests.baker_recipes import file_recipe
+from apps.files.tests.conftest import IN_MEMORY_STORAGES
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class FilesViewSetQueryCountTests(TestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.user = user_recipe.make(is_verified=True)
+        self.group = group_recipe.make(is_private=True)
+        group_user_admin_recipe.make(
+            group=self.group, user=self.user, can_edit=True, can_delete=True
+        )
+        self.file_obj = file_recipe.make(group=self.group, uploaded_by=self.user)
+
+    def _call(self, actions, request, **kwargs):
+        force_authenticate(request, user=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = FilesViewSet.as_view(actions)(request, **kwargs)
+            response.render()
+        membership_queries = [
+            query
+            for query in queries.captured_queries
+            if 'FROM "groups_groupuser"' in query["sql"]
+        ]
+        self.assertEqual(len(membership_queries), 1)
+        return response, len(queries)
+
+    def test_retrieve_resolves_membership_once(self):
+        response, count = self._call(
+            {"get": "retrieve"}, self.factory.get("/"), pk=str(self.file_obj.id)
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Membership, file, tags and extracted data.
+        self.assertEqual(count, 4)
+
+    def test_list_resolves_membership_once(self):
+        response, count = self._call({"get": "list"}, self.factory.get("/"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Membership, count and page.
+        self.assertEqual(count, 3)
+
+    def test_cursor_list_skips_count(self):
+        response, count = self._call(
+            {"get": "list"}, self.factory.get("/", {"pagination": "cursor"})
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Membership and page.
+        self.assertEqual(count, 2)
+
+    def test_partial_update_resolves_membership_once(self):
+        request = self.factory.patch("/", {"short_description": "x"}, format="json")
+
+        response, count = self._call(
+            {"patch": "partial_update"}, request, pk=str(self.file_obj.id)
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Membership, file, update, search document and tags.
+        self.assertEqual(count, 5)
+
+    def test_destroy_resolves_membership_once(self):
+        response, _ = self._call(
+            {"delete": "destroy"}, self.factory.delete("/"), pk=str(self.file_obj.id)
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
@@ -1,3 +1,5 @@
+from datetime import UTC, datetime
+
 from django.test import TestCase, override_settings
 from django.urls import reverse
 
@@ -6,11 +8,21 @@ from rest_framework import status
 
 from unittest.mock import patch, MagicMock
 
+import requests
+from azure.core.exceptions import ResourceModifiedError
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from apps.files.models import Blob, File
+from apps.files.utils.blob_metadata import BlobMetadata
 from apps.files.views import SecureAzureBlobView
 
 from apps.users.tests.baker_recipes import user_recipe
 from apps.groups.tests.baker_recipes import group_recipe, group_user_member_recipe
 from apps.files.tests.baker_recipes import file_recipe
+from apps.files.utils.azurite import BlobStandIn
 from apps.files.tests.conftest import IN_MEMORY_STORAGES
 
 
@@ -29,14 +41,25 @@ class SecureAzureBlobViewTests(TestCase):
             name="sample.txt",
         )
         self.filename = self.file_obj.file.name.split("/")[-1]
+        cache.clear()
+
+        patcher = patch(
+            "apps.files.views.get_blob_metadata",
+            return_value=BlobMetadata(
+                etag='"0x1"',
+                last_modified=datetime(2024, 1, 2, tzinfo=UTC),
+                size=12,
+                content_type="text/plain",
+            ),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
-    @patch("apps.files.views.BlobServiceClient")
-    @patch("apps.files.permissions.File.objects.get")
-    def test_get_streams_file_from_azure(self, mock_file_get, mock_blob_service_client):
-        mock_file_get.return_value = self.file_obj
+    @patch("apps.files.views.get_blob_client")
+    def test_get_streams_file_from_azure(self, mock_get_blob_client):
 
         mock_blob_client = MagicMock()
-        mock_blob_service_client.from_connection_string.return_value.get_blob_client.return_value = mock_blob_client
+        mock_get_blob_client.return_value = mock_blob_client
 
         mock_stream = MagicMock()
         mock_stream.chunks.return_value = iter([b"file content"])
@@ -57,15 +80,9 @@ class SecureAzureBlobViewTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn(self.filename, response["Content-Disposition"])
 
-    @patch("apps.files.views.BlobServiceClient")
-    @patch("apps.files.permissions.File.objects.get")
-    def test_get_returns_404_when_azure_raises_exception(
-        self, mock_file_get, mock_blob_service_client
-    ):
-        mock_file_get.return_value = self.file_obj
-        mock_blob_service_client.from_connection_string.side_effect = Exception(
-            "Azure unavailable"
-        )
+    @patch("apps.files.views.get_blob_client")
+    def test_get_returns_404_when_azure_raises_exception(self, mock_get_blob_client):
+        mock_get_blob_client.side_effect = Exception("Azure unavailable")
 
         view = SecureAzureBlobView.as_view()
         request = self.factory.get(f"/files/media/{self.group.name}/{self.filename}/")
@@ -81,17 +98,12 @@ class SecureAzureBlobViewTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
         self.assertIn("message", response.data)
 
-    @patch("apps.files.permissions.File.objects.get")
-    def test_get_returns_403_when_user_has_no_access_to_private_file(
-        self, mock_file_get
-    ):
+    def test_get_returns_403_when_user_has_no_access_to_private_file(self):
         private_group = group_recipe.make(is_private=True)
         other_user = user_recipe.make()
         group_user_member_recipe.make(group=private_group, user=other_user)
         private_file = file_recipe.make(group=private_group, uploaded_by=other_user)
 
-        mock_file_get.return_value = private_file
-
         view = SecureAzureBlobView.as_view()
         filename = private_file.file.name.split("/")[-1]
         request = self.factory.get(f"/files/media/{private_group.name}/{filename}/")
@@ -106,15 +118,11 @@ class SecureAzureBlobViewTests(TestCase):
 
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
-    @patch("apps.files.views.BlobServiceClient")
-    @patch("apps.files.permissions.File.objects.get")
-    def test_get_returns_correct_content_disposition_header(
-        self, mock_file_get, mock_blob_service_client
-    ):
-        mock_file_get.return_value = self.file_obj
+    @patch("apps.files.views.get_blob_client")
+    def test_get_returns_correct_content_disposition_header(self, mock_get_blob_client):
 
         mock_blob_client = MagicMock()
-        mock_blob_service_client.from_connection_string.return_value.get_blob_client.return_value = mock_blob_client
+        mock_get_blob_client.return_value = mock_blob_client
 
         mock_stream = MagicMock()
         mock_stream.chunks.return_value = iter([b"content"])
@@ -139,3 +147,377 @@ class SecureAzureBlobViewTests(TestCase):
             response["Content-Disposition"],
             f'attachment; filename="{self.filename}"',
         )
+
+
+class _FakeRangeBlobClient:
+    def __init__(self, data, etag='"0x1"', content_type="video/mp4"):
+        self.data = data
+        self.etag = etag
+        self.last_modified = datetime(2024, 1, 2, 3, 4, 5, tzinfo=UTC)
+        self.content_type = content_type
+        self.downloads = []
+
+    def get_blob_properties(self):
+        properties = MagicMock()
+        properties.size = len(self.data)
+        properties.etag = self.etag
+        properties.last_modified = self.last_modified
+        properties.content_settings.content_type = self.content_type
+        return properties
+
+    def download_blob(self, offset=None, length=None, etag=None, **kwargs):
+        if etag is not None and etag != self.etag:
+            raise ResourceModifiedError("blob changed")
+        self.downloads.append((offset, length))
+        start = offset or 0
+        end = len(self.data) if length is None else start + length
+        stream = MagicMock()
+        stream.chunks.return_value = iter([self.data[start:end]])
+        stream.properties.content_settings.content_type = self.content_type
+        return stream
+
+
+class _FakeBlobViewMixin:
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.user = user_recipe.make()
+        self.group = group_recipe.make(is_private=False)
+        group_user_member_recipe.make(group=self.group, user=self.user)
+        self.file_obj = file_recipe.make(group=self.group, uploaded_by=self.user)
+        self.filename = self.file_obj.file.name.split("/")[-1]
+        self.blob_client = _FakeRangeBlobClient(b"0123456789")
+
+        for target in (
+            "apps.files.views.get_blob_client",
+            "apps.files.utils.blob_metadata.get_blob_client",
+        ):
+            patcher = patch(target, return_value=self.blob_client)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        cache.clear()
+
+    def _get(self, **headers):
+        request = self.factory.get(
+            f"/files/media/{self.group.name}/{self.filename}/", headers=headers
+        )
+        request.resolver_match = MagicMock()
+        request.resolver_match.kwargs = {
+            "group_name": self.group.name,
+            "filename": self.filename,
+        }
+        force_authenticate(request, user=self.user)
+        return SecureAzureBlobView.as_view()(
+            request, group_name=self.group.name, filename=self.filename
+        )
+
+
+@override_settings(
+    STORAGES=IN_MEMORY_STORAGES, AZURE_CONNECTION_STRING="fake", AZURE_CONTAINER="fake"
+)
+class SecureAzureBlobViewRangeTests(_FakeBlobViewMixin, TestCase):
+    def test_get_without_range_streams_whole_file(self):
+        response = self._get()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+
+    def test_get_single_range_returns_partial_content(self):
+        response = self._get(Range="bytes=2-5")
+
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response["Content-Range"], "bytes 2-5/10")
+        self.assertEqual(response["Content-Length"], "4")
+        self.assertEqual(response["Content-Type"], "video/mp4")
+        self.assertEqual(b"".join(response.streaming_content), b"2345")
+        self.assertEqual(self.blob_client.downloads, [(2, 4)])
+
+    def test_get_suffix_range_returns_tail_of_file(self):
+        response = self._get(Range="bytes=-3")
+
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response["Content-Range"], "bytes 7-9/10")
+        self.assertEqual(b"".join(response.streaming_content), b"789")
+
+    def test_get_multiple_ranges_returns_multipart_byteranges(self):
+        response = self._get(Range="bytes=0-1,8-")
+
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        content_type = response["Content-Type"]
+        self.assertTrue(content_type.startswith("multipart/byteranges; boundary="))
+        body = b"".join(response.streaming_content)
+        self.assertIn(b"Content-Range: bytes 0-1/10\r\n\r\n01\r\n", body)
+        self.assertIn(b"Content-Range: bytes 8-9/10\r\n\r\n89\r\n", body)
+        self.assertEqual(self.blob_client.downloads, [(0, 2), (8, 2)])
+
+    def test_get_unsatisfiable_range_returns_416(self):
+        response = self._get(Range="bytes=50-60")
+
+        self.assertEqual(
+            response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+        )
+        self.assertEqual(response["Content-Range"], "bytes */10")
+        self.assertEqual(self.blob_client.downloads, [])
+
+    def test_get_malformed_range_serves_whole_file(self):
+        response = self._get(Range="bytes=abc")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+
+    def test_get_if_range_matching_etag_returns_partial_content(self):
+        response = self._get(Range="bytes=0-0", If_Range='"0x1"')
+
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b"".join(response.streaming_content), b"0")
+
+    def test_get_if_range_with_stale_etag_serves_whole_file(self):
+        response = self._get(Range="bytes=0-0", If_Range='"0x0"')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+
+
+@override_settings(
+    STORAGES=IN_MEMORY_STORAGES,
+    AZURE_CONNECTION_STRING="fake",
+    AZURE_CONTAINER="fake",
+    MEDIA_CACHE_MAX_AGE=0,
+)
+class SecureAzureBlobViewConditionalTests(_FakeBlobViewMixin, TestCase):
+    def test_get_exposes_validators_and_private_cache_control(self):
+        response = self._get()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["ETag"], '"0x1"')
+        self.assertEqual(response["Last-Modified"], "Tue, 02 Jan 2024 03:04:05 GMT")
+        self.assertEqual(response["Content-Length"], "10")
+        self.assertEqual(
+            sorted(response["Cache-Control"].split(", ")),
+            ["max-age=0", "must-revalidate", "private"],
+        )
+
+    def test_get_returns_304_when_etag_matches(self):
+        response = self._get(If_None_Match='"0x1"')
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], '"0x1"')
+        self.assertIn("private", response["Cache-Control"])
+        self.assertEqual(self.blob_client.downloads, [])
+
+    def test_get_returns_304_when_not_modified_since(self):
+        response = self._get(If_Modified_Since="Wed, 03 Jan 2024 00:00:00 GMT")
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(self.blob_client.downloads, [])
+
+    def test_get_streams_file_when_etag_differs(self):
+        response = self._get(If_None_Match='"0x0"')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+
+    def test_repeat_requests_read_metadata_from_cache(self):
+        with patch.object(
+            self.blob_client,
+            "get_blob_properties",
+            wraps=self.blob_client.get_blob_properties,
+        ) as mock_properties:
+            self._get()
+            response = self._get(If_None_Match='"0x1"')
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        mock_properties.assert_called_once()
+
+    def test_get_refreshes_stale_metadata_when_blob_changed(self):
+        self._get(If_None_Match='"0x1"')
+        self.blob_client.etag = '"0x2"'
+        self.blob_client.data = b"new content"
+
+        response = self._get()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["ETag"], '"0x2"')
+        self.assertEqual(b"".join(response.streaming_content), b"new content")
+
+
+@override_settings(
+    STORAGES=IN_MEMORY_STORAGES, AZURE_CONNECTION_STRING="fake", AZURE_CONTAINER="fake"
+)
+class SecureAzureBlobViewAccessLookupTests(_FakeBlobViewMixin, TestCase):
+    def test_access_is_decided_with_one_joined_file_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self._get()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        file_queries = [
+            query["sql"]
+            for query in queries.captured_queries
+            if 'FROM "files_file"' in query["sql"]
+        ]
+        self.assertEqual(len(file_queries), 1)
+        self.assertIn('JOIN "groups_group"', file_queries[0])
+
+    def test_repeat_requests_do_not_query_the_database(self):
+        self._get()
+
+        with self.assertNumQueries(0):
+            response = self._get()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_deleted_file_is_no_longer_served(self):
+        self._get()
+
+        self.file_obj.delete()
+
+        self.assertEqual(self._get().status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_bulk_deleted_file_is_no_longer_served(self):
+        self._get()
+
+        File.objects.filter(id=self.file_obj.id).delete()
+
+        self.assertEqual(self._get().status_code, status.HTTP_403_FORBIDDEN)
+
+
+@override_settings(
+    STORAGES=IN_MEMORY_STORAGES, AZURE_CONNECTION_STRING="fake", AZURE_CONTAINER="fake"
+)
+class SecureAzureBlobViewContentAddressedTests(_FakeBlobViewMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.sha256 = "ab" * 32
+        blob = Blob.objects.create(
+            sha256=self.sha256, path="uploads/shared.txt", size=10, ref_count=1
+        )
+        File.objects.filter(id=self.file_obj.id).update(
+            blob=blob, sha256=self.sha256, file_size=10, mime_type="text/plain"
+        )
+
+    def test_get_serves_deduplicated_file_without_reading_blob_properties(self):
+        with (
+            patch.object(
+                self.blob_client, "get_blob_properties", side_effect=AssertionError
+            ),
+            patch(
+                "apps.files.views.get_blob_client", return_value=self.blob_client
+            ) as mock_get_blob_client,
+        ):
+            response = self._get(Range="bytes=2-5")
+
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response["ETag"], f'"{self.sha256}"')
+        self.assertEqual(response["Content-Type"], "text/plain")
+        self.assertEqual(b"".join(response.streaming_content), b"2345")
+        mock_get_blob_client.assert_called_once_with("uploads/shared.txt")
+
+    def test_get_returns_304_for_the_content_hash(self):
+        response = self._get(If_None_Match=f'"{self.sha256}"')
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(self.blob_client.downloads, [])
+
+
+class SecureAzureBlobViewSignedUrlTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.storage = BlobStandIn().start()
+        cls.addClassCleanup(cls.storage.stop)
+
+    def setUp(self):
+        settings_override = override_settings(
+            STORAGES=IN_MEMORY_STORAGES,
+            AZURE_CONNECTION_STRING=self.storage.connection_string,
+            AZURE_CONTAINER="media",
+            MEDIA_DOWNLOAD_MODE="proxy",
+            MEDIA_SAS_EXPIRY_SECONDS=60,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+
+        self.factory = APIRequestFactory()
+        self.user = user_recipe.make()
+        self.group = group_recipe.make(is_private=False)
+        group_user_member_recipe.make(group=self.group, user=self.user)
+        self.file_obj = file_recipe.make(group=self.group, uploaded_by=self.user)
+        self.filename = self.file_obj.file.name.split("/")[-1]
+        self.storage.put(
+            "media", f"uploads/{self.group.name}/{self.filename}", b"0123456789"
+        )
+
+    def _get(self, query=""):
+        request = self.factory.get(
+            f"/files/media/{self.group.name}/{self.filename}/{query}"
+        )
+        request.resolver_match = MagicMock()
+        request.resolver_match.kwargs = {
+            "group_name": self.group.name,
+            "filename": self.filename,
+        }
+        force_authenticate(request, user=self.user)
+        return SecureAzureBlobView.as_view()(
+            request, group_name=self.group.name, filename=self.filename
+        )
+
+    def test_redirect_mode_sends_client_to_signed_storage_url(self):
+        response = self._get("?mode=redirect")
+
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.assertIn("no-store", response["Cache-Control"])
+        blob_response = requests.get(response["Location"], timeout=10)
+        self.assertEqual(blob_response.status_code, 200)
+        self.assertEqual(blob_response.content, b"0123456789")
+        self.assertEqual(
+            blob_response.headers["Content-Disposition"],
+            f'attachment; filename="{self.filename}"',
+        )
+
+    def test_url_mode_returns_signed_url_and_expiry(self):
+        response = self._get("?mode=url")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("expires_at", response.data)
+        self.assertEqual(
+            requests.get(response.data["url"], timeout=10).content, b"0123456789"
+        )
+
+    def test_default_mode_comes_from_settings(self):
+        with override_settings(MEDIA_DOWNLOAD_MODE="redirect"):
+            response = self._get()
+
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+
+    def test_proxy_mode_streams_through_the_api(self):
+        response = self._get("?mode=proxy")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+
+    def test_signed_url_is_limited_to_the_requested_blob(self):
+        self.storage.put("media", f"uploads/{self.group.name}/other.txt", b"secret")
+
+        url = self._get("?mode=url").data["url"]
+        other_url = url.replace(f"/{self.filename}?", "/other.txt?")
+
+        self.assertEqual(requests.get(other_url, timeout=10).status_code, 403)
+
+    def test_signed_url_cannot_be_upgraded_to_write(self):
+        url = self._get("?mode=url").data["url"]
+
+        self.assertEqual(
+            requests.get(url.replace("sp=r", "sp=rw"), timeout=10).status_code, 403
+        )
+
+    def test_signed_url_stops_working_after_expiry(self):
+        with override_settings(MEDIA_SAS_EXPIRY_SECONDS=-1):
+            url = self._get("?mode=url").data["url"]
+
+        self.assertEqual(requests.get(url, timeout=10).status_code, 403)
+
+    def test_unknown_mode_returns_400(self):
+        response = self._get("?mode=bogus")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,376 @@
+import base64
+import hashlib
+from datetime import UTC, datetime, timedelta
+from unittest.mock import MagicMock, patch
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from apps.files.models import File, UploadSession
+from apps.files.tests.baker_recipes import file_recipe
+from apps.files.tests.conftest import IN_MEMORY_STORAGES
+from apps.files.utils.azurite import BlobStandIn
+from apps.files.views import UploadSessionViewSet
+from apps.groups.models import Group
+from apps.groups.tests.baker_recipes import (
+    group_recipe,
+    group_user_admin_recipe,
+    group_user_member_recipe,
+)
+from apps.users.tests.baker_recipes import user_recipe
+
+
+def content_md5(data):
+    return base64.b64encode(hashlib.md5(data, usedforsecurity=False).digest()).decode()
+
+
+class UploadSessionViewSetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.storage = BlobStandIn().start()
+        cls.addClassCleanup(cls.storage.stop)
+
+    def setUp(self):
+        settings_override = override_settings(
+            STORAGES=IN_MEMORY_STORAGES,
+            AZURE_CONNECTION_STRING=self.storage.connection_string,
+            AZURE_CONTAINER="media",
+            UPLOAD_BLOCK_SIZE=4,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        # Celery is not running; record the tasks handed to group() instead.
+        self.dispatched = []
+        group_patcher = patch(
+            "apps.files.services.group",
+            side_effect=lambda tasks: self.dispatched.extend(tasks) or MagicMock(),
+        )
+        process_file_patcher = patch("apps.files.services.process_file")
+        group_patcher.start()
+        self.mock_process_file = process_file_patcher.start()
+        self.addCleanup(group_patcher.stop)
+        self.addCleanup(process_file_patcher.stop)
+
+        self.factory = APIRequestFactory()
+        self.user = user_recipe.make()
+        self.group = group_recipe.make(max_size=1000)
+        group_user_admin_recipe.make(group=self.group, user=self.user)
+
+    def _create(self, files, user=None, **data):
+        request = self.factory.post(
+            f"/api/files/upload_sessions/?group={self.group.id}",
+            {"files": files, **data},
+            format="json",
+        )
+        force_authenticate(request, user=user or self.user)
+        return UploadSessionViewSet.as_view({"post": "create"})(request)
+
+    def _commit(self, session_id, user=None):
+        request = self.factory.post(f"/api/files/upload_sessions/{session_id}/commit/")
+        force_authenticate(request, user=user or self.user)
+        return UploadSessionViewSet.as_view({"post": "commit"})(
+            request, pk=str(session_id)
+        )
+
+    def _put_chunk(self, session_id, slot_id, index, data, **headers):
+        request = self.factory.put(
+            f"/api/files/upload_sessions/{session_id}/slots/{slot_id}/chunks/{index}/",
+            data,
+            content_type="application/octet-stream",
+            **headers,
+        )
+        force_authenticate(request, user=self.user)
+        return UploadSessionViewSet.as_view({"put": "upload_chunk"})(
+            request, pk=str(session_id), slot_id=str(slot_id), index=str(index)
+        )
+
+    def _retrieve(self, session_id):
+        request = self.factory.get(f"/api/files/upload_sessions/{session_id}/")
+        force_authenticate(request, user=self.user)
+        return UploadSessionViewSet.as_view({"get": "retrieve"})(
+            request, pk=str(session_id)
+        )
+
+    def _chunks(self, session_id):
+        request = self.factory.get(f"/api/files/upload_sessions/{session_id}/chunks/")
+        force_authenticate(request, user=self.user)
+        return UploadSessionViewSet.as_view({"get": "chunks"})(
+            request, pk=str(session_id)
+        )
+
+    def _upload_blocks(self, slot, data, skip=()):
+        for index, url in enumerate(slot["block_urls"]):
+            if index in skip:
+                continue
+            block = data[index * slot["block_size"] : (index + 1) * slot["block_size"]]
+            self.assertEqual(requests.put(url, data=block, timeout=10).status_code, 201)
+
+    def test_create_returns_slots_with_presigned_block_urls(self):
+        response = self._create([{"name": "clip.mp4", "size": 10}], tags="a,b")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        [slot] = response.data["slots"]
+        self.assertEqual(slot["name"], "clip.mp4")
+        self.assertEqual(slot["content_type"], "video/mp4")
+        self.assertEqual(slot["block_size"], 4)
+        self.assertEqual(slot["block_count"], 3)
+        self.assertEqual(len(slot["block_urls"]), 3)
+        self.assertTrue(all("comp=block" in url for url in slot["block_urls"]))
+        session = UploadSession.objects.get(id=response.data["id"])
+        self.assertEqual(session.tags, "a,b")
+
+    def test_commit_creates_files_from_blocks_uploaded_to_storage(self):
+        response = self._create(
+            [{"name": "notes.txt", "size": 10}, {"name": "b.pdf", "size": 3}],
+            ai_enabled=True,
+        )
+        first, second = response.data["slots"]
+        self._upload_blocks(first, b"0123456789")
+        self._upload_blocks(second, b"pdf")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            commit_response = self._commit(response.data["id"])
+
+        self.assertEqual(commit_response.status_code, status.HTTP_201_CREATED)
+        files = File.objects.filter(id__in=commit_response.data["files"])
+        notes = files.get(name="notes.txt")
+        self.assertEqual(notes.file_size, 10)
+        self.assertEqual(notes.file_type, "document")
+        self.assertEqual(notes.uploaded_by, self.user)
+        self.assertEqual(self.storage.get("media", notes.file.name), b"0123456789")
+        self.assertEqual(len(self.dispatched), 2)
+        self.mock_process_file.s.assert_any_call(notes.id, [""], True)
+
+    def test_commit_reports_missing_blocks(self):
+        response = self._create([{"name": "notes.txt", "size": 10}])
+        [slot] = response.data["slots"]
+        self._upload_blocks(slot, b"0123456789", skip={1})
+
+        commit_response = self._commit(response.data["id"])
+
+        self.assertEqual(commit_response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(commit_response.data["missing_blocks"], {slot["id"]: [1]})
+        self.assertFalse(File.objects.exists())
+        self.assertEqual(self.dispatched, [])
+
+    def test_commit_twice_returns_the_same_files(self):
+        response = self._create([{"name": "notes.txt", "size": 4}])
+        self._upload_blocks(response.data["slots"][0], b"data")
+
+        first = self._commit(response.data["id"])
+        second = self._commit(response.data["id"])
+
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(first.data["files"], second.data["files"])
+        self.assertEqual(File.objects.count(), 1)
+        self.assertEqual(len(self.dispatched), 1)
+
+    def test_commit_rejects_expired_session(self):
+        response = self._create([{"name": "notes.txt", "size": 4}])
+        UploadSession.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        commit_response = self._commit(response.data["id"])
+
+        self.assertEqual(commit_response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_commit_of_another_users_session_returns_404(self):
+        response = self._create([{"name": "notes.txt", "size": 4}])
+
+        commit_response = self._commit(response.data["id"], user=user_recipe.make())
+
+        self.assertEqual(commit_response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_create_truncates_long_names_to_fit_the_file_column(self):
+        name = f"{'x' * 200}.txt"
+
+        response = self._create([{"name": name, "size": 4}])
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        slot = UploadSession.objects.get().slots.get()
+        self.assertEqual(slot.name, name)
+        self.assertLessEqual(
+            len(slot.blob_name), File._meta.get_field("file").max_length
+        )
+        self.assertTrue(slot.blob_name.endswith(".txt"))
+
+    def test_create_rejects_sessions_over_group_quota(self):
+        stored = file_recipe.make(group=self.group)
+        # File.save() derives file_size from the stored content.
+        File.objects.filter(id=stored.id).update(file_size=900)
+        self._create([{"name": "a.txt", "size": 50}])
+
+        response = self._create([{"name": "b.txt", "size": 60}])
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(UploadSession.objects.count(), 1)
+
+    def test_create_accepts_sessions_within_the_default_quota(self):
+        self.group.max_size = Group._meta.get_field("max_size").default
+        self.group.save(update_fields=["max_size"])
+
+        response = self._create([{"name": "clip.mp4", "size": 3_000_000}])
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_commit_records_sizes_over_2_gib(self):
+        size = 3 * 1024**3
+        self.group.max_size = 4 * 1024**3
+        self.group.save(update_fields=["max_size"])
+        response = self._create([{"name": "clip.mp4", "size": size}])
+        [slot] = response.data["slots"]
+
+        # Staging 3 GiB is out of reach here, storage reports every block.
+        with (
+            patch(
+                "apps.files.services.uploaded_chunks",
+                side_effect=lambda slot: list(range(slot.block_count)),
+            ),
+            patch("apps.files.services.get_blob_client"),
+        ):
+            commit_response = self._commit(response.data["id"])
+
+        self.assertEqual(commit_response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(File.objects.get(name="clip.mp4").file_size, size)
+        self.assertEqual(slot["block_size"], -(-size // 50_000))
+
+    def test_create_rejects_disallowed_file_names(self):
+        for name in ("run.exe", "../secret.txt", "bad$name.txt"):
+            with self.subTest(name=name):
+                response = self._create([{"name": name, "size": 4}])
+
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_create_requires_add_permission(self):
+        member = user_recipe.make()
+        group_user_member_recipe.make(group=self.group, user=member)
+
+        response = self._create([{"name": "a.txt", "size": 4}], user=member)
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_block_urls_do_not_grant_read_access(self):
+        self.storage.put("media", "uploads/secret.txt", b"secret")
+        response = self._create([{"name": "a.txt", "size": 4}])
+        url = response.data["slots"][0]["block_urls"][0]
+
+        self.assertEqual(requests.get(url, timeout=10).status_code, 403)
+
+    @override_settings(UPLOAD_BLOCK_URL_EXPIRY_SECONDS=60)
+    def test_block_urls_expire_soon_and_are_reissued_on_retrieve(self):
+        response = self._create([{"name": "a.txt", "size": 4}])
+        url = response.data["slots"][0]["block_urls"][0]
+
+        expiry = datetime.strptime(
+            parse_qs(urlsplit(url).query)["se"][0], "%Y-%m-%dT%H:%M:%SZ"
+        ).replace(tzinfo=UTC)
+        self.assertLessEqual(expiry, timezone.now() + timedelta(seconds=60))
+
+        retrieved = self._retrieve(response.data["id"])
+        self._upload_blocks(retrieved.data["slots"][0], b"data")
+        self.assertEqual(
+            self._commit(response.data["id"]).status_code, status.HTTP_201_CREATED
+        )
+
+    def test_no_block_urls_are_issued_once_the_session_is_committed(self):
+        response = self._create([{"name": "a.txt", "size": 4}])
+        self._upload_blocks(response.data["slots"][0], b"data")
+        self._commit(response.data["id"])
+
+        retrieved = self._retrieve(response.data["id"])
+
+        self.assertEqual(retrieved.data["status"], "committed")
+        self.assertEqual(retrieved.data["slots"][0]["block_urls"], [])
+
+    def test_chunks_uploaded_through_the_api_in_any_order_are_committed(self):
+        response = self._create([{"name": "notes.txt", "size": 10}])
+        session_id, slot_id = response.data["id"], response.data["slots"][0]["id"]
+
+        for index, chunk in [(2, b"89"), (0, b"0123"), (1, b"4567")]:
+            md5 = content_md5(chunk)
+            chunk_response = self._put_chunk(
+                session_id, slot_id, index, chunk, HTTP_CONTENT_MD5=md5
+            )
+            self.assertEqual(chunk_response.status_code, status.HTTP_201_CREATED)
+
+        commit_response = self._commit(session_id)
+
+        self.assertEqual(commit_response.status_code, status.HTTP_201_CREATED)
+        file = File.objects.get(id=commit_response.data["files"][0])
+        self.assertEqual(self.storage.get("media", file.file.name), b"0123456789")
+
+    def test_chunks_lists_uploaded_and_missing_chunks_for_resuming(self):
+        response = self._create([{"name": "notes.txt", "size": 10}])
+        session_id, slot_id = response.data["id"], response.data["slots"][0]["id"]
+        self._put_chunk(session_id, slot_id, 0, b"0123")
+        self._put_chunk(session_id, slot_id, 2, b"89")
+
+        chunks_response = self._chunks(session_id)
+
+        self.assertEqual(chunks_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            chunks_response.data["slots"],
+            [{"id": slot_id, "uploaded_chunks": [0, 2], "missing_chunks": [1]}],
+        )
+
+    def test_chunk_with_bad_checksum_is_not_staged(self):
+        response = self._create([{"name": "notes.txt", "size": 4}])
+        session_id, slot_id = response.data["id"], response.data["slots"][0]["id"]
+        md5 = content_md5(b"other")
+
+        chunk_response = self._put_chunk(
+            session_id, slot_id, 0, b"0123", HTTP_CONTENT_MD5=md5
+        )
+
+        self.assertEqual(chunk_response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            self._chunks(session_id).data["slots"][0]["uploaded_chunks"], []
+        )
+
+    def test_chunk_must_match_the_expected_size_and_index(self):
+        response = self._create([{"name": "notes.txt", "size": 10}])
+        session_id, slot_id = response.data["id"], response.data["slots"][0]["id"]
+
+        for index, chunk in [(0, b"012"), (0, b"01234"), (2, b"890"), (3, b"x")]:
+            with self.subTest(index=index, chunk=chunk):
+                chunk_response = self._put_chunk(session_id, slot_id, index, chunk)
+
+                self.assertEqual(
+                    chunk_response.status_code, status.HTTP_400_BAD_REQUEST
+                )
+
+    def test_chunk_is_rejected_once_the_session_is_committed(self):
+        response = self._create([{"name": "notes.txt", "size": 4}])
+        session_id, slot_id = response.data["id"], response.data["slots"][0]["id"]
+        self._put_chunk(session_id, slot_id, 0, b"0123")
+        self._commit(session_id)
+
+        chunk_response = self._put_chunk(session_id, slot_id, 0, b"abcd")
+
+        self.assertEqual(chunk_response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            self.storage.get("media", File.objects.get().file.name), b"0123"
+        )
+
+    @override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=2)
+    def test_chunk_body_bypasses_the_request_body_size_limit(self):
+        response = self._create([{"name": "notes.txt", "size": 4}])
+        session_id, slot_id = response.data["id"], response.data["slots"][0]["id"]
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+
+        chunk_response = client.put(
+            f"/api/files/upload_sessions/{session_id}/slots/{slot_id}/chunks/0/",
+            b"0123",
+            content_type="application/octet-stream",
+        )
+
+        self.assertEqual(chunk_response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            self._chunks(session_id).data["slots"][0]["uploaded_chunks"], [0]
+        )
@@ -1,12 +1,14 @@
 from django.urls import path
 
-from .views import SecureAzureBlobView, FilesViewSet
+from .views import SecureAzureBlobView, FilesViewSet, UploadSessionViewSet
 from rest_framework import routers
 
 app_name = "files"
 
 router = routers.DefaultRouter()
 
+# Registered before "files" so the files detail route does not capture it.
+router.register("files/upload_sessions", UploadSessionViewSet, "upload-sessions")
 router.register("files", FilesViewSet, "files")
 
 urlpatterns = [
@@ -0,0 +1,251 @@
+import base64
+import hashlib
+import threading
+import xml.etree.ElementTree as ET  # nosec B405
+from datetime import UTC, datetime
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from azure.storage.blob import generate_blob_sas
+
+# The well known development account used by Azurite.
+ACCOUNT_NAME = "devstoreaccount1"
+ACCOUNT_KEY = (
+    "Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UVErCz4I6tq/"
+    "K1SZFPTOtr/KBHBeksoGMGw=="
+)
+
+
+class _Blob:
+    def __init__(self, data, content_type, blocks=()):
+        self.data = data
+        self.content_type = content_type
+        self.blocks = list(blocks)
+        self.etag = (
+            f'"0x{hashlib.md5(data, usedforsecurity=False).hexdigest()[:16].upper()}"'
+        )
+        self.last_modified = datetime.now(UTC).replace(microsecond=0)
+
+
+class _BlobRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def do_PUT(self):
+        container, blob_name, query = self._parse_path()
+        if not self._authorized(container, blob_name, query, "w"):
+            return self._error(403, "AuthenticationFailed")
+
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        key = (container, blob_name)
+        if query.get("comp") == "block":
+            content_md5 = self.headers.get("Content-MD5")
+            digest = hashlib.md5(body, usedforsecurity=False).digest()
+            if content_md5 and content_md5 != base64.b64encode(digest).decode():
+                return self._error(400, "Md5Mismatch")
+            self.server.staged.setdefault(key, {})[query["blockid"]] = body
+            return self._empty(201)
+
+        if query.get("comp") == "blocklist":
+            return self._commit_block_list(key, body)
+
+        return self._error(400, "UnsupportedOperation")
+
+    def _commit_block_list(self, key, body):
+        staged = self.server.staged.get(key, {})
+        current = self.server.blobs.get(key)
+        committed = dict(current.blocks) if current else {}
+
+        blocks = []
+        # Only block lists sent by local tests and benchmarks are parsed here.
+        for element in ET.fromstring(body):  # nosec B314
+            block_id = element.text
+            if element.tag in ("Latest", "Uncommitted") and block_id in staged:
+                blocks.append((block_id, staged[block_id]))
+            elif element.tag in ("Latest", "Committed") and block_id in committed:
+                blocks.append((block_id, committed[block_id]))
+            else:
+                return self._error(400, "InvalidBlockList")
+
+        # Committing discards every staged block that was left out.
+        self.server.staged.pop(key, None)
+        self.server.blobs[key] = _Blob(
+            b"".join(data for _, data in blocks),
+            self.headers.get("x-ms-blob-content-type", "application/octet-stream"),
+            blocks,
+        )
+        return self._empty(201, etag=self.server.blobs[key].etag)
+
+    def _parse_path(self):
+        url = urlsplit(self.path)
+        _, account, container, blob_name = url.path.split("/", 3)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if account != ACCOUNT_NAME:
+            container = None
+        return container, unquote(blob_name), query
+
+    def _serve(self, send_body):
+        container, blob_name, query = self._parse_path()
+        if not self._authorized(container, blob_name, query, "r"):
+            return self._error(403, "AuthenticationFailed")
+
+        if query.get("comp") == "blocklist":
+            return self._block_list(container, blob_name)
+
+        blob = self.server.blobs.get((container, blob_name))
+        if blob is None:
+            return self._error(404, "BlobNotFound")
+
+        if_match = self.headers.get("If-Match")
+        if if_match and if_match != blob.etag:
+            return self._error(412, "ConditionNotMet")
+
+        status, body, content_range = 200, blob.data, None
+        range_header = self.headers.get("x-ms-range") or self.headers.get("Range")
+        if range_header and send_body:
+            start, _, end = range_header.split("=", 1)[1].partition("-")
+            start = int(start)
+            end = min(int(end) if end else len(blob.data) - 1, len(blob.data) - 1)
+            status, body = 206, blob.data[start : end + 1]
+            content_range = f"bytes {start}-{end}/{len(blob.data)}"
+
+        self.server.served_bytes += len(body) if send_body else 0
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Content-Type", blob.content_type)
+        self.send_header("ETag", blob.etag)
+        self.send_header("Last-Modified", format_datetime(blob.last_modified, True))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("x-ms-blob-type", "BlockBlob")
+        self.send_header("x-ms-version", "2024-08-04")
+        if content_range:
+            self.send_header("Content-Range", content_range)
+        if "rscd" in query:
+            self.send_header("Content-Disposition", query["rscd"])
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def _block_list(self, container, blob_name):
+        blob = self.server.blobs.get((container, blob_name))
+        staged = self.server.staged.get((container, blob_name), {})
+        if blob is None and not staged:
+            return self._error(404, "BlobNotFound")
+
+        def blocks_xml(blocks):
+            return "".join(
+                f"<Block><Name>{block_id}</Name><Size>{len(data)}</Size></Block>"
+                for block_id, data in blocks
+            )
+
+        body = (
+            '<?xml version="1.0" encoding="utf-8"?><BlockList>'
+            f"<CommittedBlocks>{blocks_xml(blob.blocks if blob else [])}"
+            "</CommittedBlocks>"
+            f"<UncommittedBlocks>{blocks_xml(staged.items())}</UncommittedBlocks>"
+            "</BlockList>"
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Content-Type", "application/xml")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _empty(self, status, etag=None):
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", format_datetime(datetime.now(UTC), True))
+        self.end_headers()
+
+    def _authorized(self, container, blob_name, query, permission):
+        if container is None:
+            return False
+        if "sig" not in query:
+            # Shared key requests come from our own SDK client and are trusted.
+            return self.headers.get("Authorization", "").startswith(
+                f"SharedKey {ACCOUNT_NAME}:"
+            )
+
+        if query.get("sr") != "b" or permission not in query.get("sp", ""):
+            return False
+        now = datetime.now(UTC).strftime("%Y-%m-%dT%H:%M:%SZ")
+        if not query.get("st", "") <= now < query.get("se", ""):
+            return False
+
+        expected = generate_blob_sas(
+            account_name=ACCOUNT_NAME,
+            container_name=container,
+            blob_name=blob_name,
+            account_key=ACCOUNT_KEY,
+            permission=query["sp"],
+            start=query.get("st"),
+            expiry=query["se"],
+            protocol=query.get("spr"),
+            content_disposition=query.get("rscd"),
+        )
+        return parse_qs(expected)["sig"][0] == query["sig"]
+
+    def _error(self, status, code):
+        body = f"<Error><Code>{code}</Code><Message>{code}</Message></Error>".encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Content-Type", "application/xml")
+        self.send_header("x-ms-error-code", code)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+
+class BlobStandIn:
+    """
+    Minimal Azurite style blob endpoint for reads and block uploads over HTTP.
+    It checks SAS signatures, expiry and scope like the real service, so signed
+    URLs can be used end to end in tests and benchmarks.
+    """
+
+    def __init__(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _BlobRequestHandler)
+        self.server.daemon_threads = True
+        self.server.blobs = {}
+        self.server.staged = {}
+        self.server.served_bytes = 0
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def connection_string(self):
+        host, port = self.server.server_address
+        return (
+            f"DefaultEndpointsProtocol=http;AccountName={ACCOUNT_NAME};"
+            f"AccountKey={ACCOUNT_KEY};"
+            f"BlobEndpoint=http://{host}:{port}/{ACCOUNT_NAME};"
+        )
+
+    @property
+    def served_bytes(self):
+        return self.server.served_bytes
+
+    def get(self, container, blob_name):
+        blob = self.server.blobs.get((container, blob_name))
+        return blob.data if blob else None
+
+    def put(self, container, blob_name, data, content_type="application/octet-stream"):
+        self.server.blobs[(container, blob_name)] = _Blob(data, content_type)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
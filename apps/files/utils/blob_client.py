@@ -0,0 +1,189 @@
+import base64
+import os
+import threading
+from collections import Counter
+from datetime import UTC, datetime, timedelta
+
+import requests
+from azure.core.pipeline.transport import RequestsTransport
+from azure.storage.blob import BlobSasPermissions, BlobServiceClient, generate_blob_sas
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+_lock = threading.Lock()
+_clients = {}
+_metrics_lock = threading.Lock()
+_metrics = Counter()
+
+
+def _record(metric):
+    with _metrics_lock:
+        _metrics[metric] += 1
+
+
+class _CountingConnectionPoolMixin:
+    def _get_conn(self, timeout=None):
+        _record("connection_checkouts")
+        return super()._get_conn(timeout)
+
+    def _new_conn(self):
+        _record("new_connections")
+        return super()._new_conn()
+
+
+class _CountingHTTPConnectionPool(_CountingConnectionPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class _CountingHTTPSConnectionPool(_CountingConnectionPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class _PooledHTTPAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool,
+        }
+
+
+def _build_session():
+    pool_size = settings.AZURE_BLOB_POOL_SIZE
+    # Retries are handled by the azure pipeline, not by urllib3.
+    adapter = _PooledHTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=Retry(total=False, redirect=False, raise_on_status=False),
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _build_client():
+    transport = RequestsTransport(session=_build_session(), session_owner=False)
+    return BlobServiceClient.from_connection_string(
+        settings.AZURE_CONNECTION_STRING,
+        transport=transport,
+        max_single_get_size=settings.AZURE_BLOB_MAX_SINGLE_GET_SIZE,
+        max_chunk_get_size=settings.AZURE_BLOB_MAX_CHUNK_GET_SIZE,
+    )
+
+
+def _reset_after_fork():
+    # Sockets inherited from the parent must not be shared with it, so every
+    # forked gunicorn or celery worker builds its own client on first use.
+    global _lock, _metrics_lock
+    _lock = threading.Lock()
+    _metrics_lock = threading.Lock()
+    _clients.clear()
+    _metrics.clear()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_blob_service_client():
+    connection_string = settings.AZURE_CONNECTION_STRING
+    client = _clients.get(connection_string)
+    if client is not None:
+        _record("client_reuses")
+        return client
+
+    with _lock:
+        client = _clients.get(connection_string)
+        if client is None:
+            client = _build_client()
+            _clients[connection_string] = client
+            _record("clients_created")
+        else:
+            _record("client_reuses")
+    return client
+
+
+def get_container_client():
+    return get_blob_service_client().get_container_client(settings.AZURE_CONTAINER)
+
+
+def get_blob_client(blob):
+    return get_blob_service_client().get_blob_client(
+        container=settings.AZURE_CONTAINER, blob=blob
+    )
+
+
+def _signed_blob_url(blob, permission, expires_at, **sas_options):
+    client = get_blob_service_client()
+    account_key = getattr(client.credential, "account_key", None)
+    if not account_key:
+        raise ImproperlyConfigured(
+            "Signed blob URLs need an account key in AZURE_CONNECTION_STRING."
+        )
+
+    blob_client = get_blob_client(blob)
+    sas_token = generate_blob_sas(
+        account_name=client.account_name,
+        container_name=settings.AZURE_CONTAINER,
+        blob_name=blob,
+        account_key=account_key,
+        permission=permission,
+        # Tolerates clock skew between us and the storage service.
+        start=datetime.now(UTC) - timedelta(minutes=5),
+        expiry=expires_at,
+        protocol="https" if blob_client.scheme == "https" else None,
+        **sas_options,
+    )
+    return f"{blob_client.url}?{sas_token}"
+
+
+def generate_blob_download_url(blob, expires_in, filename=None):
+    """
+    Returns a URL that grants read access to `blob` alone for `expires_in`
+    seconds, signed with the storage account key.
+    """
+    expires_at = datetime.now(UTC) + timedelta(seconds=expires_in)
+    url = _signed_blob_url(
+        blob,
+        BlobSasPermissions(read=True),
+        expires_at,
+        content_disposition=(
+            f'attachment; filename="{filename}"' if filename else None
+        ),
+    )
+    return url, expires_at
+
+
+def generate_blob_upload_url(blob, expires_at):
+    """
+    Returns a URL that lets a client stage and commit blocks of `blob` alone
+    until `expires_at`, without being able to read or delete anything.
+    """
+    return _signed_blob_url(
+        blob, BlobSasPermissions(create=True, write=True), expires_at
+    )
+
+
+def make_block_id(index):
+    # Azure needs every block id of a blob to have the same length.
+    return f"{index:08d}"
+
+
+def encode_block_id(block_id):
+    # The SDK base64 encodes block ids itself, raw REST calls must do it here.
+    return base64.b64encode(block_id.encode()).decode()
+
+
+def get_pool_metrics():
+    checkouts = _metrics["connection_checkouts"]
+    new_connections = _metrics["new_connections"]
+    return {
+        "clients_created": _metrics["clients_created"],
+        "client_reuses": _metrics["client_reuses"],
+        "connection_checkouts": checkouts,
+        "new_connections": new_connections,
+        "pooled_connection_reuses": max(checkouts - new_connections, 0),
+    }
@@ -0,0 +1,61 @@
+import hashlib
+from dataclasses import dataclass
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import quote_etag
+
+from .blob_client import get_blob_client
+
+
+@dataclass
+class BlobMetadata:
+    etag: str
+    last_modified: datetime
+    size: int
+    content_type: str
+    # Content addressed blobs are never rewritten, reads need no precondition.
+    immutable: bool = False
+
+
+def _cache_key(blob):
+    # Blob paths may contain spaces and other characters unsafe in cache keys.
+    return f"blob-metadata:{hashlib.sha256(blob.encode()).hexdigest()}"
+
+
+def get_blob_metadata(blob):
+    """
+    Returns the properties of `blob` from the cache, falling back to a HEAD
+    request against storage. The blob body is never read.
+    """
+    metadata = cache.get(_cache_key(blob))
+    if metadata is None:
+        properties = get_blob_client(blob).get_blob_properties()
+        metadata = BlobMetadata(
+            etag=quote_etag(properties.etag),
+            last_modified=properties.last_modified,
+            size=properties.size,
+            content_type=properties.content_settings.content_type
+            or "application/octet-stream",
+        )
+        cache.set(_cache_key(blob), metadata, settings.MEDIA_METADATA_CACHE_TIMEOUT)
+    return metadata
+
+
+def content_blob_metadata(sha256, size, content_type, last_modified):
+    """
+    Returns the metadata of a content addressed blob from the columns recorded
+    at ingest, without a request to storage. Its SHA-256 is its ETag.
+    """
+    return BlobMetadata(
+        etag=quote_etag(sha256),
+        last_modified=last_modified,
+        size=size,
+        content_type=content_type or "application/octet-stream",
+        immutable=True,
+    )
+
+
+def invalidate_blob_metadata(blob):
+    cache.delete(_cache_key(blob))
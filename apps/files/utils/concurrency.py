@@ -0,0 +1,43 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+_DONE = object()
+
+
+def bounded_map(func, items, size, max_workers, max_bytes, ordered=False):
+    """
+    Runs `func(item)` for `items` in a thread pool and yields (item, future)
+    as the calls finish, or in the order of `items` when `ordered`. At most
+    `max_workers` calls are in flight and the `size(item)` of those, counted
+    until the consumer asks for the next result, stays within `max_bytes`. An
+    item larger than that runs alone. Closing the generator early cancels the
+    calls not yet started.
+    """
+    items = iter(items)
+    next_item = next(items, _DONE)
+    # Insertion ordered, the first entry is the oldest call.
+    pending = {}
+    reserved_bytes = 0
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        while next_item is not _DONE or pending:
+            while next_item is not _DONE and len(pending) < max_workers:
+                reserved = min(size(next_item), max_bytes)
+                if pending and reserved_bytes + reserved > max_bytes:
+                    break
+
+                future = executor.submit(func, next_item)
+                pending[future] = (next_item, reserved)
+                reserved_bytes += reserved
+                next_item = next(items, _DONE)
+
+            if ordered:
+                done = [next(iter(pending))]
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item, reserved = pending.pop(future)
+                yield item, future
+                reserved_bytes -= reserved
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,87 @@
+import hashlib
+import json
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .openai_client import EXTRACTION_MODEL
+
+# Bump whenever an extractor changes what it sends to the model or how it
+# reads the answer, so results cached for the old behaviour are not served.
+EXTRACTOR_VERSION = 2
+
+_metrics_lock = threading.Lock()
+_metrics = Counter()
+
+
+def _record(metric):
+    with _metrics_lock:
+        _metrics[metric] += 1
+
+
+def normalize_prompt(prompt):
+    return " ".join(prompt.split())
+
+
+def extraction_cache_key(file, prompt, response_format=None, metadata=None):
+    """
+    Returns the cache key of a model answer for `prompt` on the content of
+    `file`, or None when the content digest is unknown. Identical content
+    shares answers, unless the per upload `metadata` sent with the prompt,
+    such as the file's name or upload time, differs.
+    """
+    if not file.sha256:
+        return None
+    parts = [
+        file.sha256,
+        file.file_type,
+        normalize_prompt(prompt),
+        response_format,
+        metadata,
+        EXTRACTION_MODEL,
+        EXTRACTOR_VERSION,
+    ]
+    encoded = json.dumps(parts, sort_keys=True).encode()
+    return f"ai-extraction:{hashlib.sha256(encoded).hexdigest()}"
+
+
+def cached_extraction(file, prompt, response_format, extract, metadata=None):
+    """
+    Returns the answer `extract()` gives for `prompt` on the file's content,
+    from the shared cache when the same content, prompt, metadata, model and
+    extractor version were answered before. Answers are kept for
+    AI_RESULT_CACHE_TIMEOUT, those over AI_RESULT_CACHE_MAX_CHARS are not
+    cached at all, and the cache backend evicts the rest under memory
+    pressure.
+    """
+    key = extraction_cache_key(file, prompt, response_format, metadata)
+    if key is None:
+        _record("uncacheable")
+        return extract()
+
+    result = cache.get(key)
+    if result is not None:
+        _record("hits")
+        return result
+
+    _record("misses")
+    result = extract()
+    if isinstance(result, str) and len(result) <= settings.AI_RESULT_CACHE_MAX_CHARS:
+        cache.set(key, result, settings.AI_RESULT_CACHE_TIMEOUT)
+    return result
+
+
+def reset_extraction_cache_metrics():
+    _metrics.clear()
+
+
+def get_extraction_cache_metrics():
+    hits, misses = _metrics["hits"], _metrics["misses"]
+    return {
+        "hits": hits,
+        "misses": misses,
+        "uncacheable": _metrics["uncacheable"],
+        "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+    }
@@ -1,7 +1,69 @@
+import hashlib
+import json
 import logging
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.images import get_image_dimensions
+
+from .rate_limit import AI_RATE_LIMIT_ERRORS
 
 logger = logging.Logger("CloudStorm logger")
 
+ALLOWED_EXTENSIONS = [
+    ".jpg",
+    ".jpeg",
+    ".png",
+    ".gif",
+    ".bmp",
+    ".tiff",
+    ".svg",
+    ".webp",
+    ".jfif",
+    ".mp4",
+    ".avi",
+    ".mov",
+    ".mkv",
+    ".flv",
+    ".wmv",
+    ".webm",
+    ".pdf",
+    ".doc",
+    ".docx",
+    ".txt",
+    ".xls",
+    ".xlsx",
+    ".ppt",
+    ".pptx",
+    ".csv",
+    ".mp3",
+    ".wav",
+    ".aac",
+    ".flac",
+    ".ogg",
+    ".m4a",
+]
+FILENAME_REGEX = re.compile(r"^[\w.\- ]+$")
+
+
+def validate_upload_filename(filename: str) -> None:
+    if not FILENAME_REGEX.match(filename):
+        raise SuspiciousFileOperation(
+            f"Disallowed characters in uploaded filename: {filename}"
+        )
+
+    if ".." in filename or "/" in filename or "\\" in filename:
+        raise SuspiciousFileOperation(
+            f"Suspicious path traversal attempt in filename: {filename}"
+        )
+
+    _, ext = os.path.splitext(filename.lower())
+    if ext not in ALLOWED_EXTENSIONS:
+        raise SuspiciousFileOperation(f"File extension {ext} not allowed for upload.")
+
 
 def get_file_type(ext: str) -> str:
     extension_mapping = {
@@ -18,6 +80,43 @@ def get_file_type(ext: str) -> str:
     return "other"
 
 
+def hash_content(fp, chunk_size: int = 1024 * 1024) -> tuple[str, int]:
+    """
+    Returns the SHA-256 hex digest and size of what is left to read in `fp`,
+    reading it in chunks.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    while chunk := fp.read(chunk_size):
+        digest.update(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def get_mime_type(filename: str, content=None) -> str:
+    """
+    Returns the Content-Type storage records for `filename` when it is saved
+    from `content`: the type the client sent, else one guessed from the name.
+    """
+    return (
+        getattr(content, "content_type", None)
+        or mimetypes.guess_type(filename)[0]
+        or "application/octet-stream"
+    )
+
+
+def read_file_metadata(filename: str, content=None) -> dict:
+    """
+    Returns the metadata File records at ingest for `filename`: its MIME type
+    and, for images, the dimensions read from the header of `content`.
+    """
+    metadata = {"mime_type": get_mime_type(filename, content)}
+    extension = os.path.splitext(filename)[1][1:].lower()
+    if content is not None and get_file_type(extension) == "image":
+        metadata["width"], metadata["height"] = get_image_dimensions(content)
+    return metadata
+
+
 def content_file_name(instance, filename: str) -> str:
     return "/".join(["uploads", instance.group.name, filename])
 
@@ -29,12 +128,14 @@ def generate_filename(file, target_format: str = "") -> str:
     prompt = f"""
     Based on the content of the file below, generate a filename that matches the target format: {target_format}.
     Return only the filename. If no date is provided in the content or in metadata, do not include a date in the filename.
+    If you can not generate a name just return the name from metadata.
     You can use the following file metadata for context:
-    {file.get_meta_data()} if you can not generate a name just return the name from metadata.
     """
     try:
-        filename = file.data_extraction(prompt)
-        file.create_extracted_data(name="filename_generation", data=filename)
+        filename = file.data_extraction(prompt, with_metadata=True)
+        file.replace_extracted_data(name="filename_generation", data=filename)
+    except AI_RATE_LIMIT_ERRORS:
+        raise
     except Exception as exc:
         logger.error(exc)
         filename = file.name
@@ -47,7 +148,7 @@ def generate_short_description(file):
      Based on the content of the file below, generate a short description, Maximum 1000 characters.
     """
     short_description = file.data_extraction(prompt)
-    file.create_extracted_data(
+    file.replace_extracted_data(
         name="short_description_generation", data=short_description
     )
     return short_description
@@ -59,10 +160,71 @@ def generate_tags(file):
     Return only the tags, nothing else. Be as generic as possible. If you can not generate tags return tag other
     """
     tags = file.data_extraction(prompt)
-    file.create_extracted_data(name="tags_generation", data=tags)
+    file.replace_extracted_data(name="tags_generation", data=tags)
     return tags.split(",")
 
 
+ENRICHMENT_SCHEMA = {
+    "name": "file_enrichment",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "filename": {"type": "string"},
+            "short_description": {"type": "string"},
+            "tags": {"type": "array", "items": {"type": "string"}},
+        },
+        "required": ["filename", "short_description", "tags"],
+        "additionalProperties": False,
+    },
+}
+
+
+def generate_enrichment(file, target_format: str = ""):
+    """
+    Returns (filename, short_description, tags) for a file. In the "combined"
+    AI_ENRICHMENT_MODE they come from one structured response, recorded as
+    the same ExtractedData rows the separate generators write; a response that
+    does not match the schema falls back to the separate generators.
+    """
+    if settings.AI_ENRICHMENT_MODE == "combined":
+        if not target_format:
+            target_format = "{random_number}_{title}"
+
+        prompt = f"""
+    Based on the content of the file below, return a JSON object with:
+    "filename": a filename that matches the target format: {target_format}. If no date is provided in the content or in metadata, do not include a date in the filename. If you can not generate a name use the name from metadata.
+    "short_description": a short description, Maximum 1000 characters.
+    "tags": a list of tags. Be as generic as possible. If you can not generate tags return ["other"].
+    Return only the JSON object. You can use the following file metadata for context:
+    """
+        response = file.data_extraction(
+            prompt,
+            response_format={"type": "json_schema", "json_schema": ENRICHMENT_SCHEMA},
+            with_metadata=True,
+        )
+        try:
+            enrichment = json.loads(response.strip().strip("`").removeprefix("json"))
+            filename = str(enrichment["filename"])
+            short_description = str(enrichment["short_description"])
+            tags = [str(tag).strip() for tag in enrichment["tags"]]
+        except (AttributeError, TypeError, ValueError, KeyError) as exc:
+            logger.error(f"Invalid enrichment response, generating separately: {exc}")
+        else:
+            file.replace_extracted_data(name="filename_generation", data=filename)
+            file.replace_extracted_data(
+                name="short_description_generation", data=short_description
+            )
+            file.replace_extracted_data(name="tags_generation", data=",".join(tags))
+            return filename, short_description, tags
+
+    return (
+        generate_filename(file, target_format),
+        generate_short_description(file),
+        generate_tags(file),
+    )
+
+
 def extract_data(file, user_prompt):
     prompt = f"Extract {user_prompt} from the file content. Return only the data."
     data = file.data_extraction(prompt)
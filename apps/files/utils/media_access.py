@@ -0,0 +1,12 @@
+import hashlib
+
+from django.core.cache import cache
+
+
+def media_file_cache_key(file_path):
+    # File paths may contain spaces and other characters unsafe in cache keys.
+    return f"media-file:{hashlib.sha256(file_path.encode()).hexdigest()}"
+
+
+def invalidate_media_file(file_path):
+    cache.delete(media_file_cache_key(file_path))
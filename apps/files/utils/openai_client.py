@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from openai import OpenAI
+
+EXTRACTION_MODEL = "gpt-4o"
+
+# Every change here yields a new version, and so a new assistant.
+ASSISTANT_DEFINITION = {
+    "model": EXTRACTION_MODEL,
+    "name": "Cloudstorm assistant",
+    "instructions": (
+        "You are a file assistant chatbot. When asked a question, answer from "
+        "the uploaded file."
+    ),
+    "tools": [{"type": "file_search"}],
+}
+
+_lock = threading.Lock()
+_clients = {}
+_assistant_ids = {}
+_metrics_lock = threading.Lock()
+_metrics = Counter()
+
+
+def _record(metric, amount=1):
+    with _metrics_lock:
+        _metrics[metric] += amount
+
+
+def _reset_after_fork():
+    # Each forked worker opens its own connections instead of sharing the
+    # parent's sockets.
+    global _lock, _metrics_lock
+    _lock = threading.Lock()
+    _metrics_lock = threading.Lock()
+    _clients.clear()
+    _assistant_ids.clear()
+    _metrics.clear()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_openai_client():
+    """
+    Returns the process wide OpenAI client. Its HTTP connection pool is kept
+    between calls, so only the first request to the API pays for the
+    connection and TLS handshake.
+    """
+    api_key = settings.OPEN_API_KEY
+    client = _clients.get(api_key)
+    if client is not None:
+        _record("client_reuses")
+        return client
+
+    with _lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = OpenAI(api_key=api_key)
+            _clients[api_key] = client
+            _record("clients_created")
+        else:
+            _record("client_reuses")
+    return client
+
+
+def assistant_version(definition=None):
+    definition = definition or ASSISTANT_DEFINITION
+    encoded = json.dumps(definition, sort_keys=True).encode()
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+def get_assistant_id(client):
+    """
+    Returns the id of the assistant built from ASSISTANT_DEFINITION. It is
+    created once per definition version, tagged with that version in its
+    metadata and remembered in the process, the shared cache and, through the
+    metadata, by the API itself, so it is found again after a cache flush.
+    """
+    version = assistant_version()
+    assistant_id = _assistant_ids.get(version)
+    if assistant_id is None:
+        key = f"openai-assistant:{version}"
+        assistant_id = cache.get(key)
+        if assistant_id is None:
+            assistant_id = _find_assistant(client, version)
+            if assistant_id is None:
+                assistant_id = client.beta.assistants.create(
+                    **ASSISTANT_DEFINITION, metadata={"cloudstorm_version": version}
+                ).id
+                _record("assistants_created")
+            cache.set(key, assistant_id, timeout=None)
+        _assistant_ids[version] = assistant_id
+    _record("assistant_reuses")
+    return assistant_id
+
+
+def _find_assistant(client, version):
+    for assistant in client.beta.assistants.list(limit=100):
+        if (assistant.metadata or {}).get("cloudstorm_version") == version:
+            return assistant.id
+    return None
+
+
+@contextmanager
+def timed_call(kind):
+    """Records the number and total latency of `kind` model calls."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(f"{kind}_calls")
+        _record(f"{kind}_seconds", time.perf_counter() - started)
+
+
+def get_openai_metrics():
+    metrics = dict(_metrics)
+    for kind in ("document", "image", "string"):
+        calls = metrics.get(f"{kind}_calls", 0)
+        if calls:
+            metrics[f"{kind}_mean_seconds"] = metrics[f"{kind}_seconds"] / calls
+    return metrics
@@ -0,0 +1,93 @@
+from django.utils.http import parse_http_date_safe
+
+# More ranges than this after merging are answered with the whole file.
+MAX_RANGES = 16
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range_header(header, size):
+    """
+    Returns the sorted, merged (start, end) byte ranges of a `Range` header, or
+    None when the header should be ignored and the whole file served. Raises
+    RangeNotSatisfiable when no range overlaps the file.
+    """
+    unit, _, specs = header.partition("=")
+    if unit.strip().lower() != "bytes" or not specs.strip():
+        return None
+
+    ranges = []
+    for spec in specs.split(","):
+        first, sep, last = spec.strip().partition("-")
+        if not sep:
+            return None
+        try:
+            if first:
+                start = int(first)
+                end = int(last) if last else size - 1
+                if start < 0 or end < start:
+                    return None
+            else:
+                suffix = int(last)
+                if suffix < 0:
+                    return None
+                if suffix == 0:
+                    continue
+                start, end = max(size - suffix, 0), size - 1
+        except ValueError:
+            return None
+
+        if start < size:
+            ranges.append((start, min(end, size - 1)))
+
+    if not ranges:
+        raise RangeNotSatisfiable
+
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+
+    if len(merged) > MAX_RANGES:
+        return None
+    return merged
+
+
+def if_range_matches(if_range, etag, last_modified):
+    if_range = if_range.strip()
+    if if_range.startswith('"'):
+        # If-Range only allows strong comparison.
+        return bool(etag) and if_range == etag
+    if if_range.startswith("W/"):
+        return False
+
+    timestamp = parse_http_date_safe(if_range)
+    return (
+        timestamp is not None
+        and last_modified is not None
+        and int(last_modified.timestamp()) == timestamp
+    )
+
+
+def content_range(start, end, size):
+    return f"bytes {start}-{end}/{size}"
+
+
+def stream_byteranges(ranges, size, content_type, boundary, read_range):
+    """
+    Yields a multipart/byteranges body, pulling each part from
+    `read_range(offset, length)` only when it is reached.
+    """
+    for start, end in ranges:
+        yield (
+            f"--{boundary}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Range: {content_range(start, end, size)}\r\n\r\n"
+        ).encode()
+        yield from read_range(start, end - start + 1)
+        yield b"\r\n"
+    yield f"--{boundary}--\r\n".encode()
@@ -0,0 +1,161 @@
+import logging
+import os
+import random
+import threading
+import time
+
+import openai
+import redis
+from django.conf import settings
+
+# Two token buckets, one for requests and one for model tokens, both refilled
+# continuously up to their per minute limit. Capacity is taken from both at
+# once or from neither, and the wait until both could cover the request is
+# returned otherwise. Redis' own clock is used, so workers never disagree.
+_TAKE_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local wait = 0
+local levels = {}
+for i, key in ipairs(KEYS) do
+    local limit = tonumber(ARGV[2 * i - 1])
+    local amount = math.min(tonumber(ARGV[2 * i]), limit)
+    local rate = limit / 60000
+    local state = redis.call('HMGET', key, 'level', 'updated')
+    local level = tonumber(state[1]) or limit
+    local updated = tonumber(state[2]) or now
+    level = math.min(limit, level + (now - updated) * rate)
+    levels[i] = level - amount
+    if level < amount then
+        wait = math.max(wait, math.ceil((amount - level) / rate))
+    end
+end
+if wait > 0 then
+    return wait
+end
+for i, key in ipairs(KEYS) do
+    redis.call('HSET', key, 'level', levels[i], 'updated', now)
+    redis.call('PEXPIRE', key, 120000)
+end
+return 0
+"""
+
+logger = logging.Logger("CloudStorm Logger")
+
+_lock = threading.Lock()
+_limiters = {}
+
+
+class RateLimitExceeded(Exception):
+    """The AI quota has no capacity left within AI_RATE_LIMIT_MAX_WAIT."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"AI rate limit reached, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+# Errors that mean "try again later" rather than "this file cannot be done".
+AI_RATE_LIMIT_ERRORS = (RateLimitExceeded, openai.RateLimitError)
+
+
+class TokenBucketRateLimiter:
+    """
+    Requests and tokens per minute shared by every worker through Redis.
+    """
+
+    def __init__(self, client, name, requests_per_minute, tokens_per_minute):
+        self.keys = [f"rate-limit:{name}:requests", f"rate-limit:{name}:tokens"]
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._take = client.register_script(_TAKE_SCRIPT)
+
+    def try_acquire(self, tokens):
+        """
+        Takes capacity for one request of `tokens` tokens and returns 0, or
+        returns the seconds to wait until it could be taken.
+        """
+        wait_ms = self._take(
+            keys=self.keys,
+            args=[self.requests_per_minute, 1, self.tokens_per_minute, tokens],
+        )
+        return int(wait_ms) / 1000
+
+    def acquire(self, tokens, max_wait):
+        """
+        Blocks until capacity for the request is taken. Raises
+        RateLimitExceeded when that would take longer than `max_wait`.
+        """
+        deadline = time.monotonic() + max_wait
+        while True:
+            wait = self.try_acquire(tokens)
+            if not wait:
+                return
+            if time.monotonic() + wait > deadline:
+                raise RateLimitExceeded(wait)
+            time.sleep(wait)
+
+
+def _reset_after_fork():
+    global _lock
+    _lock = threading.Lock()
+    _limiters.clear()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_ai_rate_limiter():
+    limiter = _limiters.get("ai")
+    if limiter is None:
+        with _lock:
+            limiter = _limiters.get("ai")
+            if limiter is None:
+                limiter = TokenBucketRateLimiter(
+                    redis.Redis.from_url(settings.AI_RATE_LIMIT_REDIS_URL),
+                    "ai",
+                    settings.AI_RATE_LIMIT_REQUESTS_PER_MINUTE,
+                    settings.AI_RATE_LIMIT_TOKENS_PER_MINUTE,
+                )
+                _limiters["ai"] = limiter
+    return limiter
+
+
+def estimate_tokens(text, max_tokens=500):
+    # About four characters a token for English text, plus the longest answer.
+    return len(text) // 4 + max_tokens
+
+
+def acquire_ai_capacity(text, max_tokens=500):
+    """
+    Waits for room in the shared AI quota for a request sending `text`.
+    Does nothing when AI_RATE_LIMIT_REQUESTS_PER_MINUTE is 0 and lets the
+    request through when Redis cannot be reached.
+    """
+    if not settings.AI_RATE_LIMIT_REQUESTS_PER_MINUTE:
+        return
+    try:
+        get_ai_rate_limiter().acquire(
+            estimate_tokens(text, max_tokens), settings.AI_RATE_LIMIT_MAX_WAIT
+        )
+    except redis.RedisError as exc:
+        # The API's own 429s, retried with backoff, still protect the quota.
+        logger.warning(f"AI rate limiter unavailable, calling unthrottled: {exc}")
+
+
+def rate_limit_backoff(exc, retries):
+    """
+    Seconds to wait before retrying after `exc`: what the limiter or the API
+    asked for when known, else exponential backoff, both with jitter so
+    retried tasks do not all return at once.
+    """
+    delay = getattr(exc, "retry_after", None)
+    response = getattr(exc, "response", None)
+    if delay is None and response is not None:
+        try:
+            delay = float(response.headers.get("retry-after"))
+        except (TypeError, ValueError):
+            delay = None
+    if delay is None:
+        delay = min(settings.AI_RATE_LIMIT_BACKOFF_BASE * 2**retries, 600)
+    # Jitter only spreads retries out, it needs no cryptographic randomness.
+    return delay + random.uniform(0, delay / 2)  # nosec B311
@@ -0,0 +1,98 @@
+import logging
+
+from django.apps import apps as global_apps
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.db import migrations
+from django.db.models.functions import Upper
+
+logger = logging.Logger("CloudStorm logger")
+
+
+def trigram_index(field_name, name):
+    """
+    GIN trigram index on UPPER(field), the expression icontains lookups, and
+    so SearchFilter, compare with LIKE '%...%' on Postgres.
+    """
+    return GinIndex(OpClass(Upper(field_name), name="gin_trgm_ops"), name=name)
+
+
+def trigram_available(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def is_trigram_index(index):
+    return isinstance(index, GinIndex) and any(
+        isinstance(expression, OpClass)
+        and expression.extra.get("name") == "gin_trgm_ops"
+        for expression in index.expressions
+    )
+
+
+def missing_trigram_indexes(connection):
+    """
+    Returns (model, index) for every trigram index declared on a model that
+    does not exist in the database.
+    """
+    missing = []
+    with connection.cursor() as cursor:
+        for model in global_apps.get_models():
+            indexes = [i for i in model._meta.indexes if is_trigram_index(i)]
+            if not indexes:
+                continue
+            existing = connection.introspection.get_constraints(
+                cursor, model._meta.db_table
+            )
+            missing += [(model, i) for i in indexes if i.name not in existing]
+    return missing
+
+
+def create_missing_trigram_indexes(connection):
+    """
+    Installs pg_trgm and creates the trigram indexes a migration skipped
+    because the extension was not available then. Returns the (model, index)
+    pairs created.
+    """
+    missing = missing_trigram_indexes(connection)
+    if missing:
+        with connection.schema_editor() as schema_editor:
+            schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            for model, index in missing:
+                schema_editor.add_index(model, index)
+    return missing
+
+
+def add_trigram_indexes(app_label, model_name, indexes):
+    """
+    Migration operation adding trigram indexes to a model. pg_trgm ships with
+    Postgres contrib, on servers without it the indexes are skipped and the
+    filters keep working through sequential scans. The migration is recorded
+    either way, `manage.py create_trigram_indexes` creates the skipped indexes
+    once the extension is installed.
+    """
+
+    def create_indexes(apps, schema_editor):
+        if not trigram_available(schema_editor.connection):
+            logger.warning(
+                f"pg_trgm is not available, skipped the {model_name} trigram "
+                "indexes. Run manage.py create_trigram_indexes once it is."
+            )
+            return
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        model = apps.get_model(app_label, model_name)
+        for index in indexes:
+            schema_editor.add_index(model, index)
+
+    def drop_indexes(apps, schema_editor):
+        for index in indexes:
+            schema_editor.execute(
+                f"DROP INDEX IF EXISTS {schema_editor.quote_name(index.name)}"
+            )
+
+    return migrations.SeparateDatabaseAndState(
+        state_operations=[
+            migrations.AddIndex(model_name=model_name, index=index) for index in indexes
+        ],
+        database_operations=[migrations.RunPython(create_indexes, drop_indexes)],
+    )
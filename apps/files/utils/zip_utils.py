@@ -0,0 +1,167 @@
+import hashlib
+import io
+import zipfile
+from collections.abc import Iterable
+from dataclasses import dataclass
+
+COMPRESSION_BY_FILE_TYPE = {
+    "image": zipfile.ZIP_STORED,
+    "video": zipfile.ZIP_STORED,
+    "audio": zipfile.ZIP_STORED,
+}
+
+# Members smaller than this are not held to the compression ratio limit, a
+# small text file of repeated characters can legitimately compress very well.
+RATIO_CHECK_MIN_SIZE = 1024 * 1024
+
+
+class ZipLimitError(Exception):
+    pass
+
+
+@dataclass
+class ZipMember:
+    name: str
+    chunks: Iterable[bytes]
+    size: int | None = None
+    date_time: tuple[int, int, int, int, int, int] = (1980, 1, 1, 0, 0, 0)
+    compress_type: int = zipfile.ZIP_DEFLATED
+
+
+class _ZipStreamBuffer:
+    """
+    Write-only sink handed to ZipFile. It is not seekable, so ZipFile writes
+    data descriptors after each member instead of seeking back into the header,
+    and whatever has been written so far can be drained and sent to the client.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def get_compress_type(file_type: str) -> int:
+    # Media formats are already compressed, deflating them only burns CPU.
+    return COMPRESSION_BY_FILE_TYPE.get(file_type, zipfile.ZIP_DEFLATED)
+
+
+def stream_zip(members: Iterable[ZipMember]):
+    """
+    Yields a ZIP archive piece by piece while the members are being consumed.
+    Memory stays bounded by the size of a single chunk, whatever the archive size.
+    """
+    buffer = _ZipStreamBuffer()
+
+    with zipfile.ZipFile(buffer, "w", allowZip64=True) as zf:
+        for member in members:
+            info = zipfile.ZipInfo(member.name, date_time=member.date_time)
+            info.compress_type = member.compress_type
+            # Without a trusted size ZipFile can't know up front if the member
+            # will cross the 4 GiB limit, so the ZIP64 extra is always written.
+            force_zip64 = member.size is None
+            if not force_zip64:
+                info.file_size = member.size
+
+            with zf.open(info, "w", force_zip64=force_zip64) as dest:
+                for chunk in member.chunks:
+                    dest.write(chunk)
+                    data = buffer.drain()
+                    if data:
+                        yield data
+
+            data = buffer.drain()
+            if data:
+                yield data
+
+    data = buffer.drain()
+    if data:
+        yield data
+
+
+class ZipMemberStream(io.RawIOBase):
+    """
+    Read-only view of an archive member that reports itself as not seekable.
+    Storage backends then upload it in blocks as it is decompressed, instead
+    of seeking to the end first to learn its length. What is read is hashed,
+    so once the member is uploaded its `sha256` is known without reading it
+    again.
+    """
+
+    def __init__(self, fp):
+        super().__init__()
+        self._fp = fp
+        self._position = 0
+        self._digest = hashlib.sha256()
+
+    @property
+    def sha256(self):
+        return self._digest.hexdigest()
+
+    @property
+    def size(self):
+        return self._position
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        data = self._fp.read(size)
+        self._position += len(data)
+        self._digest.update(data)
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def close(self):
+        self._fp.close()
+        super().close()
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        # Storages rewind content before reading it, which is a no-op here.
+        if offset != 0 or whence != io.SEEK_SET or self._position:
+            raise io.UnsupportedOperation("seek")
+        return 0
+
+
+def check_zip_limits(
+    infos: Iterable[zipfile.ZipInfo],
+    max_members: int,
+    max_total_size: int,
+    max_ratio: int,
+) -> list[zipfile.ZipInfo]:
+    """
+    Returns the file members of an archive after checking the sizes declared in
+    its central directory, so zip bombs are refused before anything is
+    decompressed. ZipFile never yields more than the declared size of a member.
+    """
+    members = [info for info in infos if not info.is_dir()]
+    if len(members) > max_members:
+        raise ZipLimitError(f"ZIP archive has more than {max_members} files.")
+
+    total_size = 0
+    for info in members:
+        if info.flag_bits & 0x1:
+            raise ZipLimitError(f"{info.filename} is encrypted.")
+        if info.file_size > RATIO_CHECK_MIN_SIZE and info.file_size > max_ratio * max(
+            info.compress_size, 1
+        ):
+            raise ZipLimitError(f"{info.filename} exceeds the compression ratio limit.")
+        total_size += info.file_size
+
+    if total_size > max_total_size:
+        raise ZipLimitError(f"ZIP archive expands to more than {max_total_size} bytes.")
+    return members
@@ -1,15 +1,22 @@
-from rest_framework.viewsets import ModelViewSet
+from rest_framework.viewsets import GenericViewSet, ModelViewSet
+from rest_framework.mixins import RetrieveModelMixin
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, OpenApiResponse, OpenApiParameter
 
 from django.conf import settings
-from django.http import StreamingHttpResponse
+from django.http import HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceModifiedError
 
 
-from .models import File
+from .models import File, UploadSession
 from .serializers import (
     MultiFileUploadSerializer,
     FileSerializer,
@@ -17,6 +24,8 @@ from .serializers import (
     FilePartialUpdateSerializer,
     ZipUploadSerializer,
     AIGenerateSerializer,
+    UploadSessionCreateSerializer,
+    UploadSessionSerializer,
 )
 from .permissions import (
     CanAdd,
@@ -26,27 +35,54 @@ from .permissions import (
     CanRetrieve,
     FileAccessPermission,
 )
-from .services import ai_generate_service, zip_upload_service
+from .services import (
+    UploadSessionError,
+    ai_generate_service,
+    commit_upload_session,
+    create_upload_session,
+    get_media_file,
+    stage_upload_chunk,
+    uploaded_chunks,
+    zip_upload_service,
+)
+from .utils.blob_client import generate_blob_download_url, get_blob_client
+from .utils.blob_metadata import (
+    content_blob_metadata,
+    get_blob_metadata,
+    invalidate_blob_metadata,
+)
+from .utils.rate_limit import AI_RATE_LIMIT_ERRORS, rate_limit_backoff
+from .utils.zip_utils import ZipLimitError
+from .utils.range_utils import (
+    RangeNotSatisfiable,
+    content_range,
+    if_range_matches,
+    parse_range_header,
+    stream_byteranges,
+)
 
 from apps.groups.permissions import CanAccessPrivateGroup
-from apps.groups.models import GroupUser
+from apps.groups.membership import get_membership
 
-from CloudStorm.paginator import StandardResultsSetPagination
-from azure.storage.blob import BlobServiceClient
+from CloudStorm.paginator import KeysetPagination, StandardResultsSetPagination
 
 from .swagger_serializers import (
     FileUploadResponseSerializer,
     MassFileDeleteRequestSerializer,
     ErrorResponseSerializer,
     ZipUploadRequestSerializer,
+    ZipUploadResponseSerializer,
     AIGenerateRequestSerializer,
     AIGenerateResponseSerializer,
+    SignedDownloadUrlResponseSerializer,
+    UploadSessionChunksResponseSerializer,
 )
 
 from .filters import FileFilter
 
 import zipfile
 import logging
+import uuid
 
 logger = logging.Logger("CloudStorm Logger")
 
@@ -59,11 +95,22 @@ class FilesViewSet(ModelViewSet):
     pagination_class = StandardResultsSetPagination
     filterset_class = FileFilter
 
+    @property
+    def paginator(self):
+        # ?pagination=cursor lists files newest first by cursor instead of
+        # page number, which stays cheap for deep pages and infinite scroll.
+        if not hasattr(self, "_paginator"):
+            request = getattr(self, "request", None)
+            params = request.query_params if request else {}
+            if params.get("pagination") == "cursor" or "cursor" in params:
+                self._paginator = KeysetPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
     def get_queryset(self):
         return self.queryset.filter(
-            group_id__in=GroupUser.objects.filter(user=self.request.user).values(
-                "group_id"
-            )
+            group_id__in=get_membership(self.request).group_ids()
         ).select_related("group")
 
     def get_serializer_class(self):
@@ -101,6 +148,28 @@ class FilesViewSet(ModelViewSet):
 
         return queryset
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="pagination",
+                type=str,
+                enum=["page", "cursor"],
+                location=OpenApiParameter.QUERY,
+                description="cursor: newest first, paged with next/previous cursors",
+            ),
+            OpenApiParameter(name="cursor", type=str, location=OpenApiParameter.QUERY),
+            OpenApiParameter(
+                name="count",
+                type=str,
+                enum=["exact", "estimate"],
+                location=OpenApiParameter.QUERY,
+                description="Cursor pagination only, count is null when omitted",
+            ),
+        ]
+    )
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
     @extend_schema(
         responses={
             201: FileUploadResponseSerializer,
@@ -145,9 +214,11 @@ class FilesViewSet(ModelViewSet):
     def mass_file_delete(self, request):
         to_delete = request.data.get("to_delete", [])
         try:
-            File.objects.filter(
+            files = File.objects.filter(
                 id__in=to_delete, group_id=request.query_params.get("group")
-            ).delete()
+            )
+            # Deleting the rows releases their blobs.
+            files.delete()
         except Exception as exc:
             logger.error(exc)
             return Response({"message": f"Error : {exc}"}, status=400)
@@ -158,12 +229,13 @@ class FilesViewSet(ModelViewSet):
         methods=["POST"],
         request=ZipUploadRequestSerializer,
         responses={
-            200: FileUploadResponseSerializer,
+            200: ZipUploadResponseSerializer,
             400: ErrorResponseSerializer,
             403: OpenApiResponse(
                 description="User is not authenticated or lacks add permissions"
             ),
         },
+        description="Uploads every file of a ZIP archive. Members with disallowed names are listed in skipped and members that could not be stored in failed, the rest are uploaded.",
     )
     @action(methods=["POST"], detail=False)
     def zip_upload(self, request):
@@ -171,14 +243,19 @@ class FilesViewSet(ModelViewSet):
         serializer.is_valid(raise_exception=True)
 
         try:
-            file_instances = zip_upload_service(serializer.validated_data, request)
+            result = zip_upload_service(serializer.validated_data, request)
         except zipfile.BadZipFile:
             return Response({"message": "Invalid ZIP file."}, status=400)
+        except ZipLimitError as exc:
+            return Response({"message": str(exc)}, status=400)
 
         return Response(
             {
                 "message": "ZIP extracted and files uploaded successfully.",
-                "files": [file.id for file in file_instances],
+                "files": [file.id for file in result.files],
+                "uploaded": len(result.files),
+                "skipped": result.skipped,
+                "failed": result.failed,
             }
         )
 
@@ -191,6 +268,7 @@ class FilesViewSet(ModelViewSet):
             403: OpenApiResponse(
                 description="User is not authenticated or lacks edit permissions"
             ),
+            429: OpenApiResponse(description="AI quota reached, see Retry-After"),
         },
     )
     @action(methods=["PATCH"], detail=True)
@@ -204,6 +282,12 @@ class FilesViewSet(ModelViewSet):
 
         try:
             extracted_data = ai_generate_service(obj, serializer.validated_data)
+        except AI_RATE_LIMIT_ERRORS as exc:
+            response = Response(
+                {"message": "AI quota reached, try again later."}, status=429
+            )
+            response["Retry-After"] = str(int(rate_limit_backoff(exc, 0)))
+            return response
         except Exception:
             return Response(
                 {"message": "There was a problem in generating data!"}, status=400
@@ -212,6 +296,149 @@ class FilesViewSet(ModelViewSet):
         return Response({"extracted_data": extracted_data}, status=200)
 
 
+class UploadSessionViewSet(RetrieveModelMixin, GenericViewSet):
+    serializer_class = UploadSessionSerializer
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(
+            created_by=self.request.user
+        ).prefetch_related("slots")
+
+    def get_permissions(self):
+        permission_mapping = {
+            "create": [IsAuthenticated(), CanAdd()],
+        }
+
+        return permission_mapping.get(self.action, [IsAuthenticated()])
+
+    @extend_schema(
+        request=UploadSessionCreateSerializer,
+        parameters=[
+            OpenApiParameter(
+                name="group", type=str, location=OpenApiParameter.QUERY, required=True
+            ),
+        ],
+        responses={
+            201: UploadSessionSerializer,
+            400: ErrorResponseSerializer,
+            403: OpenApiResponse(
+                description="User is not authenticated or lacks add permissions"
+            ),
+        },
+        description="Reserves upload slots and returns pre-signed block URLs to upload each file straight to storage. Blocks are uploaded with PUT, either to those URLs or as chunks through the API, and then the session is committed.",
+    )
+    def create(self, request, *args, **kwargs):
+        serializer = UploadSessionCreateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+
+        group_user = get_membership(request).get(request.query_params.get("group"))
+        try:
+            session = create_upload_session(
+                group_user.group, request.user, **serializer.validated_data
+            )
+        except UploadSessionError as exc:
+            return Response({"message": str(exc)}, status=400)
+
+        return Response(UploadSessionSerializer(session).data, status=201)
+
+    @extend_schema(
+        request=None,
+        responses={
+            201: FileUploadResponseSerializer,
+            400: OpenApiResponse(
+                description="Session expired or blocks are missing, listed per slot in missing_blocks"
+            ),
+        },
+        description="Commits the uploaded blocks, creates the files and starts their processing.",
+    )
+    @action(methods=["POST"], detail=True)
+    def commit(self, request, pk=None):
+        session = self.get_object()
+        try:
+            files = commit_upload_session(session.id)
+        except UploadSessionError as exc:
+            return Response(
+                {"message": str(exc), "missing_blocks": exc.missing_blocks},
+                status=400,
+            )
+
+        return Response(
+            {
+                "message": "Files uploaded successfully",
+                "files": [file.id for file in files],
+            },
+            status=201,
+        )
+
+    @extend_schema(
+        request={"application/octet-stream": OpenApiTypes.BINARY},
+        parameters=[
+            OpenApiParameter(
+                name="Content-MD5",
+                type=str,
+                location=OpenApiParameter.HEADER,
+                required=False,
+                description="Base64 MD5 of the chunk, checked before it is staged",
+            ),
+        ],
+        responses={
+            201: OpenApiResponse(description="Chunk staged"),
+            400: ErrorResponseSerializer,
+            404: OpenApiResponse(description="Session or slot not found"),
+        },
+        description="Uploads chunk `index` of a slot through the API as the raw request body. Chunks are block_size bytes, except the last one, and can be sent in any order and in parallel. Sending a chunk again replaces it.",
+    )
+    @action(
+        methods=["PUT"],
+        detail=True,
+        url_path=r"slots/(?P<slot_id>[^/.]+)/chunks/(?P<index>[0-9]+)",
+    )
+    def upload_chunk(self, request, pk=None, slot_id=None, index=None):
+        session = self.get_object()
+        slot = get_object_or_404(session.slots.all(), id=slot_id)
+        slot.session = session
+
+        # The body is read straight from the stream, so chunks never go
+        # through the multipart parser or DATA_UPLOAD_MAX_MEMORY_SIZE.
+        length = int(request.META.get("CONTENT_LENGTH") or 0)
+        if length > slot.block_size:
+            return Response(
+                {"message": "Chunk is larger than the slot block size !"}, status=400
+            )
+        data = request.stream.read(length) if length else b""
+
+        try:
+            stage_upload_chunk(
+                slot, int(index), data, request.headers.get("Content-MD5")
+            )
+        except UploadSessionError as exc:
+            return Response({"message": str(exc)}, status=400)
+
+        return Response({"message": "Chunk uploaded successfully"}, status=201)
+
+    @extend_schema(
+        responses={200: UploadSessionChunksResponseSerializer},
+        description="Lists the chunks already staged for every slot of the session, so an interrupted upload can resume by sending only the missing ones.",
+    )
+    @action(methods=["GET"], detail=True)
+    def chunks(self, request, pk=None):
+        session = self.get_object()
+        slots = []
+        for slot in session.slots.all():
+            uploaded = uploaded_chunks(slot)
+            slots.append(
+                {
+                    "id": str(slot.id),
+                    "uploaded_chunks": uploaded,
+                    "missing_chunks": sorted(
+                        set(range(slot.block_count)) - set(uploaded)
+                    ),
+                }
+            )
+        return Response({"slots": slots})
+
+
 class SecureAzureBlobView(APIView):
     permission_classes = [FileAccessPermission]
 
@@ -226,31 +453,163 @@ class SecureAzureBlobView(APIView):
             OpenApiParameter(
                 name="filename", type=str, location=OpenApiParameter.PATH, required=True
             ),
+            OpenApiParameter(
+                name="mode",
+                type=str,
+                location=OpenApiParameter.QUERY,
+                required=False,
+                enum=["proxy", "redirect", "url"],
+                description="proxy streams the file, redirect answers with a 302 to a short lived signed storage URL and url returns that URL as JSON. Defaults to MEDIA_DOWNLOAD_MODE.",
+            ),
         ],
         responses={
-            200: OpenApiResponse(description="Streamed file download"),
+            200: OpenApiResponse(
+                response=SignedDownloadUrlResponseSerializer,
+                description="Streamed file download, or the signed URL when mode=url",
+            ),
+            206: OpenApiResponse(
+                description="Requested byte range(s) of the file, multipart/byteranges for several ranges"
+            ),
+            302: OpenApiResponse(description="Redirect to a signed storage URL"),
+            304: OpenApiResponse(
+                description="File unchanged since the ETag or date sent by the client"
+            ),
             403: OpenApiResponse(description="User does not have access to this file"),
             404: OpenApiResponse(description="File not found"),
+            400: OpenApiResponse(
+                response=ErrorResponseSerializer, description="Unknown mode"
+            ),
+            416: OpenApiResponse(description="Requested range not satisfiable"),
         },
-        description="Securely streams a file from Azure Blob Storage by group and filename.",
+        description="Securely streams a file from Azure Blob Storage by group and filename. Supports Range, If-Range, If-None-Match and If-Modified-Since requests.",
     )
     def get(self, request, group_name, filename):
-        try:
-            file_path = f"uploads/{group_name}/{filename}"
-            blob_service_client = BlobServiceClient.from_connection_string(
-                settings.AZURE_CONNECTION_STRING
+        file_path = f"uploads/{group_name}/{filename}"
+        mode = request.query_params.get("mode", settings.MEDIA_DOWNLOAD_MODE)
+        if mode not in ("proxy", "redirect", "url"):
+            return Response({"message": "Invalid mode !"}, status=400)
+
+        # Deduplicated files keep their content in a shared blob, described by
+        # the columns recorded at ingest.
+        metadata = None
+        media_file = get_media_file(file_path)
+        if media_file and media_file["blob__path"]:
+            file_path = media_file["blob__path"]
+            metadata = content_blob_metadata(
+                media_file["sha256"],
+                media_file["file_size"],
+                media_file["mime_type"],
+                media_file["uploaded_at"],
             )
-            blob_client = blob_service_client.get_blob_client(
-                container=settings.AZURE_CONTAINER, blob=file_path
-            )
-            stream = blob_client.download_blob()
-            response = StreamingHttpResponse(
-                stream.chunks(),
-                content_type=stream.properties.content_settings.content_type,
-            )
-            response["Content-Disposition"] = f'attachment; filename="{filename}"'
-            return response
+
+        try:
+            if mode != "proxy":
+                return self._signed_url_response(file_path, filename, mode)
+
+            try:
+                return self._blob_response(request, file_path, filename, metadata)
+            except ResourceModifiedError:
+                # The cached metadata is older than the blob, look it up again.
+                invalidate_blob_metadata(file_path)
+                return self._blob_response(request, file_path, filename)
 
         except Exception as e:
             logger.error(e)
             return Response({"message": "File not found !"}, status=404)
+
+    def _signed_url_response(self, file_path, filename, mode):
+        url, expires_at = generate_blob_download_url(
+            file_path, settings.MEDIA_SAS_EXPIRY_SECONDS, filename=filename
+        )
+        if mode == "redirect":
+            response = HttpResponseRedirect(url)
+        else:
+            response = Response({"url": url, "expires_at": expires_at})
+        # The URL is a short lived credential, it must not outlive its expiry.
+        patch_cache_control(response, private=True, no_store=True)
+        return response
+
+    @staticmethod
+    def _if_unchanged(metadata):
+        if metadata.immutable:
+            return {}
+        return {"etag": metadata.etag, "match_condition": MatchConditions.IfNotModified}
+
+    def _blob_response(self, request, file_path, filename, metadata=None):
+        metadata = metadata or get_blob_metadata(file_path)
+        response = get_conditional_response(
+            request,
+            etag=metadata.etag,
+            last_modified=int(metadata.last_modified.timestamp()),
+        )
+
+        if response is None:
+            blob_client = get_blob_client(file_path)
+            range_header = request.headers.get("Range")
+            if range_header:
+                response = self._partial_response(
+                    request, blob_client, metadata, range_header
+                )
+
+            if response is None:
+                stream = blob_client.download_blob(**self._if_unchanged(metadata))
+                response = StreamingHttpResponse(
+                    stream.chunks(), content_type=metadata.content_type
+                )
+                response["Content-Length"] = metadata.size
+
+            response["Accept-Ranges"] = "bytes"
+            response["Content-Disposition"] = f'attachment; filename="{filename}"'
+
+        response["ETag"] = metadata.etag
+        response["Last-Modified"] = http_date(metadata.last_modified.timestamp())
+        patch_cache_control(
+            response,
+            private=True,
+            max_age=settings.MEDIA_CACHE_MAX_AGE,
+            must_revalidate=True,
+        )
+        return response
+
+    def _partial_response(self, request, blob_client, metadata, range_header):
+        size = metadata.size
+
+        if_range = request.headers.get("If-Range")
+        if if_range and not if_range_matches(
+            if_range, metadata.etag, metadata.last_modified
+        ):
+            return None
+
+        try:
+            ranges = parse_range_header(range_header, size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+        if ranges is None:
+            return None
+
+        def read_range(offset, length):
+            # Fails instead of mixing versions if the blob changes meanwhile.
+            return blob_client.download_blob(
+                offset=offset, length=length, **self._if_unchanged(metadata)
+            ).chunks()
+
+        content_type = metadata.content_type
+        if len(ranges) == 1:
+            [(start, end)] = ranges
+            response = StreamingHttpResponse(
+                read_range(start, end - start + 1),
+                status=206,
+                content_type=content_type,
+            )
+            response["Content-Range"] = content_range(start, end, size)
+            response["Content-Length"] = end - start + 1
+            return response
+
+        boundary = uuid.uuid4().hex
+        return StreamingHttpResponse(
+            stream_byteranges(ranges, size, content_type, boundary, read_range),
+            status=206,
+            content_type=f"multipart/byteranges; boundary={boundary}",
+        )
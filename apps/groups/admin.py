@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Group, GroupUser
+from .models import Group, GroupUser, GroupArchive
 
 admin.site.register(Group)
 admin.site.register(GroupUser)
+admin.site.register(GroupArchive)
@@ -0,0 +1,74 @@
+import os
+import resource
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.files.utils.zip_utils import ZipMember, stream_zip
+
+
+def _current_rss_mb():
+    with open("/proc/self/statm") as statm:
+        resident_pages = int(statm.read().split()[1])
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def _synthetic_chunks(size, chunk_size):
+    chunk = os.urandom(chunk_size)
+    sent = 0
+    while sent < size:
+        part = chunk[: min(chunk_size, size - sent)]
+        sent += len(part)
+        yield part
+
+
+class Command(BaseCommand):
+    help = (
+        "Streams a synthetic group ZIP and reports resident memory while it is "
+        "produced, to check that memory stays flat as the file count grows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--files", type=int, default=10_000)
+        parser.add_argument("--file-size", type=int, default=256 * 1024)
+        parser.add_argument("--chunk-size", type=int, default=64 * 1024)
+        parser.add_argument("--samples", type=int, default=10)
+
+    def handle(self, *args, **options):
+        total_files = options["files"]
+        file_size = options["file_size"]
+        chunk_size = options["chunk_size"]
+        sample_every = max(total_files // options["samples"], 1)
+
+        produced = {"files": 0}
+
+        def members():
+            for index in range(total_files):
+                produced["files"] = index + 1
+                yield ZipMember(
+                    name=f"file_{index}.bin",
+                    chunks=_synthetic_chunks(file_size, chunk_size),
+                )
+
+        self.stdout.write(f"{'files':>10} {'archive MB':>12} {'rss MB':>10}")
+
+        archive_bytes = 0
+        last_sample = 0
+        started = time.perf_counter()
+        for data in stream_zip(members()):
+            archive_bytes += len(data)
+            if produced["files"] - last_sample >= sample_every:
+                last_sample = produced["files"]
+                self.stdout.write(
+                    f"{last_sample:>10} {archive_bytes / (1024 * 1024):>12.1f} "
+                    f"{_current_rss_mb():>10.1f}"
+                )
+
+        elapsed = time.perf_counter() - started
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{total_files} files, {archive_bytes / (1024 * 1024):.1f} MB "
+                f"in {elapsed:.1f}s, peak RSS {peak_mb:.1f} MB"
+            )
+        )
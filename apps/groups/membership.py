@@ -0,0 +1,113 @@
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import GroupUser
+
+MEMBERSHIP_FIELDS = ("id", "group_id", "role", "can_add", "can_edit", "can_delete")
+
+
+def _version_key(user_id):
+    return f"membership-version:{user_id}"
+
+
+def _memberships_key(user_id, version):
+    return f"memberships:{user_id}:{version}"
+
+
+def get_user_memberships(user_id):
+    """
+    Returns {group_id: GroupUser} for the user, from the shared cache when
+    possible. The group of each GroupUser is not cached and loads on access.
+    """
+    # A version that was evicted starts again from the clock, so it never
+    # matches a key written before.
+    version = cache.get_or_set(_version_key(user_id), time.time_ns, timeout=None)
+    key = _memberships_key(user_id, version)
+    rows = cache.get(key)
+    if rows is None:
+        rows = list(
+            GroupUser.objects.filter(user_id=user_id).values_list(*MEMBERSHIP_FIELDS)
+        )
+        cache.set(key, rows, settings.MEMBERSHIP_CACHE_TIMEOUT)
+    return {
+        row[1]: GroupUser(user_id=user_id, **dict(zip(MEMBERSHIP_FIELDS, row)))
+        for row in rows
+    }
+
+
+def invalidate_user_memberships(user_id):
+    """
+    Moves the user to a new cache version. Entries cached under the old one,
+    including any a concurrent request writes from rows it read before the
+    change, are never read again and expire on their own.
+    """
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        # No version cached, the next read starts a fresh one.
+        pass
+
+
+class MembershipResolver:
+    """
+    Answers group membership questions for one user. All of the user's
+    GroupUser rows are loaded at once, from the shared cache or with a single
+    query, the first time one is needed and reused for every later check.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self._memberships = None
+
+    @property
+    def memberships(self):
+        if self._memberships is None:
+            if not self.user or not self.user.is_authenticated:
+                self._memberships = {}
+            else:
+                self._memberships = get_user_memberships(self.user.pk)
+        return self._memberships
+
+    def get(self, group):
+        """
+        Returns the user's GroupUser for `group`, given as a Group or its id,
+        or None when the user is not a member.
+        """
+        group_id = getattr(group, "pk", group)
+        if not isinstance(group_id, uuid.UUID):
+            try:
+                group_id = uuid.UUID(str(group_id))
+            except ValueError:
+                return None
+        return self.memberships.get(group_id)
+
+    def is_member(self, group):
+        return self.get(group) is not None
+
+    def is_admin(self, group):
+        group_user = self.get(group)
+        return group_user is not None and group_user.role == "admin"
+
+    def has_flag(self, group, flag):
+        """Returns whether the user's `can_add`, `can_edit`... `flag` is set."""
+        group_user = self.get(group)
+        return group_user is not None and getattr(group_user, flag)
+
+    def can_access(self, group):
+        """Returns whether the user may see `group`, public or their own."""
+        return not group.is_private or self.is_member(group)
+
+    def group_ids(self):
+        return list(self.memberships)
+
+
+def get_membership(request):
+    """Returns the MembershipResolver of the request's user, one per request."""
+    resolver = request.__dict__.get("_membership")
+    if resolver is None or resolver.user != request.user:
+        resolver = MembershipResolver(request.user)
+        request._membership = resolver
+    return resolver
@@ -0,0 +1,15 @@
+from django.db import migrations
+
+from apps.files.utils.trigram import add_trigram_indexes, trigram_index
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("groups", "0003_group_archive"),
+    ]
+
+    operations = [
+        add_trigram_indexes(
+            "groups", "group", [trigram_index("name", "group_name_trgm")]
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:21
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def kilobytes_to_bytes(apps, schema_editor):
+    Group = apps.get_model("groups", "Group")
+    Group.objects.update(max_size=F("max_size") * 1024)
+
+
+def bytes_to_kilobytes(apps, schema_editor):
+    Group = apps.get_model("groups", "Group")
+    Group.objects.update(max_size=F("max_size") / 1024)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("groups", "0004_trigram_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="group",
+            name="max_size",
+            field=models.PositiveBigIntegerField(default=2048000000),
+        ),
+        # Quotas were stored in kilobytes and are compared with bytes now.
+        migrations.RunPython(kilobytes_to_bytes, bytes_to_kilobytes),
+    ]
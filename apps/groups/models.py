@@ -6,6 +6,12 @@ import uuid
 from taggit.managers import TaggableManager
 from taggit.models import GenericUUIDTaggedItemBase, TaggedItemBase
 
+from apps.files.utils.trigram import trigram_index
+
+
+# Bytes. Quotas used to be stored in kilobytes, this is the old 2,000,000 KB.
+DEFAULT_MAX_SIZE = 2_000_000 * 1024
+
 
 class UUIDTaggedItem(GenericUUIDTaggedItemBase, TaggedItemBase):
     class Meta:
@@ -20,11 +26,16 @@ class Group(models.Model):
     tags = TaggableManager(through=UUIDTaggedItem)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    max_size = models.PositiveIntegerField(default=2000000)
+    # Storage quota in bytes, checked against the sum of File.file_size.
+    max_size = models.PositiveBigIntegerField(default=DEFAULT_MAX_SIZE)
     created_by = models.ForeignKey(
         get_user_model(), null=True, on_delete=models.SET_NULL
     )
 
+    class Meta:
+        # Name search in GroupsViewSet.
+        indexes = [trigram_index("name", "group_name_trgm")]
+
     def __str__(self):
         return self.name
 
@@ -52,3 +63,34 @@ class GroupUser(models.Model):
 
     class Meta:
         unique_together = ("user", "group")
+
+
+def archive_file_name(instance, filename: str) -> str:
+    return "/".join(["archives", str(instance.group_id), filename])
+
+
+class GroupArchive(models.Model):
+    ARCHIVE_STATUS = [
+        ("pending", "Pending"),
+        ("building", "Building"),
+        ("ready", "Ready"),
+        ("failed", "Failed"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    group = models.ForeignKey(
+        "Group", on_delete=models.CASCADE, related_name="archives"
+    )
+    fingerprint = models.CharField(max_length=64)
+    status = models.CharField(max_length=20, default="pending", choices=ARCHIVE_STATUS)
+    file = models.FileField(
+        upload_to=archive_file_name, max_length=255, blank=True, null=True
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.group.name}:{self.fingerprint}"
+
+    class Meta:
+        unique_together = ("group", "fingerprint")
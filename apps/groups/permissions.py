@@ -1,5 +1,5 @@
 from rest_framework.permissions import BasePermission
-from .models import GroupUser
+from .membership import get_membership
 from apps.files.models import File
 
 
@@ -7,8 +7,7 @@ class IsGroupAdmin(BasePermission):
     message = "You must be a group admin to perform this action."
 
     def has_object_permission(self, request, view, obj):
-        group_user = GroupUser.objects.filter(group=obj, user=request.user).first()
-        return group_user and group_user.role == "admin"
+        return get_membership(request).is_admin(obj)
 
 
 class IsGroupUser(BasePermission):
@@ -16,9 +15,9 @@ class IsGroupUser(BasePermission):
 
     def has_object_permission(self, request, view, obj):
         if isinstance(obj, File):
-            obj = obj.group
+            obj = obj.group_id
 
-        return obj.is_user_member(request.user)
+        return get_membership(request).is_member(obj)
 
 
 class CanAccessPrivateGroup(BasePermission):
@@ -27,13 +26,8 @@ class CanAccessPrivateGroup(BasePermission):
     def has_object_permission(self, request, view, obj):
         if isinstance(obj, File):
             obj = obj.group
-        if not obj.is_private:
-            return True
-
-        if not obj.is_user_member(request.user):
-            return False
 
-        return True
+        return get_membership(request).can_access(obj)
 
 
 class IsVerifiedUser(BasePermission):
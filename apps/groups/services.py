@@ -1,32 +1,185 @@
-import io
-import zipfile
+import hashlib
 import logging
+from datetime import timedelta
 
 from django.conf import settings
-from azure.storage.blob import BlobServiceClient
+from django.db.models import Q
+from django.utils import timezone
+from azure.core.exceptions import ResourceNotFoundError
+from azure.storage.blob import BlobBlock, ContentSettings
+
+from apps.files.utils.blob_client import get_blob_client, make_block_id
+from apps.files.utils.concurrency import bounded_map
+from apps.files.utils.zip_utils import ZipMember, get_compress_type, stream_zip
+from .models import GroupArchive, archive_file_name
 
 logger = logging.Logger("CloudStorm Logger")
 
 
+def _download_blob(file, max_buffered_size):
+    # The pooled client fetches at most AZURE_BLOB_MAX_SINGLE_GET_SIZE bytes
+    # when the download starts.
+    stream = get_blob_client(file.storage_name).download_blob()
+    if stream.size > max_buffered_size:
+        # Too big to hold in memory, the rest is pulled when it is written.
+        return stream.chunks()
+    return [stream.readall()]
+
+
+def _prefetch_blobs(files, skip_failed=True):
+    """
+    Yields (file, chunks) in the order of `files` while the following blobs are
+    downloaded in the background. At most GROUP_ZIP_PREFETCH_WORKERS downloads
+    run at once and their expected sizes stay within GROUP_ZIP_PREFETCH_MAX_BYTES.
+    A blob that fails to download is left out, or raises unless `skip_failed`.
+    """
+    max_bytes = settings.GROUP_ZIP_PREFETCH_MAX_BYTES
+
+    for file, future in bounded_map(
+        lambda file: _download_blob(file, min(file.file_size or 0, max_bytes)),
+        files,
+        size=lambda file: file.file_size or 0,
+        max_workers=settings.GROUP_ZIP_PREFETCH_WORKERS,
+        max_bytes=max_bytes,
+        ordered=True,
+    ):
+        try:
+            chunks = future.result()
+        except Exception as e:
+            logger.error(f"Error downloading blob {file.storage_name}: {e}")
+            if not skip_failed:
+                raise
+        else:
+            yield file, chunks
+
+
+def _group_zip_members(group, skip_failed=True):
+    files = group.files.select_related("blob").iterator()
+
+    for file, chunks in _prefetch_blobs(files, skip_failed):
+        yield ZipMember(
+            name=file.name or file.file.name.split("/")[-1],
+            chunks=chunks,
+            date_time=file.uploaded_at.timetuple()[:6],
+            compress_type=get_compress_type(file.file_type),
+        )
+
+
 def download_group_zip(group):
-    blob_service_client = BlobServiceClient.from_connection_string(
-        settings.AZURE_CONNECTION_STRING
+    return stream_zip(_group_zip_members(group))
+
+
+def group_files_fingerprint(group):
+    digest = hashlib.sha256()
+    files = group.files.order_by("id").values_list(
+        "id", "name", "file_size", "uploaded_at"
     )
-    container = settings.AZURE_CONTAINER
-
-    zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zf:
-        for file in group.files.all():
-            blob_path = file.file.name
-            try:
-                blob_client = blob_service_client.get_blob_client(
-                    container=container, blob=blob_path
-                )
-                file_data = blob_client.download_blob().readall()
-                filename = file.name or blob_path.split("/")[-1]
-                zf.writestr(filename, file_data)
-            except Exception as e:
-                logger.error(f"Error downloading blob {blob_path}: {e}")
-
-    zip_buffer.seek(0)
-    return zip_buffer
+    for file_id, name, file_size, uploaded_at in files.iterator():
+        digest.update(
+            f"{file_id}|{name}|{file_size}|{uploaded_at.isoformat()}\n".encode()
+        )
+    return digest.hexdigest()
+
+
+def get_ready_group_archive(group, fingerprint):
+    return group.archives.filter(fingerprint=fingerprint, status="ready").first()
+
+
+def enqueue_group_archive(group, fingerprint):
+    from .tasks import build_group_archive
+
+    archive, created = GroupArchive.objects.get_or_create(
+        group=group, fingerprint=fingerprint
+    )
+    if created:
+        build_group_archive.delay(archive.id)
+        return archive
+
+    # Only the request that flips a failed build, or one whose task was lost,
+    # back to pending re-enqueues it.
+    now = timezone.now()
+    lost = now - timedelta(seconds=settings.GROUP_ZIP_ARCHIVE_BUILD_TIMEOUT)
+    if (
+        GroupArchive.objects.filter(id=archive.id)
+        .filter(
+            Q(status="failed")
+            | Q(status__in=["pending", "building"], updated_at__lt=lost)
+        )
+        .update(status="pending", updated_at=now)
+    ):
+        archive.status = "pending"
+        build_group_archive.delay(archive.id)
+
+    return archive
+
+
+def _upload_in_blocks(blob_client, chunks, block_size):
+    """
+    Stages `chunks` as blocks of `block_size` bytes and commits them. Block
+    ids carry a digest of their content, so blocks left uncommitted by an
+    interrupted attempt are only reused when they hold the same bytes.
+    """
+    try:
+        _, uncommitted = blob_client.get_block_list("uncommitted")
+    except ResourceNotFoundError:
+        uncommitted = []
+    staged = {block.id for block in uncommitted}
+
+    block_ids = []
+    buffer = bytearray()
+
+    def stage(data):
+        digest = hashlib.sha256(data).hexdigest()[:32]
+        block_id = f"{make_block_id(len(block_ids))}-{digest}"
+        if block_id not in staged:
+            blob_client.stage_block(block_id, bytes(data), length=len(data))
+        block_ids.append(block_id)
+
+    for chunk in chunks:
+        buffer.extend(chunk)
+        while len(buffer) >= block_size:
+            stage(buffer[:block_size])
+            del buffer[:block_size]
+
+    if buffer:
+        stage(buffer)
+
+    blob_client.commit_block_list(
+        [BlobBlock(block_id=block_id) for block_id in block_ids],
+        content_settings=ContentSettings(content_type="application/zip"),
+    )
+
+
+def build_group_archive_file(archive):
+    blob_path = archive_file_name(archive, f"{archive.fingerprint}.zip")
+
+    _upload_in_blocks(
+        get_blob_client(blob_path),
+        # A missing file fails the build, a partial archive would be served
+        # until the group's files change.
+        stream_zip(_group_zip_members(archive.group, skip_failed=False)),
+        settings.GROUP_ZIP_ARCHIVE_BLOCK_SIZE,
+    )
+
+    archive.file.name = blob_path
+    archive.status = "ready"
+    archive.save(update_fields=["file", "status", "updated_at"])
+
+    # Archives of previous file sets can never be served again. Newer ones may
+    # still be building and are left to their own tasks, unless the file set
+    # they were for is gone and the build failed or was lost.
+    lost = timezone.now() - timedelta(seconds=settings.GROUP_ZIP_ARCHIVE_BUILD_TIMEOUT)
+    archive.group.archives.filter(
+        Q(status="ready", created_at__lt=archive.created_at)
+        | (
+            ~Q(fingerprint=group_files_fingerprint(archive.group))
+            & (
+                Q(status="failed")
+                | Q(status__in=["pending", "building"], updated_at__lt=lost)
+            )
+        )
+    ).delete()
+
+
+def stream_group_archive(archive):
+    return get_blob_client(archive.file.name).download_blob().chunks()
@@ -0,0 +1,22 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .membership import invalidate_user_memberships
+from .models import GroupArchive, GroupUser
+
+
+@receiver(post_save, sender=GroupUser)
+@receiver(post_delete, sender=GroupUser)
+def invalidate_cached_memberships(sender, instance, **kwargs):
+    # After commit, so no other worker can cache the rows as they were before.
+    transaction.on_commit(lambda: invalidate_user_memberships(instance.user_id))
+
+
+@receiver(post_delete, sender=GroupArchive)
+def delete_archive_file(sender, instance, **kwargs):
+    # Covers the archives of a deleted group too. After commit, so a rolled
+    # back delete keeps the file its row points to.
+    if instance.file:
+        name, storage = instance.file.name, instance.file.storage
+        transaction.on_commit(lambda: storage.delete(name))
@@ -0,0 +1,30 @@
+import logging
+
+from celery import shared_task
+
+from .models import GroupArchive
+from .services import build_group_archive_file
+
+logger = logging.Logger("CloudStorm logger")
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=30)
+def build_group_archive(self, archive_id):
+    archive = GroupArchive.objects.select_related("group").filter(id=archive_id).first()
+    if archive is None:
+        # Pruned as stale by the build of a newer archive.
+        return None
+    archive.status = "building"
+    archive.save(update_fields=["status", "updated_at"])
+
+    try:
+        build_group_archive_file(archive)
+    except Exception as exc:
+        logger.error(f"Error building archive {archive_id}: {exc}")
+        if self.request.retries >= self.max_retries:
+            archive.status = "failed"
+            archive.save(update_fields=["status", "updated_at"])
+            raise
+        raise self.retry(exc=exc)
+
+    return archive.id
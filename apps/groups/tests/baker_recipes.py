@@ -1,13 +1,13 @@
 from model_bakery.recipe import Recipe, seq, foreign_key
 
-from apps.groups.models import Group, GroupUser
+from apps.groups.models import DEFAULT_MAX_SIZE, Group, GroupUser
 from apps.users.tests.baker_recipes import user_recipe
 
 group_recipe = Recipe(
     Group,
     name=seq("Group "),
     is_private=False,
-    max_size=2_000_000,
+    max_size=DEFAULT_MAX_SIZE,
     created_by=foreign_key(user_recipe),
 )
 
@@ -15,7 +15,7 @@ private_group_recipe = Recipe(
     Group,
     name=seq("Private Group "),
     is_private=True,
-    max_size=2_000_000,
+    max_size=DEFAULT_MAX_SIZE,
     created_by=foreign_key(user_recipe),
 )
 
@@ -17,7 +17,7 @@ class GroupModelTests(TestCase):
         group = Group.objects.create(name="Default Group", created_by=user)
 
         self.assertFalse(group.is_private)
-        self.assertEqual(group.max_size, 2000000)
+        self.assertEqual(group.max_size, 2_000_000 * 1024)
         self.assertIsNotNone(group.created_at)
         self.assertIsNotNone(group.updated_at)
 
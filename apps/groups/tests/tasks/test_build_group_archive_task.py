@@ -0,0 +1,218 @@
+import hashlib
+import io
+import zipfile
+from datetime import timedelta
+from unittest.mock import MagicMock, patch
+
+from azure.core.exceptions import ResourceNotFoundError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+
+from apps.files.tests.baker_recipes import file_recipe
+from apps.files.utils.blob_client import make_block_id
+from apps.files.tests.conftest import IN_MEMORY_STORAGES
+from apps.groups.models import GroupArchive
+from apps.groups.services import _upload_in_blocks, group_files_fingerprint
+from apps.groups.tasks import build_group_archive
+from apps.groups.tests.baker_recipes import group_recipe
+
+
+class _FakeBlockBlobClient:
+    def __init__(self, uncommitted=None):
+        self.uncommitted = uncommitted
+        self.staged = {}
+        self.committed = None
+
+    def get_block_list(self, block_list_type):
+        if self.uncommitted is None:
+            raise ResourceNotFoundError("blob not found")
+        return [], self.uncommitted
+
+    def stage_block(self, block_id, data, length=None):
+        self.staged[block_id] = data
+
+    def commit_block_list(self, block_list, content_settings=None):
+        self.committed = [block.id for block in block_list]
+
+
+def _block_id(index, data):
+    return f"{make_block_id(index)}-{hashlib.sha256(data).hexdigest()[:32]}"
+
+
+class UploadInBlocksTests(TestCase):
+    def test_upload_splits_stream_into_blocks_and_commits_in_order(self):
+        blob_client = _FakeBlockBlobClient()
+
+        _upload_in_blocks(blob_client, [b"abc", b"defg", b"h"], block_size=3)
+
+        self.assertEqual(
+            blob_client.committed,
+            [_block_id(0, b"abc"), _block_id(1, b"def"), _block_id(2, b"gh")],
+        )
+        self.assertEqual(
+            b"".join(blob_client.staged[i] for i in blob_client.committed),
+            b"abcdefgh",
+        )
+
+    def test_upload_skips_blocks_already_staged_by_a_previous_attempt(self):
+        staged_block = MagicMock(id=_block_id(0, b"abc"), size=3)
+        blob_client = _FakeBlockBlobClient(uncommitted=[staged_block])
+
+        _upload_in_blocks(blob_client, [b"abcdef"], block_size=3)
+
+        self.assertEqual(list(blob_client.staged), [_block_id(1, b"def")])
+        self.assertEqual(
+            blob_client.committed, [_block_id(0, b"abc"), _block_id(1, b"def")]
+        )
+
+    def test_upload_restages_blocks_of_the_same_size_with_other_content(self):
+        staged_block = MagicMock(id=_block_id(0, b"old"), size=3)
+        blob_client = _FakeBlockBlobClient(uncommitted=[staged_block])
+
+        _upload_in_blocks(blob_client, [b"new"], block_size=3)
+
+        self.assertEqual(blob_client.committed, [_block_id(0, b"new")])
+        self.assertEqual(blob_client.staged[_block_id(0, b"new")], b"new")
+
+
+@override_settings(
+    STORAGES=IN_MEMORY_STORAGES,
+    AZURE_CONNECTION_STRING="fake",
+    AZURE_CONTAINER="fake",
+    GROUP_ZIP_ARCHIVE_BLOCK_SIZE=1024,
+)
+class BuildGroupArchiveTaskTests(TestCase):
+    def setUp(self):
+        self.group = group_recipe.make()
+        file_recipe.make(group=self.group, name="a.txt")
+        self.archive = GroupArchive.objects.create(
+            group=self.group, fingerprint=group_files_fingerprint(self.group)
+        )
+
+    @patch("apps.groups.services.get_blob_client")
+    def test_build_group_archive_uploads_archive_and_marks_it_ready(
+        self, mock_get_blob_client
+    ):
+        archive_blob = _FakeBlockBlobClient()
+        file_blob = MagicMock()
+        file_blob.download_blob.return_value.size = 5
+        file_blob.download_blob.return_value.readall.return_value = b"hello"
+        mock_get_blob_client.side_effect = lambda blob: (
+            archive_blob if blob.startswith("archives/") else file_blob
+        )
+        stale_archive = GroupArchive.objects.create(
+            group=self.group, fingerprint="stale", status="ready"
+        )
+        GroupArchive.objects.filter(id=stale_archive.id).update(
+            created_at=self.archive.created_at - timedelta(days=1)
+        )
+
+        build_group_archive(self.archive.id)
+
+        self.archive.refresh_from_db()
+        self.assertEqual(self.archive.status, "ready")
+        self.assertEqual(
+            self.archive.file.name,
+            f"archives/{self.group.id}/{self.archive.fingerprint}.zip",
+        )
+        data = b"".join(archive_blob.staged[i] for i in archive_blob.committed)
+        self.assertEqual(zipfile.ZipFile(io.BytesIO(data)).read("a.txt"), b"hello")
+        self.assertFalse(GroupArchive.objects.filter(id=stale_archive.id).exists())
+
+    @patch("apps.groups.services.get_blob_client")
+    def test_build_group_archive_keeps_newer_archives_still_building(
+        self, mock_get_blob_client
+    ):
+        file_blob = MagicMock()
+        file_blob.download_blob.return_value.size = 5
+        file_blob.download_blob.return_value.readall.return_value = b"hello"
+        mock_get_blob_client.side_effect = lambda blob: (
+            _FakeBlockBlobClient() if blob.startswith("archives/") else file_blob
+        )
+        newer_archive = GroupArchive.objects.create(
+            group=self.group, fingerprint="newer", status="building"
+        )
+
+        build_group_archive(self.archive.id)
+
+        self.assertTrue(GroupArchive.objects.filter(id=newer_archive.id).exists())
+
+    @patch("apps.groups.services.get_blob_client")
+    def test_build_group_archive_prunes_failed_and_lost_builds_of_old_file_sets(
+        self, mock_get_blob_client
+    ):
+        file_blob = MagicMock()
+        file_blob.download_blob.return_value.size = 5
+        file_blob.download_blob.return_value.readall.return_value = b"hello"
+        mock_get_blob_client.side_effect = lambda blob: (
+            _FakeBlockBlobClient() if blob.startswith("archives/") else file_blob
+        )
+        failed, lost, building = (
+            GroupArchive.objects.create(
+                group=self.group, fingerprint=fingerprint, status=status
+            )
+            for fingerprint, status in [
+                ("failed", "failed"),
+                ("lost", "pending"),
+                ("building", "building"),
+            ]
+        )
+        GroupArchive.objects.filter(id=lost.id).update(
+            updated_at=self.archive.created_at - timedelta(days=1)
+        )
+
+        build_group_archive(self.archive.id)
+
+        self.assertEqual(
+            set(GroupArchive.objects.values_list("id", flat=True)),
+            {self.archive.id, building.id},
+        )
+
+    def test_build_group_archive_skips_archives_pruned_before_it_ran(self):
+        archive_id = self.archive.id
+        self.archive.delete()
+
+        self.assertIsNone(build_group_archive(archive_id))
+
+    def test_deleting_a_group_deletes_its_archive_files(self):
+        self.archive.file.save("archive.zip", ContentFile(b"zip"), save=False)
+        self.archive.status = "ready"
+        self.archive.save()
+        name = self.archive.file.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.delete()
+
+        self.assertFalse(GroupArchive.objects.exists())
+        self.assertFalse(default_storage.exists(name))
+
+    @patch("apps.groups.services.get_blob_client")
+    def test_build_group_archive_fails_when_a_file_cannot_be_downloaded(
+        self, mock_get_blob_client
+    ):
+        archive_blob = _FakeBlockBlobClient()
+        file_blob = MagicMock()
+        file_blob.download_blob.side_effect = ResourceNotFoundError("blob not found")
+        mock_get_blob_client.side_effect = lambda blob: (
+            archive_blob if blob.startswith("archives/") else file_blob
+        )
+
+        with self.assertRaises(ResourceNotFoundError):
+            build_group_archive.apply(args=[self.archive.id], retries=3).get()
+
+        self.archive.refresh_from_db()
+        self.assertEqual(self.archive.status, "failed")
+        self.assertIsNone(archive_blob.committed)
+
+    @patch("apps.groups.tasks.build_group_archive_file")
+    def test_build_group_archive_marks_failed_when_retries_are_exhausted(
+        self, mock_build
+    ):
+        mock_build.side_effect = ConnectionError("Azure unavailable")
+
+        with self.assertRaises(ConnectionError):
+            build_group_archive.apply(args=[self.archive.id], retries=3).get()
+
+        self.archive.refresh_from_db()
+        self.assertEqual(self.archive.status, "failed")
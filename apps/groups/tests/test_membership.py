@@ -0,0 +1,123 @@
+import uuid
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import TestCase
+
+from rest_framework.test import APIRequestFactory
+
+from apps.groups.membership import (
+    MembershipResolver,
+    get_membership,
+    get_user_memberships,
+    invalidate_user_memberships,
+)
+from apps.groups.models import GroupUser
+from apps.users.tests.baker_recipes import user_recipe
+from apps.groups.tests.baker_recipes import (
+    group_recipe,
+    group_user_admin_recipe,
+    group_user_member_recipe,
+)
+
+
+class MembershipResolverTests(TestCase):
+    def setUp(self):
+        self.user = user_recipe.make()
+        self.admin_group = group_recipe.make()
+        self.member_group = group_recipe.make(is_private=True)
+        self.other_group = group_recipe.make(is_private=True)
+        group_user_admin_recipe.make(group=self.admin_group, user=self.user)
+        group_user_member_recipe.make(
+            group=self.member_group, user=self.user, can_edit=True, can_delete=False
+        )
+
+    def test_resolver_loads_every_membership_with_one_query(self):
+        resolver = MembershipResolver(self.user)
+
+        with self.assertNumQueries(1):
+            self.assertTrue(resolver.is_admin(self.admin_group))
+            self.assertFalse(resolver.is_admin(self.member_group))
+            self.assertTrue(resolver.has_flag(self.member_group.id, "can_edit"))
+            self.assertFalse(resolver.has_flag(str(self.member_group.id), "can_delete"))
+            self.assertFalse(resolver.is_member(self.other_group))
+            self.assertEqual(
+                resolver.get(self.member_group).group_id, self.member_group.id
+            )
+
+    def test_resolver_treats_invalid_group_ids_as_non_members(self):
+        resolver = MembershipResolver(self.user)
+
+        self.assertIsNone(resolver.get("not-a-uuid"))
+        self.assertIsNone(resolver.get(None))
+        self.assertFalse(resolver.is_member(uuid.uuid4()))
+
+    def test_can_access_public_groups_and_own_private_groups(self):
+        resolver = MembershipResolver(self.user)
+
+        self.assertTrue(resolver.can_access(group_recipe.make(is_private=False)))
+        self.assertTrue(resolver.can_access(self.member_group))
+        self.assertFalse(resolver.can_access(self.other_group))
+
+    def test_anonymous_user_has_no_memberships(self):
+        resolver = MembershipResolver(AnonymousUser())
+
+        with self.assertNumQueries(0):
+            self.assertFalse(resolver.is_member(self.admin_group))
+
+    def test_get_membership_returns_one_resolver_per_request(self):
+        request = APIRequestFactory().get("/")
+        request.user = self.user
+
+        self.assertIs(get_membership(request), get_membership(request))
+
+        request.user = user_recipe.make()
+        self.assertEqual(get_membership(request).user, request.user)
+
+
+class MembershipCacheTests(TestCase):
+    def setUp(self):
+        self.user = user_recipe.make()
+        self.group = group_recipe.make()
+        self.group_user = group_user_member_recipe.make(
+            group=self.group, user=self.user, can_delete=False
+        )
+
+    def test_memberships_are_shared_between_requests(self):
+        self.assertIn(self.group.id, MembershipResolver(self.user).memberships)
+
+        with self.assertNumQueries(0):
+            self.assertTrue(MembershipResolver(self.user).is_member(self.group))
+
+    def test_saving_a_membership_invalidates_the_cache(self):
+        self.assertIn(self.group.id, MembershipResolver(self.user).memberships)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group_user.can_delete = True
+            self.group_user.save()
+
+        self.assertTrue(
+            MembershipResolver(self.user).has_flag(self.group, "can_delete")
+        )
+
+    def test_deleting_a_membership_invalidates_the_cache(self):
+        self.assertIn(self.group.id, MembershipResolver(self.user).memberships)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group_user.delete()
+
+        self.assertFalse(MembershipResolver(self.user).is_member(self.group))
+
+    def test_entries_cached_under_an_old_version_are_ignored(self):
+        stale = get_user_memberships(self.user.pk)
+        version = cache.get(f"membership-version:{self.user.pk}")
+
+        invalidate_user_memberships(self.user.pk)
+        GroupUser.objects.filter(id=self.group_user.id).delete()
+        # A slow request writing what it read before the change.
+        cache.set(f"memberships:{self.user.pk}:{version}", stale)
+
+        self.assertEqual(get_user_memberships(self.user.pk), {})
+
+    def test_invalidating_an_uncached_user_is_a_no_op(self):
+        invalidate_user_memberships(uuid.uuid4())
@@ -0,0 +1,115 @@
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+from django.test import SimpleTestCase, override_settings
+
+from apps.groups.services import _prefetch_blobs
+
+
+def _make_file(name, size):
+    file = MagicMock()
+    file.file.name = name
+    file.storage_name = name
+    file.file_size = size
+    return file
+
+
+class _FakeBlobStorage:
+    def __init__(self, contents, delays=None):
+        self.contents = contents
+        self.delays = delays or {}
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def get_blob_client(self, blob):
+        client = MagicMock()
+        client.download_blob.side_effect = lambda: self._download(blob)
+        return client
+
+    def _download(self, blob):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delays.get(blob, 0.01))
+        with self._lock:
+            self.active -= 1
+
+        if isinstance(self.contents[blob], Exception):
+            raise self.contents[blob]
+
+        stream = MagicMock()
+        stream.size = len(self.contents[blob])
+        stream.readall.return_value = self.contents[blob]
+        stream.chunks.return_value = iter([self.contents[blob]])
+        return stream
+
+
+@override_settings(
+    AZURE_CONTAINER="fake",
+    GROUP_ZIP_PREFETCH_WORKERS=4,
+    GROUP_ZIP_PREFETCH_MAX_BYTES=1024,
+)
+class PrefetchBlobsTests(SimpleTestCase):
+    def _prefetch(self, files, storage):
+        with patch(
+            "apps.groups.services.get_blob_client", side_effect=storage.get_blob_client
+        ):
+            yield from _prefetch_blobs(files)
+
+    def test_prefetch_preserves_file_order(self):
+        files = [_make_file(f"f{i}", 10) for i in range(6)]
+        client = _FakeBlobStorage(
+            {f"f{i}": f"data{i}".encode() for i in range(6)},
+            # The first blobs are the slowest so they finish last.
+            delays={f"f{i}": 0.05 - i * 0.008 for i in range(6)},
+        )
+
+        result = [
+            (file.file.name, b"".join(chunks))
+            for file, chunks in self._prefetch(files, client)
+        ]
+
+        self.assertEqual(result, [(f"f{i}", f"data{i}".encode()) for i in range(6)])
+
+    def test_prefetch_downloads_blobs_concurrently_up_to_worker_limit(self):
+        files = [_make_file(f"f{i}", 10) for i in range(12)]
+        client = _FakeBlobStorage(
+            {f"f{i}": b"x" for i in range(12)},
+            delays={f"f{i}": 0.05 for i in range(12)},
+        )
+
+        list(self._prefetch(files, client))
+
+        self.assertGreater(client.max_active, 1)
+        self.assertLessEqual(client.max_active, 4)
+
+    def test_prefetch_respects_byte_budget(self):
+        files = [_make_file(f"f{i}", 300) for i in range(9)]
+        client = _FakeBlobStorage(
+            {f"f{i}": b"x" * 300 for i in range(9)},
+            delays={f"f{i}": 0.05 for i in range(9)},
+        )
+
+        list(self._prefetch(files, client))
+
+        # 1024 bytes leave room for three 300 byte blobs at a time.
+        self.assertEqual(client.max_active, 3)
+
+    def test_prefetch_streams_blobs_larger_than_expected(self):
+        files = [_make_file("big", 10)]
+        client = _FakeBlobStorage({"big": b"x" * 600})
+
+        [(_, chunks)] = list(self._prefetch(files, client))
+
+        self.assertEqual(b"".join(chunks), b"x" * 600)
+        self.assertNotIsInstance(chunks, list)
+
+    def test_prefetch_skips_blobs_that_fail_to_download(self):
+        files = [_make_file("ok", 2), _make_file("broken", 2)]
+        client = _FakeBlobStorage({"ok": b"ok", "broken": Exception("boom")})
+
+        result = [file.file.name for file, _ in self._prefetch(files, client)]
+
+        self.assertEqual(result, ["ok"])
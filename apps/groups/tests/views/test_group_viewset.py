@@ -1,5 +1,10 @@
-from django.test import TestCase
+import io
+import zipfile
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
 from rest_framework.test import APIRequestFactory, force_authenticate
 from rest_framework import status
@@ -7,7 +12,8 @@ from rest_framework import status
 from unittest.mock import patch, MagicMock
 
 from apps.groups.views import GroupsViewSet
-from apps.groups.models import GroupUser
+from apps.groups.models import GroupArchive, GroupUser
+from apps.groups.services import group_files_fingerprint
 
 from apps.users.tests.baker_recipes import user_recipe
 from apps.groups.tests.baker_recipes import (
@@ -15,6 +21,8 @@ from apps.groups.tests.baker_recipes import (
     group_user_member_recipe,
     group_user_admin_recipe,
 )
+from apps.files.tests.baker_recipes import file_recipe
+from apps.files.tests.conftest import IN_MEMORY_STORAGES
 
 
 User = get_user_model()
@@ -190,6 +198,146 @@ class GroupsViewSetTests(TestCase):
         self.assertTrue(membership.can_delete)
 
 
+@override_settings(
+    STORAGES=IN_MEMORY_STORAGES, AZURE_CONNECTION_STRING="fake", AZURE_CONTAINER="fake"
+)
+class GroupsViewSetDownloadZipTests(TestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.user = user_recipe.make(is_verified=True)
+        self.group = group_recipe.make(created_by=self.user)
+        group_user_member_recipe.make(group=self.group, user=self.user)
+
+    @patch("apps.groups.services.get_blob_client")
+    def test_download_zip_streams_archive_of_group_files(self, mock_get_blob_client):
+        file_recipe.make(group=self.group, uploaded_by=self.user, name="a.txt")
+        file_recipe.make(group=self.group, uploaded_by=self.user, name="b.txt")
+
+        mock_blob_client = mock_get_blob_client.return_value
+        mock_blob_client.download_blob.return_value.size = 13
+        mock_blob_client.download_blob.return_value.readall.return_value = (
+            b"dummy content"
+        )
+
+        view = GroupsViewSet.as_view({"get": "download_zip"})
+        request = self.factory.get(f"/groups/{self.group.id}/download_zip/")
+        force_authenticate(request, user=self.user)
+
+        response = view(request, pk=str(self.group.id))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/zip")
+        self.assertTrue(response.streaming)
+
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(sorted(archive.namelist()), ["a.txt", "b.txt"])
+        self.assertEqual(archive.read("a.txt"), b"dummy content")
+
+    @patch("apps.groups.services.get_blob_client")
+    def test_download_zip_skips_files_that_fail_to_download(self, mock_get_blob_client):
+        file_recipe.make(group=self.group, uploaded_by=self.user, name="a.txt")
+
+        mock_blob_client = mock_get_blob_client.return_value
+        mock_blob_client.download_blob.side_effect = Exception("Azure unavailable")
+
+        view = GroupsViewSet.as_view({"get": "download_zip"})
+        request = self.factory.get(f"/groups/{self.group.id}/download_zip/")
+        force_authenticate(request, user=self.user)
+
+        response = view(request, pk=str(self.group.id))
+
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(archive.namelist(), [])
+
+    @patch("apps.groups.tasks.build_group_archive")
+    def test_download_zip_async_enqueues_build_and_returns_202(self, mock_task):
+        file_recipe.make(group=self.group, uploaded_by=self.user)
+
+        view = GroupsViewSet.as_view({"get": "download_zip"})
+        request = self.factory.get(f"/groups/{self.group.id}/download_zip/?async=true")
+        force_authenticate(request, user=self.user)
+
+        response = view(request, pk=str(self.group.id))
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        archive = GroupArchive.objects.get(group=self.group)
+        self.assertEqual(response.data["job_id"], archive.id)
+        self.assertEqual(archive.fingerprint, group_files_fingerprint(self.group))
+        mock_task.delay.assert_called_once_with(archive.id)
+
+    @patch("apps.groups.tasks.build_group_archive")
+    def test_download_zip_async_reuses_pending_build(self, mock_task):
+        file_recipe.make(group=self.group, uploaded_by=self.user)
+        view = GroupsViewSet.as_view({"get": "download_zip"})
+
+        job_ids = []
+        for _ in range(2):
+            request = self.factory.get(
+                f"/groups/{self.group.id}/download_zip/?async=true"
+            )
+            force_authenticate(request, user=self.user)
+            job_ids.append(view(request, pk=str(self.group.id)).data["job_id"])
+
+        self.assertEqual(job_ids[0], job_ids[1])
+        mock_task.delay.assert_called_once()
+
+    @patch("apps.groups.tasks.build_group_archive")
+    def test_download_zip_async_requeues_build_whose_task_was_lost(self, mock_task):
+        file_recipe.make(group=self.group, uploaded_by=self.user)
+        archive = GroupArchive.objects.create(
+            group=self.group,
+            fingerprint=group_files_fingerprint(self.group),
+            status="building",
+        )
+        GroupArchive.objects.filter(id=archive.id).update(
+            updated_at=timezone.now() - timedelta(hours=2)
+        )
+
+        view = GroupsViewSet.as_view({"get": "download_zip"})
+        request = self.factory.get(f"/groups/{self.group.id}/download_zip/?async=true")
+        force_authenticate(request, user=self.user)
+        with override_settings(GROUP_ZIP_ARCHIVE_BUILD_TIMEOUT=3600):
+            response = view(request, pk=str(self.group.id))
+
+        self.assertEqual(response.data["status"], "pending")
+        mock_task.delay.assert_called_once_with(archive.id)
+
+    @patch("apps.groups.services.get_blob_client")
+    def test_download_zip_serves_ready_archive_for_unchanged_files(
+        self, mock_get_blob_client
+    ):
+        file_recipe.make(group=self.group, uploaded_by=self.user)
+        GroupArchive.objects.create(
+            group=self.group,
+            fingerprint=group_files_fingerprint(self.group),
+            status="ready",
+            file="archives/cached.zip",
+        )
+        mock_blob_client = mock_get_blob_client.return_value
+        mock_blob_client.download_blob.return_value.chunks.return_value = iter(
+            [b"cached zip"]
+        )
+
+        view = GroupsViewSet.as_view({"get": "download_zip"})
+        request = self.factory.get(f"/groups/{self.group.id}/download_zip/")
+        force_authenticate(request, user=self.user)
+
+        response = view(request, pk=str(self.group.id))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b"".join(response.streaming_content), b"cached zip")
+        mock_get_blob_client.assert_called_once_with("archives/cached.zip")
+
+    def test_download_zip_returns_404_when_group_has_no_files(self):
+        view = GroupsViewSet.as_view({"get": "download_zip"})
+        request = self.factory.get(f"/groups/{self.group.id}/download_zip/")
+        force_authenticate(request, user=self.user)
+
+        response = view(request, pk=str(self.group.id))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
 @patch("apps.groups.views.BlobServiceClient")
 @patch("apps.files.models.File.save", autospec=True)
 def test_download_zip_returns_zip_response(
@@ -25,7 +25,13 @@ import logging
 from uuid import UUID
 
 from apps.users.tasks import send_email
-from .services import download_group_zip
+from .services import (
+    download_group_zip,
+    enqueue_group_archive,
+    get_ready_group_archive,
+    group_files_fingerprint,
+    stream_group_archive,
+)
 
 logger = logging.Logger("CloudStorm Logger")
 
@@ -226,14 +232,27 @@ class GroupsViewSet(ModelViewSet):
 
     @extend_schema(
         methods=["GET"],
+        parameters=[
+            OpenApiParameter(
+                name="async",
+                type=bool,
+                location=OpenApiParameter.QUERY,
+                required=False,
+                description="Build the archive in the background instead of streaming it",
+            )
+        ],
         responses={
             200: OpenApiResponse(description="ZIP file containing all group files"),
+            202: OpenApiResponse(
+                description="Archive is being built, repeat the request to download it"
+            ),
             403: OpenApiResponse(
                 description="User is not authenticated or not a group member"
             ),
             404: OpenApiResponse(description="No files found for this group"),
         },
-        description="Downloads all files in the group as a ZIP archive.",
+        description="Downloads all files in the group as a ZIP archive. A cached archive "
+        "is served as long as the group's files have not changed.",
     )
     @action(methods=["GET"], detail=True)
     def download_zip(self, request, pk):
@@ -242,9 +261,21 @@ class GroupsViewSet(ModelViewSet):
         if not group.files.exists():
             return Response("No files found.", status=404)
 
-        zip_buffer = download_group_zip(group)
+        fingerprint = group_files_fingerprint(group)
+        archive = get_ready_group_archive(group, fingerprint)
+
+        if archive:
+            zip_stream = stream_group_archive(archive)
+        elif request.query_params.get("async") in ["true", "1"]:
+            archive = enqueue_group_archive(group, fingerprint)
+            return Response(
+                {"job_id": archive.id, "status": archive.status},
+                status=status.HTTP_202_ACCEPTED,
+            )
+        else:
+            zip_stream = download_group_zip(group)
 
-        response = StreamingHttpResponse(zip_buffer, content_type="application/zip")
+        response = StreamingHttpResponse(zip_stream, content_type="application/zip")
         response["Content-Disposition"] = (
             f"attachment; filename=group_{group.id}_files.zip"
         )
@@ -5,4 +5,10 @@ set -o nounset
 
 rm -f './celerybeat.pid'
 
-celery -A CloudStorm worker -l INFO --pool=solo
\ No newline at end of file
+# One worker per workload, see "Celery Workers" in the README. Without any
+# settings a single worker consumes every queue, as before.
+celery -A CloudStorm worker -l INFO \
+    --hostname="${CELERY_WORKER_NAME:-worker}@%h" \
+    --queues="${CELERY_QUEUES:-default,email,ai,media,archives}" \
+    --pool="${CELERY_POOL:-solo}" \
+    --concurrency="${CELERY_CONCURRENCY:-1}"